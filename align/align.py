@@ -3,119 +3,343 @@ import numpy as np
 import ast
 import os
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
 from .nom_process import process_nom
-from .vi_process import process_quoc_ngu
+from .vi_process import named_entities_enabled, process_quoc_ngu
+from .dp import SegmentCursor, align_tokens, sparse_density_threshold
+from .dictionary import build_dicts, dictionary_version, file_digest, get_compatibility_index, load_dictionary
+from .align_cache import AlignmentCache, default_cache_dir
+from .checkpoint import AlignmentCheckpoint, progress_path
+from .directory_index import get_directory_index, invalidate_directory_indexes
+from .pairing import pair_pages
+from .screening import REVIEW_FILE_NAME, ScreeningReject, screen_pair, write_review_list
 from tqdm import tqdm
 from dotenv import load_dotenv
 load_dotenv(dotenv_path=Path(__file__).parent.parent / ".env", override=True)
 
-def build_dicts(similar_df, trans_df):
-    trans_dict = {}
-    for _, row in trans_df.iterrows():
-        word, han_char = row.iloc[0], row.iloc[1]
-        trans_dict.setdefault(word, []).append(han_char)
-
-    similar_dict = {}
-    for _, row in similar_df.iterrows():
-        char, sim_char = row.iloc[0], row.iloc[1]
-        similar_dict.setdefault(char, []).append(sim_char)
-
-    return trans_dict, similar_dict
-
 def is_compatible(han_nom_char, quoc_ngu_word, trans_dict, similar_dict):
     hn_candidates = trans_dict.get(quoc_ngu_word, [])
     similar_chars = similar_dict.get(han_nom_char, []) + [han_nom_char]
     return bool(set(hn_candidates) & set(similar_chars))
 
-def levenshtein_align_boxes(nom_list, qn_list, similar_df, trans_df):
-    trans_dict, similar_dict = build_dicts(similar_df, trans_df)
-    m, n = len(nom_list), len(qn_list)
-    dp = np.zeros((m + 1, n + 1), dtype=int)
-    backtrace = np.full((m + 1, n + 1), '', dtype=object)
-
-    for i in range(m + 1):
-        dp[i][0] = i
-        backtrace[i][0] = 'U'
-    for j in range(n + 1):
-        dp[0][j] = j
-        backtrace[0][j] = 'L'
-    backtrace[0][0] = ''
-
-    for i in range(1, m + 1):
-        for j in range(1, n + 1):
-            match = is_compatible(nom_list[i - 1], qn_list[j - 1], trans_dict, similar_dict)
-            cost = 0 if match else 1
-            options = [
-                (dp[i - 1][j] + 1, 'U'),
-                (dp[i][j - 1] + 1, 'L'),
-                (dp[i - 1][j - 1] + cost, 'D')
-            ]
-            dp[i][j], backtrace[i][j] = min(options)
-
-    aligned_nom, aligned_qn = [], []
-    i, j = m, n
-    while i > 0 or j > 0:
-        if i > 0 and j > 0 and backtrace[i][j] == 'D':
-            aligned_nom.append(nom_list[i - 1])
-            aligned_qn.append(qn_list[j - 1])
-            i -= 1
-            j -= 1
-        elif i > 0 and backtrace[i][j] == 'U':
-            aligned_nom.append(nom_list[i - 1])
-            aligned_qn.append("*")
-            i -= 1
-        elif j > 0 and backtrace[i][j] == 'L':
-            aligned_nom.append("*")
-            aligned_qn.append(qn_list[j - 1])
-            j -= 1
-
-    aligned_nom.reverse()
-    aligned_qn.reverse()
+def levenshtein_align_boxes(nom_list, qn_list, similar_df, trans_df, kernel="auto", linear_memory_cells=None, sparse_density=None):
+    # Chỉ mục được biên dịch một lần cho mỗi phiên bản từ điển
+    cost = get_compatibility_index(similar_df, trans_df).cost_rows(nom_list, qn_list)
+    # Từ điển tương thích rất thưa: 'auto' chuyển sang engine cặp khớp thưa khi mật độ thấp
+    aligned_nom, aligned_qn = align_tokens(nom_list, qn_list, cost, kernel=kernel, linear_memory_cells=linear_memory_cells,
+                                           sparse_density=sparse_density_threshold(sparse_density))
     return [aligned_nom, aligned_qn]
 
-def align(nom_dir, vi_dir, output_txt, k=1, name_book="book", reverse=False, mapping_path=None):
-    similar = pd.read_excel(os.environ['NOM_SIMILARITY_DICTIONARY'])
-    trans = pd.read_excel(os.environ['QN2NOM_DICTIONARY']).iloc[:, [0, 1]]
+# Helper function để flexible kiểm tra file tồn tại
+def find_file_flexible(dir_path, target_filename):
+    """
+    Tìm file flexible - support case insensitive và mismatch extension
+    (tra trong DirectoryIndex dùng chung, mỗi thư mục chỉ liệt kê một lần)
     
-    # Xóa file output cũ nếu có
-    if os.path.exists(output_txt):
-        os.remove(output_txt)
+    Args:
+        dir_path: Thư mục cần tìm
+        target_filename: Tên file cần tìm
     
-    # Extract first name and last number from filename for sorting
-    def extract_name_and_last_number(filename):
-        """Extract first name part and last number from filename.
-        e.g., phuc_001_002_001.json -> ('phuc', 1)
-        """
-        name_without_ext = os.path.splitext(filename)[0]
-        parts = name_without_ext.split("_")
+    Returns:
+        Full path nếu tìm thấy, None nếu không
+    """
+    return get_directory_index(dir_path).find(target_filename, any_extension=True)
+
+def _distribute_segments(aligned_hn, aligned_qn, num_word_hn):
+    """Chia dãy đã align thành segment cho từng bbox, trả về (segments, phần dư Hán, phần dư Việt)."""
+    segments = []
+    cursor = SegmentCursor(aligned_hn)
+    for num in num_word_hn:
+        if num == 0:
+            segments.append(("", ""))
+            continue
+        start, stop, _ = cursor.take(num)
+        segments.append((aligned_hn[start:stop], aligned_qn[start:stop]))
+    return segments, aligned_hn[cursor.pos:], aligned_qn[cursor.pos:]
+
+
+def _align_boxes_cached(flatten_nom, qn_list, similar, trans, k, kernel, linear_memory_cells, cache):
+    """levenshtein_align_boxes qua cache nội dung (nếu có)."""
+    if cache is None:
+        return levenshtein_align_boxes(flatten_nom, qn_list, similar, trans, kernel=kernel, linear_memory_cells=linear_memory_cells)
+    # 'auto' có thể chọn 'sparse' (khác vị trí khoảng trống khi hoà điểm) tuỳ ngưỡng mật độ
+    label = f"auto:{sparse_density_threshold()}" if kernel == "auto" else kernel
+    key = cache.key(flatten_nom, qn_list, k, label)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    aligned_hn, aligned_qn = levenshtein_align_boxes(flatten_nom, qn_list, similar, trans, kernel=kernel, linear_memory_cells=linear_memory_cells)
+    cache.put(key, aligned_hn, aligned_qn)
+    return aligned_hn, aligned_qn
+
+
+@dataclass
+class AlignedRow:
+    """Một dòng kết quả align (tương ứng một dòng result.txt)."""
+    file: str
+    bbox: list
+    nom: str
+    qn: str
+    page_index: int  # thứ tự trang Hán Nôm (k=1: cặp trang; k=2: trang trong các dòng mapping)
+
+    def to_line(self) -> str:
+        return f"{self.file}\t{str(self.bbox)}\t{self.nom}\t{self.qn}\n"
+
+
+def _format_rows(file_name, bboxes, segments, messages, page_index=0):
+    rows = []
+    for bbox, (han_seg, qn_seg) in zip(bboxes, segments):
+        if len(han_seg) != len(qn_seg):
+            messages.append(f"⚠️ Warning: Mismatch độ dài align tại file {file_name}. Hán={len(han_seg)}, Việt={len(qn_seg)}")
+            continue
+        nom = ''.join(han_seg).strip()
+        qn = ' '.join(qn_seg).strip()
         
-        # Get first part as name
-        first_name = parts[0] if parts else ""
+        if not nom and not qn:
+            continue
         
-        # Get last number
-        last_num = None
-        for part in reversed(parts):
-            if part.isdigit():
-                last_num = int(part)
-                break
+        rows.append(AlignedRow(file_name, bbox, nom, qn, page_index))
+    return rows
+
+
+def _screen(flatten_nom, qn_list, similar, trans, left, right, label):
+    """Sàng lọc trước DP; trả về ScreeningReject (cũng là một message) hoặc None."""
+    reason = screen_pair(get_compatibility_index(similar, trans).cost_rows(flatten_nom, qn_list))
+    if reason is None:
+        return None
+    return ScreeningReject(left, right, reason, f"⚠️ Bỏ qua {label}: không qua sàng lọc trước DP ({reason})")
+
+
+def align_page(json_path, txt_path, k, similar, trans, kernel="auto", linear_memory_cells=None, cache=None, screening=False):
+    """
+    Align một cặp trang JSON Hán Nôm / TXT Quốc Ngữ (k=1)
+    
+    Returns:
+        (rows, messages): rows là các AlignedRow (None nếu trang bị bỏ qua
+        trước khi ghi), messages là các cảnh báo theo thứ tự phát sinh
+    """
+    json_file = os.path.basename(json_path)
+    messages = []
+    try:
+        nom_data = process_nom(json_path, k)
+        quoc_ngu_list = process_quoc_ngu(txt_path)
+    except Exception as e:
+        import traceback
+        messages.append(f"❌ Lỗi khi đọc file {json_file} hoặc {os.path.basename(txt_path)}: {e}")
+        messages.append(f"   Chi tiết: {traceback.format_exc()}")
+        return None, messages
+    
+    # Check if nom_data has text
+    messages.append(f"🔍 DEBUG {json_file}: text={len(nom_data.get('text', []))}, bbox={len(nom_data.get('bbox', []))}, k={k}")
+    if not nom_data.get('text') or not nom_data.get('bbox'):
+        messages.append(f"⚠️ Bỏ qua {json_file}: không có text hoặc bbox (text: {len(nom_data.get('text', []))}, bbox: {len(nom_data.get('bbox', []))})")
+        return None, messages
+    
+    # Check if quoc_ngu_list is empty
+    if not quoc_ngu_list:
+        messages.append(f"⚠️ Bỏ qua {json_file}: không có text Quốc Ngữ")
+        return None, messages
+
+    num_word_hn = [len(sentence) for sentence in nom_data['text']]
+    flatten_nom = list("".join(nom_data['text']))
+    if screening:
+        reject = _screen(flatten_nom, quoc_ngu_list, similar, trans, json_file, os.path.basename(txt_path), json_file)
+        if reject:
+            messages.append(reject)
+            return None, messages
+    aligned_hn, aligned_qn = _align_boxes_cached(flatten_nom, quoc_ngu_list, similar, trans, k, kernel, linear_memory_cells, cache)
+    segments, hn_remain, qn_remain = _distribute_segments(aligned_hn, aligned_qn, num_word_hn)
+
+    if hn_remain or qn_remain:
+        if segments:
+            last_han, last_qn = segments[-1]
+            segments[-1] = (last_han + hn_remain, last_qn + qn_remain)
+        else:
+            segments.append((hn_remain, qn_remain))
+
+    if len(nom_data['bbox']) != len(segments):
+        messages.append(f"⚠️ Bỏ qua {json_file}: Số bbox ({len(nom_data['bbox'])}) ≠ segments ({len(segments)})")
+        return [], messages
+    return _format_rows(json_file, nom_data['bbox'], segments, messages), messages
+
+
+def align_mapping_row(lst_han, lst_qn, nom_dir, vi_dir, similar, trans, kernel="auto", linear_memory_cells=None, cache=None, screening=False):
+    """
+    Align một dòng mapping (k=2): nối mọi trang Hán Nôm của dòng rồi align với
+    toàn bộ token Quốc Ngữ.
+    
+    Returns:
+        (rows, messages) như align_page; page_index của mỗi dòng là thứ tự trang
+        trong danh sách Hán Nôm của dòng mapping
+    """
+    messages = []
+    preprocess_han = []
+    preprocess_qn = []
+    files_han = ast.literal_eval(lst_han)
+    files_qn = ast.literal_eval(lst_qn)
+
+    # Bỏ qua mapping nếu bất kỳ file JSON/TXT nào không tồn tại
+    # Sử dụng flexible checking
+    actual_han_files = []
+    actual_qn_files = []
+    missing_han_list = []
+    missing_qn_list = []
+    
+    for f in files_han:
+        actual_file = find_file_flexible(nom_dir, f)
+        if actual_file:
+            actual_han_files.append(actual_file)
+        else:
+            missing_han_list.append(f)
+    
+    for f in files_qn:
+        actual_file = find_file_flexible(vi_dir, f)
+        if actual_file:
+            actual_qn_files.append(actual_file)
+        else:
+            missing_qn_list.append(f)
+    
+    if missing_han_list or missing_qn_list:
+        messages.append(f"⚠️ Bỏ qua mapping: thiếu file")
+        if missing_han_list:
+            messages.append(f"   Hán Nôm: {missing_han_list}")
+        if missing_qn_list:
+            messages.append(f"   Quốc Ngữ: {missing_qn_list}")
+        messages.append(f"   Tìm được: Hán={len(actual_han_files)}, QN={len(actual_qn_files)}")
+        return None, messages
+    
+    # Xử lý từng file Hán Nôm
+    for file_path in actual_han_files:
+        nom_data = process_nom(file_path, 1)
+        file_name = os.path.basename(file_path)
+        preprocess_han.append({
+            "file_name": file_name,
+            "data": nom_data, 
+            "number words": [len(box) for box in nom_data["text"]], 
+            "text": "".join(nom_data["text"])
+        })
+    
+    # Xử lý từng file Quốc Ngữ
+    for file_path in actual_qn_files:
+        quoc_ngu_list = process_quoc_ngu(file_path)
+        preprocess_qn.extend(quoc_ngu_list)
+    
+    # Align
+    flatten_nom = list("".join([page["text"] for page in preprocess_han]))
+    if screening:
+        han_names = ", ".join(page["file_name"] for page in preprocess_han)
+        qn_names = ", ".join(os.path.basename(f) for f in actual_qn_files)
+        reject = _screen(flatten_nom, preprocess_qn, similar, trans, han_names, qn_names, f"mapping [{han_names}]")
+        if reject:
+            messages.append(reject)
+            return None, messages
+    aligned_hn, aligned_qn = _align_boxes_cached(flatten_nom, preprocess_qn, similar, trans, 2, kernel, linear_memory_cells, cache)
+    hn_remain, qn_remain = aligned_hn, aligned_qn
+    
+    # Xử lý từng page
+    rows = None
+    for page_idx, page_content in enumerate(preprocess_han):
+        segments, hn_remain, qn_remain = _distribute_segments(hn_remain, qn_remain, page_content["number words"])
         
-        if last_num is None:
-            last_num = float('inf')
+        # Xử lý phần còn lại: thêm vào segment cuối cùng nếu có
+        # Chỉ thêm vào page cuối cùng của row hiện tại
+        if page_idx == len(preprocess_han) - 1:
+            if hn_remain or qn_remain:
+                if segments:
+                    last_han, last_qn = segments[-1]
+                    segments[-1] = (last_han + hn_remain, last_qn + qn_remain)
+                else:
+                    segments.append((hn_remain, qn_remain))
+        
+        # Ghi kết quả
+        nom_data = page_content["data"]
+        if len(nom_data['bbox']) != len(segments):
+            messages.append(f"⚠️ Bỏ qua {page_content['file_name']}: Số bbox ({len(nom_data['bbox'])}) ≠ segments ({len(segments)})")
+            continue
         
-        return (first_name, last_num)
+        rows = (rows or []) + _format_rows(page_content['file_name'], nom_data['bbox'], segments, messages, page_idx)
+    return rows, messages
+
+
+# Trạng thái của mỗi tiến trình worker: từ điển được nạp một lần từ cache nhị phân
+_worker_state = {}
+
+
+def _init_worker(similar_path, trans_path, options):
+    _worker_state['dicts'] = (
+        load_dictionary(similar_path),
+        load_dictionary(trans_path).iloc[:, [0, 1]],
+    )
+    _worker_state['options'] = options
+
+
+def _call_in_worker(fn, unit):
+    return fn(*unit, *_worker_state['dicts'], **_worker_state['options'])
+
+
+def _map_units(fn, units, workers, dict_paths, dicts, options):
+    """Chạy ``fn`` trên từng unit, trả kết quả theo đúng thứ tự ban đầu."""
+    if workers <= 1:
+        for unit in units:
+            yield fn(*unit, *dicts, **options)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(*dict_paths, options)) as executor:
+        yield from executor.map(partial(_call_in_worker, fn), units)
+
+
+def _extract_name_and_last_number(filename):
+    """Extract first name part and last number from filename.
+    e.g., phuc_001_002_001.json -> ('phuc', 1)
+    """
+    name_without_ext = os.path.splitext(filename)[0]
+    parts = name_without_ext.split("_")
+    
+    # Get first part as name
+    first_name = parts[0] if parts else ""
+    
+    # Get last number
+    last_num = None
+    for part in reversed(parts):
+        if part.isdigit():
+            last_num = int(part)
+            break
+    
+    if last_num is None:
+        last_num = float('inf')
+    
+    return (first_name, last_num)
+
+
+def _iter_units(nom_dir, vi_dir, k, reverse, mapping_path, kernel, linear_memory_cells, workers, use_cache, cache_dir, pairing, screening, done=(), log=print):
+    """
+    Align từng đơn vị (trang k=1 / dòng mapping k=2) theo thứ tự, bỏ qua các đơn vị
+    có chỉ số trong ``done``. Gửi cảnh báo cho ``log`` và trả về lần lượt
+    (chỉ số đơn vị, các AlignedRow, các ScreeningReject).
+    """
+    if pairing not in ("position", "auto"):
+        raise ValueError(f"pairing không hợp lệ: {pairing}")
+    dict_paths = (os.environ['NOM_SIMILARITY_DICTIONARY'], os.environ['QN2NOM_DICTIONARY'])
+    similar = load_dictionary(dict_paths[0])
+    trans = load_dictionary(dict_paths[1]).iloc[:, [0, 1]]
+    cache = None
+    if use_cache:
+        cache = AlignmentCache(cache_dir or default_cache_dir(nom_dir), dictionary_version(similar, trans))
+    options = {"kernel": kernel, "linear_memory_cells": linear_memory_cells, "cache": cache, "screening": screening}
     
     # Get JSON files sorted by (first_name, last_number)
-    json_files_list = sorted(os.listdir(nom_dir), key=extract_name_and_last_number)
+    json_files_list = sorted(os.listdir(nom_dir), key=_extract_name_and_last_number)
     
     # Get TXT files sorted by (first_name, last_number)
     txt_files_list = sorted([f for f in os.listdir(vi_dir) if f.endswith('.txt')], 
-                             key=extract_name_and_last_number)
+                             key=_extract_name_and_last_number)
     
     # Check if file counts match
     json_count = len(json_files_list)
     txt_count = len(txt_files_list)
     if json_count != txt_count:
-        print(f"⚠️ Cảnh báo: Số lượng file không bằng nhau. JSON: {json_count}, TXT: {txt_count}")
+        log(f"⚠️ Cảnh báo: Số lượng file không bằng nhau. JSON: {json_count}, TXT: {txt_count}")
     
     # Xử lý theo k=1 hoặc k=2
     if k == 2:
@@ -129,240 +353,191 @@ def align(nom_dir, vi_dir, output_txt, k=1, name_book="book", reverse=False, map
         df = pd.read_excel(mapping_path)
         df = df.iloc[57:].reset_index(drop=True)
         
-        # Helper function để flexible kiểm tra file tồn tại
-        def find_file_flexible(dir_path, target_filename):
-            """
-            Tìm file flexible - support case insensitive và mismatch extension
-            
-            Args:
-                dir_path: Thư mục cần tìm
-                target_filename: Tên file cần tìm
-            
-            Returns:
-                Full path nếu tìm thấy, None nếu không
-            """
-            if not os.path.isdir(dir_path):
-                return None
-            
-            # Thử kiểm tra trực tiếp trước
-            full_path = os.path.join(dir_path, target_filename)
-            if os.path.exists(full_path):
-                return full_path
-            
-            # Lấy base name (không có extension)
-            target_base = os.path.splitext(target_filename)[0]
-            target_ext = os.path.splitext(target_filename)[1].lower()
-            
-            # Tìm file với base name giống nhau (ignore case, ignore extension)
-            for item in os.listdir(dir_path):
-                item_path = os.path.join(dir_path, item)
-                if not os.path.isfile(item_path):
-                    continue
-                
-                item_base = os.path.splitext(item)[0]
-                item_ext = os.path.splitext(item)[1].lower()
-                
-                # Match nếu base name giống (không case sensitive)
-                if item_base.lower() == target_base.lower():
-                    # Nếu có extension, thử match extension
-                    if target_ext:
-                        # Flexible extension matching (e.g., .json có thể là .txt, etc)
-                        if item_ext in ['.json', '.txt', '.jpg', '.png']:
-                            return item_path
-                    else:
-                        return item_path
-            
-            return None
+        # Liệt kê lại thư mục cho lần chạy này (tiến trình service có thể chạy nhiều job)
+        invalidate_directory_indexes()
         
         # Preprocess và align theo mapping
-        for lst_han, lst_qn in tqdm(zip(df["hannom"].to_list(), df["quocngu"].to_list()), desc="Preprocessing with mapping"):
-            preprocess_han = []
-            preprocess_qn = []
-            files_han = ast.literal_eval(lst_han)
-            files_qn = ast.literal_eval(lst_qn)
-
-            # Bỏ qua mapping nếu bất kỳ file JSON/TXT nào không tồn tại
-            # Sử dụng flexible checking
-            actual_han_files = []
-            actual_qn_files = []
-            missing_han_list = []
-            missing_qn_list = []
-            
-            for f in files_han:
-                actual_file = find_file_flexible(nom_dir, f)
-                if actual_file:
-                    actual_han_files.append(actual_file)
-                else:
-                    missing_han_list.append(f)
-            
-            for f in files_qn:
-                actual_file = find_file_flexible(vi_dir, f)
-                if actual_file:
-                    actual_qn_files.append(actual_file)
-                else:
-                    missing_qn_list.append(f)
-            
-            if missing_han_list or missing_qn_list:
-                print(f"⚠️ Bỏ qua mapping: thiếu file")
-                if missing_han_list:
-                    print(f"   Hán Nôm: {missing_han_list}")
-                if missing_qn_list:
-                    print(f"   Quốc Ngữ: {missing_qn_list}")
-                print(f"   Tìm được: Hán={len(actual_han_files)}, QN={len(actual_qn_files)}")
-                continue
-            
-            # Xử lý từng file Hán Nôm
-            for file_path in actual_han_files:
-                nom_data = process_nom(file_path, 1)
-                file_name = os.path.basename(file_path)
-                preprocess_han.append({
-                    "file_name": file_name,
-                    "data": nom_data, 
-                    "number words": [len(box) for box in nom_data["text"]], 
-                    "text": "".join(nom_data["text"])
-                })
-            
-            # Xử lý từng file Quốc Ngữ
-            for file_path in actual_qn_files:
-                quoc_ngu_list = process_quoc_ngu(file_path)
-                preprocess_qn.extend(quoc_ngu_list)
-            
-            # Align
-            flatten_nom = list("".join([page["text"] for page in preprocess_han]))
-            aligned_hn, aligned_qn = levenshtein_align_boxes(flatten_nom, preprocess_qn, similar, trans)
-            hn_remain, qn_remain = aligned_hn.copy(), aligned_qn.copy()
-            
-            # Xử lý từng page
-            for page_idx, page_content in enumerate(preprocess_han):
-                segments = []
-                for num in page_content["number words"]:
-                    if num == 0:
-                        segments.append(("", ""))
-                        continue
-                    count, i = 0, 0
-                    while i < len(hn_remain):
-                        if hn_remain[i] != "*":
-                            count += 1
-                        i += 1
-                        if count == num:
-                            break
-                    han_seg = hn_remain[:i]
-                    qn_seg = qn_remain[:i]
-                    segments.append((han_seg, qn_seg))
-                    hn_remain = hn_remain[i:]
-                    qn_remain = qn_remain[i:]
-                
-                # Xử lý phần còn lại: thêm vào segment cuối cùng nếu có
-                # Chỉ thêm vào page cuối cùng của row hiện tại
-                if page_idx == len(preprocess_han) - 1:
-                    if hn_remain or qn_remain:
-                        if segments:
-                            last_han, last_qn = segments[-1]
-                            segments[-1] = (last_han + hn_remain, last_qn + qn_remain)
-                        else:
-                            segments.append((hn_remain, qn_remain))
-                
-                # Ghi kết quả
-                nom_data = page_content["data"]
-                if len(nom_data['bbox']) != len(segments):
-                    print(f"⚠️ Bỏ qua {page_content['file_name']}: Số bbox ({len(nom_data['bbox'])}) ≠ segments ({len(segments)})")
-                    continue
-                
-                with open(output_txt, "a", encoding="utf-8") as f:
-                    for bbox, (han_seg, qn_seg) in zip(nom_data['bbox'], segments):
-                        if len(han_seg) != len(qn_seg):
-                            print(f"⚠️ Warning: Mismatch độ dài align tại file {page_content['file_name']}. Hán={len(han_seg)}, Việt={len(qn_seg)}")
-                            continue
-                        nom = ''.join(han_seg).strip()
-                        qn = ' '.join(qn_seg).strip()
-                        
-                        if not nom and not qn:
-                            continue
-                        
-                        f.write(f"{page_content['file_name']}\t{str(bbox)}\t{nom}\t{qn}\n")
+        units = [(lst_han, lst_qn, nom_dir, vi_dir) for lst_han, lst_qn in zip(df["hannom"].to_list(), df["quocngu"].to_list())]
+        # Trang đầu tiên của mỗi dòng mapping trong thứ tự trang chung
+        offsets = np.cumsum([0] + [len(ast.literal_eval(unit[0])) for unit in units[:-1]]).tolist()
+        fn, desc, unit_name = align_mapping_row, "Preprocessing with mapping", "it"
+    else:
+        # K=1: Xử lý bình thường (code cũ)
+        # When NOT reverse (default): TXT is reversed (paired high-to-low)
+        # When reverse=True: TXT is normal order (paired low-to-high)
+        if not reverse:
+            txt_files_list = list(reversed(txt_files_list))
         
-        return  # K=2 đã xử lý xong
+        json_paths = [os.path.join(nom_dir, f) for f in json_files_list]
+        txt_paths = [os.path.join(vi_dir, f) for f in txt_files_list]
+        if pairing == "auto":
+            # Ghép theo nội dung, giữ thứ tự sau khi sắp xếp/đảo
+            pairs = pair_pages(json_paths, txt_paths, get_compatibility_index(similar, trans), k)
+            paired = {i for i, _, _ in pairs}
+            for i, json_file in enumerate(json_files_list):
+                if i not in paired:
+                    log(f"⚠️ Bỏ qua {json_file}: không tìm được trang Quốc Ngữ tương ứng")
+            paired_txt = {j for _, j, _ in pairs}
+            for j, txt_file in enumerate(txt_files_list):
+                if j not in paired_txt:
+                    log(f"⚠️ Bỏ qua {txt_file}: không tìm được trang Hán Nôm tương ứng")
+        else:
+            # Match files by position after sorting/reversing
+            pairs = [(i, i, None) for i in range(min(len(json_paths), len(txt_paths)))]
+        units = [(json_paths[i], txt_paths[j], k) for i, j, _ in pairs]
+        offsets = [i for i, _, _ in pairs]
+        fn, desc, unit_name = align_page, "Processing files", "file"
     
-    # K=1: Xử lý bình thường (code cũ)
-    # When NOT reverse (default): TXT is reversed (paired high-to-low)
-    # When reverse=True: TXT is normal order (paired low-to-high)
-    if not reverse:
-        txt_files_list = list(reversed(txt_files_list))
+    # Các đơn vị đã xong ở lần chạy trước (resume) không được align lại
+    todo = [index for index in range(len(units)) if index not in done]
+    results = _map_units(fn, [units[index] for index in todo], workers, dict_paths, (similar, trans), options)
+    progress = tqdm(results, total=len(units), initial=len(units) - len(todo), desc=desc, unit=unit_name)
     
-    # Match files by position after sorting/reversing
-    for idx, json_file in enumerate(tqdm(json_files_list, desc="Processing files", unit="file")):
-        if idx >= len(txt_files_list):
-            print(f"⚠️ Cảnh báo: Số lượng file JSON vượt quá TXT, bỏ qua {json_file}")
-            break
-        
-        txt_file = txt_files_list[idx]
-        
-        try:
-            nom_data = process_nom(os.path.join(nom_dir, json_file), k)
-            quoc_ngu_list = process_quoc_ngu(os.path.join(vi_dir, txt_file))
-        except Exception as e:
-            import traceback
-            print(f"❌ Lỗi khi đọc file {json_file} hoặc {txt_file}: {e}")
-            print(f"   Chi tiết: {traceback.format_exc()}")
-            continue
-        
-        # Check if nom_data has text
-        print(f"🔍 DEBUG {json_file}: text={len(nom_data.get('text', []))}, bbox={len(nom_data.get('bbox', []))}, k={k}")
-        if not nom_data.get('text') or not nom_data.get('bbox'):
-            print(f"⚠️ Bỏ qua {json_file}: không có text hoặc bbox (text: {len(nom_data.get('text', []))}, bbox: {len(nom_data.get('bbox', []))})")
-            continue
-        
-        # Check if quoc_ngu_list is empty
-        if not quoc_ngu_list:
-            print(f"⚠️ Bỏ qua {json_file}: không có text Quốc Ngữ")
-            continue
+    # Cảnh báo JSON thừa được in ngay sau thông báo của đơn vị cuối, như khi chạy tuần tự
+    trailing = []
+    if k != 2 and pairing == "position" and len(json_files_list) > len(txt_files_list):
+        trailing.append(f"⚠️ Cảnh báo: Số lượng file JSON vượt quá TXT, bỏ qua {json_files_list[len(txt_files_list)]}")
+    if not todo or todo[-1] != len(units) - 1:
+        for msg in trailing:
+            log(msg)
+        trailing = []
+    
+    # progress đứng trước trong zip để được lấy đến hết: thanh tiến trình tới n/n và đóng
+    for (rows, messages), index in zip(progress, todo):
+        if index == len(units) - 1:
+            messages = list(messages) + trailing
+        rejects = []
+        for msg in messages:
+            log(msg)
+            if isinstance(msg, ScreeningReject):
+                rejects.append(msg)
+        rows = rows or []
+        for row in rows:
+            row.page_index += offsets[index]
+        yield index, rows, rejects
+    if cache is not None:
+        # Giữ thư mục cache trong giới hạn ALIGN_CACHE_MAX_MB
+        cache.prune()
+
+
+def align_iter(nom_dir, vi_dir, k=1, reverse=False, mapping_path=None, kernel="auto", linear_memory_cells=None, workers=1, use_cache=True, cache_dir=None, pairing="position", screening=False, review_path=None, log=print):
+    """
+    Align Hán Nôm OCR (JSON) với Quốc Ngữ (TXT), trả về lần lượt từng AlignedRow
+    ngay khi mỗi trang (k=1) / dòng mapping (k=2) xong, theo đúng thứ tự của result.txt.
+    Cảnh báo vẫn được in ra console theo thứ tự trang.
+    
+    Args:
+        workers: Số tiến trình song song (mỗi trang k=1 / mỗi dòng mapping k=2 là
+            một đơn vị độc lập). Kết quả vẫn được trả theo thứ tự ban đầu.
+        use_cache: Dùng lại kết quả DP của các trang/dòng mapping không đổi nội dung
+        cache_dir: Thư mục cache (mặc định: ALIGN_CACHE_DIR hoặc ``.align_cache`` cạnh ``nom_dir``),
+            giới hạn dung lượng bởi ALIGN_CACHE_MAX_MB (xoá entry lâu không dùng nhất)
+        pairing: Cách ghép trang JSON với TXT khi k=1. "position": theo vị trí sau khi
+            sắp xếp (mặc định); "auto": theo nội dung qua từ điển (xem ``pairing.pair_pages``),
+            chịu được trang thừa/thiếu ở một bên
+        screening: Sàng lọc nhanh từng cặp trước DP (tỉ lệ độ dài, tỉ lệ khớp từ điển,
+            số điểm neo); cặp không đạt bị bỏ qua kèm lý do
+        review_path: File TSV ghi các cặp bị sàng lọc loại để review (None: không ghi)
+        log: Hàm nhận từng thông báo/cảnh báo (mặc định ``print``)
+    """
+    rejects = []
+    for _, rows, unit_rejects in _iter_units(nom_dir, vi_dir, k, reverse, mapping_path, kernel, linear_memory_cells,
+                                             workers, use_cache, cache_dir, pairing, screening, log=log):
+        rejects.extend(unit_rejects)
+        yield from rows
+    if screening and review_path:
+        write_review_list(rejects, review_path)
+
+
+def _checkpoint_config(nom_dir, vi_dir, k, reverse, mapping_path, kernel, pairing, screening):
+    """Cấu hình của một lần align, resume chỉ dùng lại checkpoint có cùng cấu hình."""
+    return {
+        "nom_dir": os.path.abspath(nom_dir),
+        "vi_dir": os.path.abspath(vi_dir),
+        "k": k,
+        "reverse": reverse,
+        "mapping": file_digest(mapping_path) if k == 2 and mapping_path and os.path.exists(mapping_path) else None,
+        "dictionaries": [file_digest(os.environ['NOM_SIMILARITY_DICTIONARY']), file_digest(os.environ['QN2NOM_DICTIONARY'])],
+        "kernel": kernel,
+        "pairing": pairing,
+        "screening": screening,
+        "named_entities": named_entities_enabled(),
+    }
+
+
+def align(nom_dir, vi_dir, output_txt, k=1, name_book="book", reverse=False, mapping_path=None, kernel="auto", linear_memory_cells=None, workers=1, use_cache=True, pairing="position", screening=False, checkpoint=False, resume=False, on_row=None, log=print):
+    """
+    Align Hán Nôm OCR (JSON) với Quốc Ngữ (TXT), ghi kết quả ra ``output_txt``
+    (mỗi AlignedRow của ``align_iter`` là một dòng)
+    
+    Khi bật checkpoint (hoặc resume), tiến độ được ghi vào ``<output_txt>.progress`` sau
+    mỗi trang/dòng mapping (xem ``checkpoint.AlignmentCheckpoint``); file này bị xoá khi
+    align xong.
+    
+    Args:
+        workers: Số tiến trình song song, xem ``align_iter``
+        use_cache: Dùng lại kết quả DP của các trang/dòng mapping không đổi nội dung
+            (thư mục ALIGN_CACHE_DIR hoặc ``.align_cache`` cạnh ``nom_dir``, như ``align_iter``).
+        pairing: Cách ghép trang khi k=1, xem ``align_iter``
+        screening: Sàng lọc trước DP, xem ``align_iter``; các cặp bị loại được ghi vào
+            ``screening_review.tsv`` cạnh ``output_txt``
+        checkpoint: Ghi progress (và fsync output) sau mỗi đơn vị để lần chạy bị ngắt
+            có thể resume
+        resume: Tiếp tục lần chạy bị ngắt (ngầm bật checkpoint): giữ các trang/dòng mapping đã xong trong
+            ``output_txt``, cắt phần đang ghi dở và chỉ align phần còn lại. Nếu không có
+            checkpoint cùng cấu hình thì align từ đầu.
+        on_row: Hàm gọi với mỗi AlignedRow mới ngay sau khi được ghi
+        log: Hàm nhận từng thông báo/cảnh báo, xem ``align_iter``
+    """
+    review_path = os.path.join(os.path.dirname(output_txt), REVIEW_FILE_NAME)
+    checkpointing = checkpoint or resume
+    config = _checkpoint_config(nom_dir, vi_dir, k, reverse, mapping_path, kernel, pairing, screening) if checkpointing else {}
+    progress = AlignmentCheckpoint(progress_path(output_txt) if checkpointing else None, config, output_path=output_txt)
+    # Không resume: xóa file output cũ và bắt đầu progress mới
+    done = progress.start(resume, log=log)
+    if done:
+        log(f"↻ Tiếp tục từ checkpoint: bỏ qua {len(done)} trang/dòng mapping đã xong ({progress.path})")
+    rejects = [ScreeningReject(*reject) for entry in done.values() for reject in entry.get("rejects", [])]
+    
+    units = _iter_units(nom_dir, vi_dir, k, reverse, mapping_path, kernel, linear_memory_cells, workers, use_cache,
+                        None, pairing, screening, done=done, log=log)
+    f = None
+    try:
+        for index, rows, unit_rejects in units:
+            if rows:
+                if f is None:
+                    f = open(output_txt, "a", encoding="utf-8")
+                for row in rows:
+                    f.write(row.to_line())
+                f.flush()
+                if checkpointing:
+                    # Dòng của đơn vị phải nằm trọn trên đĩa trước khi được ghi nhận là xong
+                    os.fsync(f.fileno())
+                if on_row:
+                    for row in rows:
+                        on_row(row)
+            rejects.extend(unit_rejects)
+            progress.record(index, rejects=[[r.left, r.right, r.reason, r.message] for r in unit_rejects])
+    finally:
+        if f is not None:
+            f.close()
+        progress.close()
+    progress.finish()
+    if screening:
+        write_review_list(rejects, review_path)
+
 
-        segments = []
-        # if k == 1:
-        num_word_hn = [len(sentence) for sentence in nom_data['text']]
-        flatten_nom = list("".join(nom_data['text']))
-        aligned_hn, aligned_qn = levenshtein_align_boxes(flatten_nom, quoc_ngu_list, similar, trans)
-        hn_remain, qn_remain = aligned_hn.copy(), aligned_qn.copy()
-        for num in num_word_hn:
-            if num == 0:
-                segments.append(("", ""))
-                continue
-            count, i = 0, 0
-            while i < len(hn_remain):
-                if hn_remain[i] != "*":
-                    count += 1
-                i += 1
-                if count == num:
-                    break
-
-            han_seg = hn_remain[:i]
-            qn_seg = qn_remain[:i]
-            segments.append((han_seg, qn_seg))
-            hn_remain = hn_remain[i:]
-            qn_remain = qn_remain[i:]
-
-        if hn_remain or qn_remain:
-            if segments:
-                last_han, last_qn = segments[-1]
-                segments[-1] = (last_han + hn_remain, last_qn + qn_remain)
-            else:
-                segments.append((hn_remain, qn_remain))
-
-        with open(output_txt, "a", encoding="utf-8") as f:
-            if len(nom_data['bbox']) != len(segments):
-                print(f"⚠️ Bỏ qua {json_file}: Số bbox ({len(nom_data['bbox'])}) ≠ segments ({len(segments)})")
-                continue
-            for bbox, (han_seg, qn_seg) in zip(nom_data['bbox'], segments):
-                if len(han_seg) != len(qn_seg):
-                    print(f"⚠️ Warning: Mismatch độ dài align tại file {json_file}. Hán={len(han_seg)}, Việt={len(qn_seg)}")
-                    continue
-                nom = ''.join(han_seg).strip()
-                qn = ' '.join(qn_seg).strip()
-
-                if not nom and not qn:
-                    continue
-
-                f.write(f"{json_file}\t{str(bbox)}\t{nom}\t{qn}\n")
+def write_rows(rows, output_txt):
+    """Ghi nối các AlignedRow vào ``output_txt`` (file chỉ được tạo khi có dòng đầu tiên)."""
+    f = None
+    try:
+        for row in rows:
+            if f is None:
+                f = open(output_txt, "a", encoding="utf-8")
+            f.write(row.to_line())
+    finally:
+        if f is not None:
+            f.close()
 
 
 # if __name__ == "__main__":
@@ -0,0 +1,135 @@
+"""
+Cache kết quả DP của align theo nội dung, để chạy lại chỉ tính các trang đã sửa.
+
+Khoá gồm hash chuỗi Hán Nôm đã làm phẳng, hash danh sách token Quốc Ngữ,
+phiên bản từ điển, k và kernel. Giá trị là cặp dãy đã căn (có ``*``); việc
+chia segment theo bbox và ghi result.txt vẫn chạy lại mỗi lần nên tên file
+hay toạ độ bbox thay đổi không làm cache sai.
+
+Cache có giới hạn dung lượng (ALIGN_CACHE_MAX_MB): ``prune`` xoá các entry lâu
+không dùng nhất (mỗi lần đọc trúng cache cập nhật mtime của entry).
+"""
+import hashlib
+import json
+import os
+from typing import List, Optional, Sequence, Tuple
+
+# Tăng khi đổi định dạng entry để mọi cache cũ bị bỏ qua
+CACHE_FORMAT = 1
+
+# Dung lượng tối đa mặc định của thư mục cache (MB), 0 = không giới hạn
+DEFAULT_MAX_MB = 512
+
+
+def default_cache_dir(nom_dir: str) -> str:
+    """Thư mục cache: ALIGN_CACHE_DIR nếu có, ngược lại ``.align_cache`` cạnh thư mục
+    JSON ``nom_dir`` (dùng chung cho align và align_iter)."""
+    return os.environ.get('ALIGN_CACHE_DIR') or os.path.join(os.path.dirname(os.path.abspath(nom_dir)), '.align_cache')
+
+
+def _digest(tokens: Sequence[str]) -> str:
+    h = hashlib.sha1()
+    for token in tokens:
+        h.update(token.encode('utf-8'))
+        h.update(b'\x00')
+    return h.hexdigest()
+
+
+class AlignmentCache:
+    """Cache trên đĩa, mỗi entry là một file JSON nhỏ ghi nguyên tử.
+
+    Đối tượng chỉ giữ đường dẫn và phiên bản từ điển nên gửi được sang worker.
+    """
+
+    def __init__(self, cache_dir: str, dictionary_version: str):
+        self.cache_dir = cache_dir
+        self.dictionary_version = dictionary_version
+
+    def key(self, nom_chars: Sequence[str], qn_tokens: Sequence[str], k: int, kernel: str) -> str:
+        parts = [str(CACHE_FORMAT), _digest(nom_chars), _digest(qn_tokens), self.dictionary_version, str(k), kernel]
+        return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f'{key}.json')
+
+    def get(self, key: str) -> Optional[Tuple[List[str], List[str]]]:
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('format') != CACHE_FORMAT:
+            return None
+        try:
+            # Đánh dấu vừa dùng để prune giữ lại
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        return entry['left'], entry['right']
+
+    def put(self, key: str, aligned_left: List[str], aligned_right: List[str]) -> None:
+        path = self._path(key)
+        tmp = f'{path}.tmp-{os.getpid()}'
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'format': CACHE_FORMAT, 'left': aligned_left, 'right': aligned_right}, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except OSError:
+            # Cache chỉ để tăng tốc: không ghi được thì bỏ qua
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def prune(self, max_bytes: Optional[int] = None) -> int:
+        """
+        Xoá các entry cũ nhất (theo mtime) cho tới khi thư mục cache không vượt quá
+        ``max_bytes`` (mặc định: ALIGN_CACHE_MAX_MB)
+
+        Returns:
+            Số entry đã xoá
+        """
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get('ALIGN_CACHE_MAX_MB') or DEFAULT_MAX_MB) * 1024 * 1024)
+        return prune_directory(self.cache_dir, max_bytes)
+
+
+def prune_directory(cache_dir: str, max_bytes: int) -> int:
+    """
+    Xoá các file cũ nhất (theo mtime) trong các thư mục con của ``cache_dir`` cho tới
+    khi tổng dung lượng không vượt quá ``max_bytes`` (<= 0 là không giới hạn)
+
+    Returns:
+        Số file đã xoá
+    """
+    if max_bytes <= 0:
+        return 0
+    entries = []
+    total = 0
+    try:
+        shards = os.scandir(cache_dir)
+    except OSError:
+        return 0
+    with shards:
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
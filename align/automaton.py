@@ -0,0 +1,61 @@
+"""
+Automaton Aho–Corasick trên tập âm tiết: tìm mọi lần xuất hiện của mọi âm tiết trong
+một chuỗi bằng một lượt duyệt, thay vì gọi ``str.find`` với từng âm tiết của danh sách.
+"""
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+
+class AhoCorasick:
+    """
+    Automaton dựng một lần từ danh sách mẫu (bỏ qua mẫu rỗng)
+
+    Mỗi nút là một tiền tố của một mẫu; ``_lengths[nút]`` là độ dài các mẫu là hậu tố
+    của tiền tố đó (mẫu của chính nút rồi tới các nút theo liên kết fail).
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        goto: List[Dict[str, int]] = [{}]
+        lengths: List[Tuple[int, ...]] = [()]
+        for pattern in patterns:
+            if not pattern:
+                continue
+            node = 0
+            for ch in pattern:
+                child = goto[node].get(ch)
+                if child is None:
+                    child = goto[node][ch] = len(goto)
+                    goto.append({})
+                    lengths.append(())
+                node = child
+            lengths[node] = (len(pattern),)
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in goto[node].items():
+                state = fail[node]
+                while state and ch not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(ch, 0)
+                lengths[child] += lengths[fail[child]]
+                queue.append(child)
+
+        self._goto = goto
+        self._fail = fail
+        self._lengths = lengths
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+    def matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Các lần xuất hiện (end, length) theo end tăng dần: text[end - length:end] là một mẫu."""
+        goto, fail, lengths = self._goto, self._fail, self._lengths
+        node = 0
+        for end, ch in enumerate(text, 1):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length in lengths[node]:
+                yield end, length
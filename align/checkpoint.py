@@ -0,0 +1,133 @@
+"""
+Checkpoint cho các lần align dài (nhiều dòng mapping k=2), để chạy lại sau khi bị
+ngắt mà không phải làm lại từ đầu.
+
+File progress (JSON lines) nằm cạnh file kết quả:
+- dòng đầu là cấu hình của lần chạy (thư mục, mapping, k, kernel, từ điển...);
+  resume với cấu hình khác sẽ bắt đầu lại từ đầu,
+- mỗi dòng sau ứng với một đơn vị (trang k=1 / dòng mapping k=2) đã xong: chỉ số
+  đơn vị, offset byte cuối của nó trong file output (nếu có) và dữ liệu kèm theo.
+
+Một đơn vị chỉ được ghi vào progress sau khi các dòng của nó đã nằm trọn trong file
+output, nên khi resume chỉ cần cắt file output về offset cuối cùng đã ghi nhận. File
+progress bị xoá khi lần chạy kết thúc bình thường (``finish``).
+"""
+import json
+import os
+from typing import Any, Callable, Dict, Optional
+
+# Tăng khi đổi định dạng file progress để checkpoint cũ bị bỏ qua
+CHECKPOINT_FORMAT = 1
+
+
+def progress_path(output_path: str) -> str:
+    return f'{output_path}.progress'
+
+
+def _size(path: Optional[str]) -> int:
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return 0
+
+
+class AlignmentCheckpoint:
+    """
+    Ghi nhận tiến độ theo từng đơn vị
+
+    Args:
+        path: File progress (None: không checkpoint, tiến độ chỉ giữ trong bộ nhớ)
+        config: Cấu hình của lần chạy (JSON được), dùng để nhận ra checkpoint cũ
+        output_path: File output được ghi nối theo từng đơn vị (None nếu dữ liệu
+            của đơn vị nằm luôn trong file progress)
+    """
+
+    def __init__(self, path: Optional[str], config: Dict[str, Any], output_path: Optional[str] = None):
+        self.path = path
+        self.config = dict(config, format=CHECKPOINT_FORMAT)
+        self.output_path = output_path
+        self.done: Dict[int, Dict[str, Any]] = {}
+        self._file = None
+
+    def _load(self) -> Optional[int]:
+        """Đọc progress khớp cấu hình; trả về số byte hợp lệ (bỏ dòng ghi dở ở cuối)."""
+        if self.path is None:
+            return None
+        try:
+            with open(self.path, 'rb') as f:
+                lines = f.readlines()
+        except OSError:
+            return None
+        valid = 0
+        for n, line in enumerate(lines):
+            if not line.endswith(b'\n'):
+                break
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            if n == 0:
+                if entry != self.config:
+                    return None
+            else:
+                self.done[entry['unit']] = entry
+            valid += len(line)
+        return valid or None
+
+    def start(self, resume: bool = False, log: Callable[[str], None] = print) -> Dict[int, Dict[str, Any]]:
+        """
+        Bắt đầu ghi progress
+
+        Args:
+            log: Hàm nhận cảnh báo khi checkpoint không dùng được
+
+        Returns:
+            Các đơn vị đã xong (chỉ số -> entry); rỗng nếu bắt đầu lại từ đầu
+        """
+        self.done = {}
+        valid = self._load() if resume else None
+        offset = max((entry.get('offset', 0) for entry in self.done.values()), default=0)
+        if valid is not None and self.output_path and _size(self.output_path) < offset:
+            # File output ngắn hơn progress: không tin được, làm lại từ đầu
+            log(f"⚠️ Checkpoint không khớp {self.output_path}, align lại từ đầu")
+            valid = None
+        if valid is None:
+            self.done = {}
+            if self.output_path and os.path.exists(self.output_path):
+                os.remove(self.output_path)
+            if self.path is None:
+                return self.done
+            with open(self.path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(self.config, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+        else:
+            # Cắt dòng progress ghi dở và phần output của đơn vị đang ghi khi bị ngắt
+            os.truncate(self.path, valid)
+            if self.output_path and os.path.exists(self.output_path):
+                os.truncate(self.output_path, offset)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        return self.done
+
+    def record(self, unit: int, **data: Any) -> None:
+        """Ghi nhận đơn vị ``unit`` đã xong (gọi sau khi output của nó đã được flush)."""
+        entry = {'unit': unit, **data}
+        if self._file is not None:
+            if self.output_path:
+                entry['offset'] = _size(self.output_path)
+            self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self._file.flush()
+            # Dòng progress phải nằm trên đĩa, không chỉ trong page cache, trước khi align đi tiếp
+            os.fsync(self._file.fileno())
+        self.done[unit] = entry
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def finish(self) -> None:
+        """Đóng và xoá file progress khi lần chạy đã xong (không còn gì để resume)."""
+        self.close()
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
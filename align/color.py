@@ -4,259 +4,336 @@ from xlsxwriter import Workbook # type: ignore
 import os
 from tqdm import tqdm # type: ignore
 from .tokenizer import LoadModel
+from .dictionary import load_dictionary
+from .trie import build_trie, trie_pattern
 import re
+import heapq
 import Levenshtein
 import unicodedata
 import ast
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from pathlib import Path
 
-quocngu_dict = pd.read_excel(r'dict\QuocNgu_SinoNom_Dic.xlsx')
-similar_dict = pd.read_excel(r'dict\SinoNom_Similar_Dic_v2.xlsx')
+# Thư mục dict/ của repo, không phụ thuộc thư mục đang chạy
+DICT_DIR = Path(__file__).parent.parent / 'dict'
+
+quocngu_dict = load_dictionary(str(DICT_DIR / 'QuocNgu_SinoNom_Dic.xlsx'))
+similar_dict = load_dictionary(str(DICT_DIR / 'SinoNom_Similar_Dic_v2.xlsx'))
 model = LoadModel()
 
 
-def normalize_vietnamese_text(text):
-    text = unicodedata.normalize('NFKC', text)
+# Các bảng sửa dấu/vần, áp dụng theo đúng thứ tự dưới đây (như chuỗi str.replace cũ)
+gi_consonant_corrections = {
+    "gía": "giá", "gìa": "già", "gỉa": "giả", "gĩa": "giã", "gịa": "giạ",
+    "gíu": "giú", "gìu": "giù", "gỉu": "giủ", "gĩu": "giũ", "gịu": "giụ",
     
-    gi_consonant_corrections = {
-        "gía": "giá", "gìa": "già", "gỉa": "giả", "gĩa": "giã", "gịa": "giạ",
-        "gíu": "giú", "gìu": "giù", "gỉu": "giủ", "gĩu": "giũ", "gịu": "giụ",
-        
-        "gío": "gió", "gìo": "giò", "gỉo": "giỏ", "gĩo": "giõ", "gịo": "giọ",
-        "gíê": "giế", "gìê": "giề", "gỉê": "giể", "gĩê": "giễ", "gịê": "giệ",
+    "gío": "gió", "gìo": "giò", "gỉo": "giỏ", "gĩo": "giõ", "gịo": "giọ",
+    "gíê": "giế", "gìê": "giề", "gỉê": "giể", "gĩê": "giễ", "gịê": "giệ",
+
+    "gíơ": "giớ", "gìơ": "giờ", "gỉơ": "giở", "gĩơ": "giỡ", "gịơ": "giợ",
     
-        "gíơ": "giớ", "gìơ": "giờ", "gỉơ": "giở", "gĩơ": "giỡ", "gịơ": "giợ",
-        
-        "gíâ": "giấ", "gìâ": "giầ", "gỉâ": "giẩ", "gĩâ": "giẫ", "gịâ": "giậ",
-        
-        "gíô": "giố", "gìô": "giồ", "gỉô": "giổ", "gĩô": "giỗ", "gịô": "giộ",
-        "gíă": "giắ", "gìă": "giằ", "gỉă": "giẳ", "gĩă": "giẵ", "gịă": "giặ",
-        
-        "gían": "gián", "gìan": "giàn", "gỉan": "giản", "gĩan": "giãn", "gịan": "giạn",
-        "gíang": "giáng", "gìang": "giàng", "gỉang": "giảng", "gĩang": "giãng", "gịang": "giạng",
-        "gíêng": "giếng", "gìêng": "giềng", "gỉêng": "giểng", "gĩêng": "giễng", "gịêng": "giệng",
-        "gíêt": "giết", "gìêt": "giệt", "gỉêt": "giệt", "gĩêt": "giệt", "gịêt": "giệt",
-        "gíêu": "giếu", "gìêu": "giều", "gỉêu": "giểu", "gĩêu": "giễu", "gịêu": "giệu",
-        "gíong": "giống", "gìong": "giồng", "gỉong": "giổng", "gĩong": "giỗng", "gịong": "giộng",
-        "gíông": "giống", "gìông": "giồng", "gỉông": "giổng", "gĩông": "giỗng", "gịông": "giộng",
-        "gíai": "giái", "gìai": "giài", "gỉai": "giải", "gĩai": "giãi", "gịai": "giại",
-        "gíam": "giám", "gìam": "giàm", "gỉam": "giảm", "gĩam": "giãm", "gịam": "giạm",
-        "gíáp": "giáp",
-        "gíóc": "giốc", "gịoc": "giộc",
-        "gíuc": "giúc", "gịuc": "giục",
-        "gíup": "giúp", "gịup": "giụp",
-        "qủa": "quả", "qúa": "quá", "qũa": "quã", "qùa": "quà", "qụa": "quạ",
-        "qủă": "quẳ", "qúă": "quắ", "qũă": "quẵ", "qùă": "quằ", "qụă": "quặ",
-        "qủâ": "quẩ", "qúâ": "quấ", "qũâ": "quẫ", "qùâ": "quầ", "qụâ": "quậ",
-        "qủe": "quẻ", "qúe": "qué", "qũe": "quẽ", "qùe": "què", "qụe": "quẹ",
-        "qủê": "quể", "qúê": "quế", "qũê": "quễ", "qùê": "quề", "qụê": "quệ",
-        "qủy": "quỷ", "qúy": "quý", "qũy": "quỹ", "qùy": "quỳ", "qụy": "quỵ",
-    }
+    "gíâ": "giấ", "gìâ": "giầ", "gỉâ": "giẩ", "gĩâ": "giẫ", "gịâ": "giậ",
     
-    o_vowel_pairs = {
-        "òa": "oà", "óa": "oá", "ỏa": "oả", "õa": "oã", "ọa": "oạ",
-        "òac": "oàc", "óac": "oác", "ỏac": "oảc", "õac": "oãc", "ọac": "oạc",
-        "òach": "oàch", "óach": "oách", "ỏach": "oảch", "õach": "oãch", "ọach": "oạch",
-        "òai": "oài", "óai": "oái", "ỏai": "oải", "õai": "oãi", "ọai": "oại",
-        "òam": "oàm", "óam": "oám", "ỏam": "oảm", "õam": "oãm", "ọam": "oạm",
-        "òan": "oàn", "óan": "oán", "ỏan": "oản", "õan": "oãn", "ọan": "oạn",
-        "òang": "oàng", "óang": "oáng", "ỏang": "oảng", "õang": "oãng", "ọang": "oạng",
-        "òanh": "oành", "óanh": "oánh", "ỏanh": "oảnh", "õanh": "oãnh", "ọanh": "oạnh",
-        "òao": "oào", "óao": "oáo", "ỏao": "oảo", "õao": "oão", "ọao": "oạo",
-        "òap": "oàp", "óap": "oáp", "ọap": "oạp",
-        "òat": "oàt", "óat": "oát", "ọat": "oạt",
-        "òay": "oày", "óay": "oáy", "ỏay": "oảy", "õay": "oãy", "ọay": "oạy",
-        
-        "òăc": "oằc", "óăc": "oắc", "ọăc": "oặc",
-        "òăm": "oằm", "óăm": "oắm", "ỏăm": "oẳm", "õăm": "oẵm", "ọăm": "oặm",
-        "òăn": "oằn", "óăn": "oắn", "ỏăn": "oẳn", "õăn": "oẵn", "ọăn": "oặn",
-        "òăng": "oằng", "óăng": "oắng", "ỏăng": "oẳng", "õăng": "oẵng", "ọăng": "oặng",
-        "òăp": "oằp", "óăp": "oắp", "ọăp": "oặp",
-        "òăt": "oằt", "óăt": "oắt", "ọăt": "oặt",
-        
-        "òe": "oè", "óe": "oé", "ỏe": "oẻ", "õe": "oẽ", "ọe": "oẹ",
-        "òen": "oèn", "óen": "oén", "ỏen": "oẻn", "õen": "oẽn", "ọen": "oẹn",
-        "òeo": "oèo", "óeo": "oéo", "ỏeo": "oẻo", "õeo": "oẽo", "ọeo": "oẹo",
-        "óep": "oép", "ọep": "oẹp",
-        "óet": "oét", "ọet": "oẹt",
-    }
+    "gíô": "giố", "gìô": "giồ", "gỉô": "giổ", "gĩô": "giỗ", "gịô": "giộ",
+    "gíă": "giắ", "gìă": "giằ", "gỉă": "giẳ", "gĩă": "giẵ", "gịă": "giặ",
     
-    u_vowel_pairs = {
-        "ùâ": "uầ", "úâ": "uấ", "ủâ": "uẩ", "ũâ": "uẫ", "ụâ": "uậ",
-        "ùâc": "uầc", "úâc": "uấc", "ụâc": "uậc",
-        "ùân": "uần", "úân": "uấn", "ủân": "uẩn", "ũân": "uẫn", "ụân": "uận",
-        "ùâng": "uầng", "úâng": "uấng", "ủâng": "uẩng", "ũâng": "uẫng", "ụâng": "uậng",
-        "ùât": "uầt", "úât": "uất", "ụât": "uật",
-        "ùây": "uầy", "úây": "uấy", "ủây": "uẩy", "ũây": "uẫy", "ụây": "uậy",
-        
-        "ùê": "uề", "úê": "uế", "ủê": "uể", "ũê": "uễ", "ụê": "uệ",
-        "ùêch": "uềch", "úêch": "uếch", "ụêch": "uệch",
-        "ùên": "uền", "úên": "uến", "ủên": "uển", "ũên": "uễn", "ụên": "uện",
-        "ùênh": "uềnh", "úênh": "uếnh", "ủênh": "uểnh", "ũênh": "uễnh", "ụênh": "uệnh",
-        "ùêt": "uềt", "úêt": "uết", "ụêt": "uệt",
-        "ùêu": "uều", "úêu": "uếu", "ủêu": "uểu", "ũêu": "uễu", "ụêu": "uệu",
-        
-        "ùy": "uỳ", "úy": "uý", "ủy": "uỷ", "ũy": "uỹ", "ụy": "uỵ",
-        "ùych": "uỳch", "úych": "uých", "ụych": "uỵch",
-        "ùyn": "uỳn", "úyn": "uýn", "ủyn": "uỷn", "ũyn": "uỹn", "ụyn": "uỵn",
-        "ùynh": "uỳnh", "úynh": "uýnh", "ủynh": "uỷnh", "ũynh": "uỹnh", "ụynh": "uỵnh",
-        "ùyp": "uỳp", "úyp": "uýp", "ụyp": "uỵp",
-        "ùyt": "uỳt", "úyt": "uýt", "ụyt": "uỵt",
-        "ùyu": "uỳu", "úyu": "uýu", "ủyu": "uỷu", "ũyu": "uỹu", "ụyu": "uỵu",
-        
-        "ùơ": "uờ", "úơ": "uớ", "ủơ": "uở", "ũơ": "uỡ", "ụơ": "uợ",
-        "ùơi": "uời", "úơi": "uới", "ủơi": "uởi", "ũơi": "uỡi", "ụơi": "uợi",
-        
-        "ùô": "uồ", "úô": "uố", "ủô": "uổ", "ũô": "uỗ", "ụô": "uộ",
-        "ùôc": "uồc", "úôc": "uốc", "ụôc": "uộc",
-        "ùôi": "uồi", "úôi": "uối", "ủôi": "uổi", "ũôi": "uỗi", "ụôi": "uội",
-        "ùôm": "uồm", "úôm": "uốm", "ủôm": "uổm", "ũôm": "uỗm", "ụôm": "uộm",
-        "ùôn": "uồn", "úôn": "uốn", "ủôn": "uổn", "ũôn": "uỗn", "ụôn": "uộn",
-        "ùông": "uồng", "úông": "uống", "ủông": "uổng", "ũông": "uỗng", "ụông": "uộng",
-        "ùôt": "uồt", "úôt": "uốt", "ụôt": "uột",
-    }
+    "gían": "gián", "gìan": "giàn", "gỉan": "giản", "gĩan": "giãn", "gịan": "giạn",
+    "gíang": "giáng", "gìang": "giàng", "gỉang": "giảng", "gĩang": "giãng", "gịang": "giạng",
+    "gíêng": "giếng", "gìêng": "giềng", "gỉêng": "giểng", "gĩêng": "giễng", "gịêng": "giệng",
+    "gíêt": "giết", "gìêt": "giệt", "gỉêt": "giệt", "gĩêt": "giệt", "gịêt": "giệt",
+    "gíêu": "giếu", "gìêu": "giều", "gỉêu": "giểu", "gĩêu": "giễu", "gịêu": "giệu",
+    "gíong": "giống", "gìong": "giồng", "gỉong": "giổng", "gĩong": "giỗng", "gịong": "giộng",
+    "gíông": "giống", "gìông": "giồng", "gỉông": "giổng", "gĩông": "giỗng", "gịông": "giộng",
+    "gíai": "giái", "gìai": "giài", "gỉai": "giải", "gĩai": "giãi", "gịai": "giại",
+    "gíam": "giám", "gìam": "giàm", "gỉam": "giảm", "gĩam": "giãm", "gịam": "giạm",
+    "gíáp": "giáp",
+    "gíóc": "giốc", "gịoc": "giộc",
+    "gíuc": "giúc", "gịuc": "giục",
+    "gíup": "giúp", "gịup": "giụp",
+    "qủa": "quả", "qúa": "quá", "qũa": "quã", "qùa": "quà", "qụa": "quạ",
+    "qủă": "quẳ", "qúă": "quắ", "qũă": "quẵ", "qùă": "quằ", "qụă": "quặ",
+    "qủâ": "quẩ", "qúâ": "quấ", "qũâ": "quẫ", "qùâ": "quầ", "qụâ": "quậ",
+    "qủe": "quẻ", "qúe": "qué", "qũe": "quẽ", "qùe": "què", "qụe": "quẹ",
+    "qủê": "quể", "qúê": "quế", "qũê": "quễ", "qùê": "quề", "qụê": "quệ",
+    "qủy": "quỷ", "qúy": "quý", "qũy": "quỹ", "qùy": "quỳ", "qụy": "quỵ",
+}
+
+o_vowel_pairs = {
+    "òa": "oà", "óa": "oá", "ỏa": "oả", "õa": "oã", "ọa": "oạ",
+    "òac": "oàc", "óac": "oác", "ỏac": "oảc", "õac": "oãc", "ọac": "oạc",
+    "òach": "oàch", "óach": "oách", "ỏach": "oảch", "õach": "oãch", "ọach": "oạch",
+    "òai": "oài", "óai": "oái", "ỏai": "oải", "õai": "oãi", "ọai": "oại",
+    "òam": "oàm", "óam": "oám", "ỏam": "oảm", "õam": "oãm", "ọam": "oạm",
+    "òan": "oàn", "óan": "oán", "ỏan": "oản", "õan": "oãn", "ọan": "oạn",
+    "òang": "oàng", "óang": "oáng", "ỏang": "oảng", "õang": "oãng", "ọang": "oạng",
+    "òanh": "oành", "óanh": "oánh", "ỏanh": "oảnh", "õanh": "oãnh", "ọanh": "oạnh",
+    "òao": "oào", "óao": "oáo", "ỏao": "oảo", "õao": "oão", "ọao": "oạo",
+    "òap": "oàp", "óap": "oáp", "ọap": "oạp",
+    "òat": "oàt", "óat": "oát", "ọat": "oạt",
+    "òay": "oày", "óay": "oáy", "ỏay": "oảy", "õay": "oãy", "ọay": "oạy",
     
-    i_vowel_pairs = {
-        "ỳa": "ỳa", "ýa": "ýa", "ỷa": "ỷa", "ỹa": "ỹa", "ỵa": "ỵa",
-        
-        "ùya": "uỳa", "úya": "uýa", "ủya": "uỷa", "ũya": "uỹa", "ụya": "uỵa",
-        
-        "ìê": "iề", "íê": "iế", "ỉê": "iể", "ĩê": "iễ", "ịê": "iệ",
-        "ỳê": "yề", "ýê": "yế", "ỷê": "yể", "ỹê": "yễ", "ỵê": "yệ",
-        
-        "ìêc": "iềc", "íêc": "iếc", "ịêc": "iệc",
-        
-        "ìêm": "iềm", "íêm": "iếm", "ỉêm": "iểm", "ĩêm": "iễm", "ịêm": "iệm",
-        "ỳêm": "yềm", "ýêm": "yếm", "ỷêm": "yểm", "ỹêm": "yễm", "ỵêm": "yệm",
-        
-        "ìên": "iền", "íên": "iến", "ỉên": "iển", "ĩên": "iễn", "ịên": "iện",
-        "ỳên": "yền", "ýên": "yến", "ỷên": "yển", "ỹên": "yễn", "ỵên": "yện",
-        
-        "ìêng": "iềng", "íêng": "iếng", "ỉêng": "iểng", "ĩêng": "iễng", "ịêng": "iệng",
-        "ỳêng": "yềng", "ýêng": "yếng", "ỷêng": "yểng", "ỹêng": "yễng", "ỵêng": "yệng",
-        
-        "ìêp": "iềp", "íêp": "iếp", "ịêp": "iệp",
-        
-        "ìêt": "iềt", "íêt": "iết", "ịêt": "iệt",
-        "ỳêt": "yềt", "ýêt": "yết", "ỵêt": "yệt",
-        
-        "ìêu": "iều", "íêu": "iếu", "ỉêu": "iểu", "ĩêu": "iễu", "ịêu": "iệu",
-        "ỳêu": "yều", "ýêu": "yếu", "ỷêu": "yểu", "ỹêu": "yễu", "ỵêu": "yệu",
-        
-        "ùyên": "uyền", "úyên": "uyến", "ủyên": "uyển", "ũyên": "uyễn", "ụyên": "uyện",
-        "ùyêt": "uyềt", "úyêt": "uyết", "ụyêt": "uyệt",
-    }
+    "òăc": "oằc", "óăc": "oắc", "ọăc": "oặc",
+    "òăm": "oằm", "óăm": "oắm", "ỏăm": "oẳm", "õăm": "oẵm", "ọăm": "oặm",
+    "òăn": "oằn", "óăn": "oắn", "ỏăn": "oẳn", "õăn": "oẵn", "ọăn": "oặn",
+    "òăng": "oằng", "óăng": "oắng", "ỏăng": "oẳng", "õăng": "oẵng", "ọăng": "oặng",
+    "òăp": "oằp", "óăp": "oắp", "ọăp": "oặp",
+    "òăt": "oằt", "óăt": "oắt", "ọăt": "oặt",
     
-    ư_vowel_pairs = {
-        "ưà": "ừa", "ưá": "ứa", "ưả": "ửa", "ưã": "ữa", "ưạ": "ựa",
-        
-        "ưò": "ườ", "ưó": "ướ", "ưỏ": "ưở", "ưõ": "ưỡ", "ưọ": "ượ",
-        
-        "ưòc": "ườc", "ưóc": "ước", "ưọc": "ược",
-        
-        "ưòi": "ười", "ưói": "ưới", "ưỏi": "ưởi", "ưõi": "ưỡi", "ưọi": "ượi",
-        "ừoi": "ười", "ứoi": "ưới", "ửoi": "ưởi", "ữoi": "ưỡi", "ựoi": "ượi",
-        
-        "ưòm": "ườm", "ưóm": "ướm", "ưỏm": "ưởm", "ưõm": "ưỡm", "ưọm": "ượm",
-        
-        "ưòn": "ườn", "ưón": "ướn", "ưỏn": "ưởn", "ưõn": "ưỡn", "ưọn": "ượn",
-        
-        "ưòng": "ường", "ưóng": "ướng", "ưỏng": "ưởng", "ưõng": "ưỡng", "ưọng": "ượng",
-        
-        "ưòp": "ườp", "ưóp": "ướp", "ưọp": "ượp", "ừơp": "ườp", "ứơp": "ướp", "ựơp": "ượp",
-        
-        "ưót": "ướt", "ưọt": "ượt", "ứơt": "ướt", "ựơt": "ượt",
-        
-        "ưòu": "ườu", "ưóu": "ướu", "ưỏu": "ưởu", "ưõu": "ưỡu", "ưọu": "ượu",
-        "ừơu": "ườu", "ứơu": "ướu", "ửơu": "ưởu", "ữơu": "ưỡu", "ựơu": "ượu",
-    }
+    "òe": "oè", "óe": "oé", "ỏe": "oẻ", "õe": "oẽ", "ọe": "oẹ",
+    "òen": "oèn", "óen": "oén", "ỏen": "oẻn", "õen": "oẽn", "ọen": "oẹn",
+    "òeo": "oèo", "óeo": "oéo", "ỏeo": "oẻo", "õeo": "oẽo", "ọeo": "oẹo",
+    "óep": "oép", "ọep": "oẹp",
+    "óet": "oét", "ọet": "oẹt",
+}
+
+u_vowel_pairs = {
+    "ùâ": "uầ", "úâ": "uấ", "ủâ": "uẩ", "ũâ": "uẫ", "ụâ": "uậ",
+    "ùâc": "uầc", "úâc": "uấc", "ụâc": "uậc",
+    "ùân": "uần", "úân": "uấn", "ủân": "uẩn", "ũân": "uẫn", "ụân": "uận",
+    "ùâng": "uầng", "úâng": "uấng", "ủâng": "uẩng", "ũâng": "uẫng", "ụâng": "uậng",
+    "ùât": "uầt", "úât": "uất", "ụât": "uật",
+    "ùây": "uầy", "úây": "uấy", "ủây": "uẩy", "ũây": "uẫy", "ụây": "uậy",
     
-    incorrect_diacritic_placement = {
-        "uơì": "ười", "uơí": "ưới", "uơỉ": "ưởi", "uơĩ": "ưỡi", "uơị": "ượi",
-        
-        "iêù": "iều", "iêú": "iếu", "iêủ": "iểu", "iêũ": "iễu", "iêụ": "iệu",
-        "yêù": "yều", "yêú": "yếu", "yêủ": "yểu", "yêũ": "yễu", "yêụ": "yệu",      
-    }
+    "ùê": "uề", "úê": "uế", "ủê": "uể", "ũê": "uễ", "ụê": "uệ",
+    "ùêch": "uềch", "úêch": "uếch", "ụêch": "uệch",
+    "ùên": "uền", "úên": "uến", "ủên": "uển", "ũên": "uễn", "ụên": "uện",
+    "ùênh": "uềnh", "úênh": "uếnh", "ủênh": "uểnh", "ũênh": "uễnh", "ụênh": "uệnh",
+    "ùêt": "uềt", "úêt": "uết", "ụêt": "uệt",
+    "ùêu": "uều", "úêu": "uếu", "ủêu": "uểu", "ũêu": "uễu", "ụêu": "uệu",
     
-    reversed_vowels = {
-        # "ià": "ìa", "ía": "ía", "ỉa": "ỉa", "ĩa": "ĩa", "ịa": "ịa",
-        "aì": "ài", "aí": "ái", "aỉ": "ải", "aĩ": "ãi", "aị": "ại",
-        
-        "aù": "àu", "aú": "áu", "aủ": "ảu", "aũ": "ãu", "aụ": "ạu",
-        
-        "aò": "ào", "aó": "áo", "aỏ": "ảo", "aõ": "ão", "aọ": "ạo",
-        
-        "âù": "ầu", "âú": "ấu", "âủ": "ẩu", "âũ": "ẫu", "âụ": "ậu",
-        
-        "eò": "èo", "eó": "éo", "eỏ": "ẻo", "eõ": "ẽo", "eọ": "ẹo",
-        
-        "êù": "ều", "êú": "ếu", "êủ": "ểu", "êũ": "ễu", "êụ": "ệu",
-        
-        "oì": "òi", "oí": "ói", "oỉ": "ỏi", "oĩ": "õi", "oị": "ọi",
-        
-        "ôì": "ồi", "ôí": "ối", "ôỉ": "ổi", "ôĩ": "ỗi", "ôị": "ội",
-        
-        "ơì": "ời", "ơí": "ới", "ơỉ": "ởi", "ơĩ": "ỡi", "ơị": "ợi",
-        
-        "uì": "ùi", "uí": "úi", "uỉ": "ủi", "uĩ": "ũi", "uị": "ụi",
-        
-        "ưì": "ừi", "ưí": "ứi", "ưỉ": "ửi", "ưĩ": "ữi", "ưị": "ựi",
-        
-        "oà": "oà", "oá": "oá", "oả": "oả", "oã": "oã", "oạ": "oạ",
-        "òa": "oà", "óa": "oá", "ỏa": "oả", "õa": "oã", "ọa": "oạ",
-        
-        "oè": "oè", "oé": "oé", "oẻ": "oẻ", "oẽ": "oẽ", "oẹ": "oẹ",
-        "òe": "oè", "óe": "oé", "ỏe": "oẻ", "õe": "oẽ", "ọe": "oẹ",
-        
-        "uề": "uề", "uế": "uế", "uể": "uể", "uễ": "uễ", "uệ": "uệ",
-        "ùê": "uề", "úê": "uế", "ủê": "uể", "ũê": "uễ", "ụê": "uệ",
-        
-       
-        # "uá": "úa", "uà": "ùa", "uả": "ủa", "uã": "ũa", "uạ": "ụa",
-        
-        "ưà": "ừa", "ưá": "ứa", "ưả": "ửa", "ưã": "ữa", "ưạ": "ựa",
-        "ưa": "ưa", "ưá": "ứa", "ưà": "ừa", "ưả": "ửa", "ưã": "ữa", "ưạ": "ựa",
-        "aò": "ào", "aó": "áo", "aỏ": "ảo", "aõ": "ão", "aọ": "ạo",
-        "eò": "èo", "eó": "éo", "eỏ": "ẻo", "eõ": "ẽo", "eọ": "ẹo",
-        
-        
-        "uừ": "ừu", "uứ": "ứu", "uử": "ửu", "uữ": "ữu", "uự": "ựu",   
-        
-        "aừ": "ừa", "aứ": "ứa", "aử": "ửa", "aữ": "ữa", "aự": "ựa",
-    }
+    "ùy": "uỳ", "úy": "uý", "ủy": "uỷ", "ũy": "uỹ", "ụy": "uỵ",
+    "ùych": "uỳch", "úych": "uých", "ụych": "uỵch",
+    "ùyn": "uỳn", "úyn": "uýn", "ủyn": "uỷn", "ũyn": "uỹn", "ụyn": "uỵn",
+    "ùynh": "uỳnh", "úynh": "uýnh", "ủynh": "uỷnh", "ũynh": "uỹnh", "ụynh": "uỵnh",
+    "ùyp": "uỳp", "úyp": "uýp", "ụyp": "uỵp",
+    "ùyt": "uỳt", "úyt": "uýt", "ụyt": "uỵt",
+    "ùyu": "uỳu", "úyu": "uýu", "ủyu": "uỷu", "ũyu": "uỹu", "ụyu": "uỵu",
     
-    html_entities = {
-        "&#91;": "[", "&#93;": "]", "&quot;": "\"", "&apos;": "'",
-        "&lt;": "<", "&gt;": ">", "&amp;": "&", "&nbsp;": " "
-    }
+    "ùơ": "uờ", "úơ": "uớ", "ủơ": "uở", "ũơ": "uỡ", "ụơ": "uợ",
+    "ùơi": "uời", "úơi": "uới", "ủơi": "uởi", "ũơi": "uỡi", "ụơi": "uợi",
     
-    all_corrections = {
-        **gi_consonant_corrections,
-        **o_vowel_pairs,
-        **u_vowel_pairs,
-        **i_vowel_pairs,
-        **ư_vowel_pairs,
-        **incorrect_diacritic_placement,
-        **reversed_vowels,
-        **html_entities
-    }
+    "ùô": "uồ", "úô": "uố", "ủô": "uổ", "ũô": "uỗ", "ụô": "uộ",
+    "ùôc": "uồc", "úôc": "uốc", "ụôc": "uộc",
+    "ùôi": "uồi", "úôi": "uối", "ủôi": "uổi", "ũôi": "uỗi", "ụôi": "uội",
+    "ùôm": "uồm", "úôm": "uốm", "ủôm": "uổm", "ũôm": "uỗm", "ụôm": "uộm",
+    "ùôn": "uồn", "úôn": "uốn", "ủôn": "uổn", "ũôn": "uỗn", "ụôn": "uộn",
+    "ùông": "uồng", "úông": "uống", "ủông": "uổng", "ũông": "uỗng", "ụông": "uộng",
+    "ùôt": "uồt", "úôt": "uốt", "ụôt": "uột",
+}
+
+i_vowel_pairs = {
+    "ỳa": "ỳa", "ýa": "ýa", "ỷa": "ỷa", "ỹa": "ỹa", "ỵa": "ỵa",
+    
+    "ùya": "uỳa", "úya": "uýa", "ủya": "uỷa", "ũya": "uỹa", "ụya": "uỵa",
+    
+    "ìê": "iề", "íê": "iế", "ỉê": "iể", "ĩê": "iễ", "ịê": "iệ",
+    "ỳê": "yề", "ýê": "yế", "ỷê": "yể", "ỹê": "yễ", "ỵê": "yệ",
+    
+    "ìêc": "iềc", "íêc": "iếc", "ịêc": "iệc",
+    
+    "ìêm": "iềm", "íêm": "iếm", "ỉêm": "iểm", "ĩêm": "iễm", "ịêm": "iệm",
+    "ỳêm": "yềm", "ýêm": "yếm", "ỷêm": "yểm", "ỹêm": "yễm", "ỵêm": "yệm",
+    
+    "ìên": "iền", "íên": "iến", "ỉên": "iển", "ĩên": "iễn", "ịên": "iện",
+    "ỳên": "yền", "ýên": "yến", "ỷên": "yển", "ỹên": "yễn", "ỵên": "yện",
+    
+    "ìêng": "iềng", "íêng": "iếng", "ỉêng": "iểng", "ĩêng": "iễng", "ịêng": "iệng",
+    "ỳêng": "yềng", "ýêng": "yếng", "ỷêng": "yểng", "ỹêng": "yễng", "ỵêng": "yệng",
+    
+    "ìêp": "iềp", "íêp": "iếp", "ịêp": "iệp",
+    
+    "ìêt": "iềt", "íêt": "iết", "ịêt": "iệt",
+    "ỳêt": "yềt", "ýêt": "yết", "ỵêt": "yệt",
+    
+    "ìêu": "iều", "íêu": "iếu", "ỉêu": "iểu", "ĩêu": "iễu", "ịêu": "iệu",
+    "ỳêu": "yều", "ýêu": "yếu", "ỷêu": "yểu", "ỹêu": "yễu", "ỵêu": "yệu",
+    
+    "ùyên": "uyền", "úyên": "uyến", "ủyên": "uyển", "ũyên": "uyễn", "ụyên": "uyện",
+    "ùyêt": "uyềt", "úyêt": "uyết", "ụyêt": "uyệt",
+}
+
+ư_vowel_pairs = {
+    "ưà": "ừa", "ưá": "ứa", "ưả": "ửa", "ưã": "ữa", "ưạ": "ựa",
+    
+    "ưò": "ườ", "ưó": "ướ", "ưỏ": "ưở", "ưõ": "ưỡ", "ưọ": "ượ",
+    
+    "ưòc": "ườc", "ưóc": "ước", "ưọc": "ược",
+    
+    "ưòi": "ười", "ưói": "ưới", "ưỏi": "ưởi", "ưõi": "ưỡi", "ưọi": "ượi",
+    "ừoi": "ười", "ứoi": "ưới", "ửoi": "ưởi", "ữoi": "ưỡi", "ựoi": "ượi",
+    
+    "ưòm": "ườm", "ưóm": "ướm", "ưỏm": "ưởm", "ưõm": "ưỡm", "ưọm": "ượm",
+    
+    "ưòn": "ườn", "ưón": "ướn", "ưỏn": "ưởn", "ưõn": "ưỡn", "ưọn": "ượn",
+    
+    "ưòng": "ường", "ưóng": "ướng", "ưỏng": "ưởng", "ưõng": "ưỡng", "ưọng": "ượng",
     
-    for src, tgt in all_corrections.items():
-        text = text.replace(src, tgt)
+    "ưòp": "ườp", "ưóp": "ướp", "ưọp": "ượp", "ừơp": "ườp", "ứơp": "ướp", "ựơp": "ượp",
     
-    text = re.sub(r'(?<!g)i(à|á|ả|ã|ạ)', r'ì\1', text)  
-    text = re.sub(r'(?<!g)ìá', r'ía', text)  
-    text = re.sub(r'(?<!g)ìà', r'ìa', text)  
-    text = re.sub(r'(?<!g)ìả', r'ỉa', text)  
-    text = re.sub(r'(?<!g)ìã', r'ĩa', text)  
-    text = re.sub(r'(?<!g)ìạ', r'ịa', text)  
-    text = re.sub(r'\bu(à|á|ả|ã|ạ)\b', r'ì\1', text)
-    text = re.sub(r'(?<!q)ùá', r'úa', text)  
-    text = re.sub(r'(?<!q)ùà', r'ùa', text)  
-    text = re.sub(r'(?<!q)ùả', r'ủa', text)  
-    text = re.sub(r'(?<!q)ùã', r'ũa', text)  
-    text = re.sub(r'(?<!q)ùạ', r'ụa', text)
+    "ưót": "ướt", "ưọt": "ượt", "ứơt": "ướt", "ựơt": "ượt",
     
-    return text
+    "ưòu": "ườu", "ưóu": "ướu", "ưỏu": "ưởu", "ưõu": "ưỡu", "ưọu": "ượu",
+    "ừơu": "ườu", "ứơu": "ướu", "ửơu": "ưởu", "ữơu": "ưỡu", "ựơu": "ượu",
+}
+
+incorrect_diacritic_placement = {
+    "uơì": "ười", "uơí": "ưới", "uơỉ": "ưởi", "uơĩ": "ưỡi", "uơị": "ượi",
+    
+    "iêù": "iều", "iêú": "iếu", "iêủ": "iểu", "iêũ": "iễu", "iêụ": "iệu",
+    "yêù": "yều", "yêú": "yếu", "yêủ": "yểu", "yêũ": "yễu", "yêụ": "yệu",      
+}
+
+reversed_vowels = {
+    # "ià": "ìa", "ía": "ía", "ỉa": "ỉa", "ĩa": "ĩa", "ịa": "ịa",
+    "aì": "ài", "aí": "ái", "aỉ": "ải", "aĩ": "ãi", "aị": "ại",
+    
+    "aù": "àu", "aú": "áu", "aủ": "ảu", "aũ": "ãu", "aụ": "ạu",
+    
+    "aò": "ào", "aó": "áo", "aỏ": "ảo", "aõ": "ão", "aọ": "ạo",
+    
+    "âù": "ầu", "âú": "ấu", "âủ": "ẩu", "âũ": "ẫu", "âụ": "ậu",
+    
+    "eò": "èo", "eó": "éo", "eỏ": "ẻo", "eõ": "ẽo", "eọ": "ẹo",
+    
+    "êù": "ều", "êú": "ếu", "êủ": "ểu", "êũ": "ễu", "êụ": "ệu",
+    
+    "oì": "òi", "oí": "ói", "oỉ": "ỏi", "oĩ": "õi", "oị": "ọi",
+    
+    "ôì": "ồi", "ôí": "ối", "ôỉ": "ổi", "ôĩ": "ỗi", "ôị": "ội",
+    
+    "ơì": "ời", "ơí": "ới", "ơỉ": "ởi", "ơĩ": "ỡi", "ơị": "ợi",
+    
+    "uì": "ùi", "uí": "úi", "uỉ": "ủi", "uĩ": "ũi", "uị": "ụi",
+    
+    "ưì": "ừi", "ưí": "ứi", "ưỉ": "ửi", "ưĩ": "ữi", "ưị": "ựi",
+    
+    "oà": "oà", "oá": "oá", "oả": "oả", "oã": "oã", "oạ": "oạ",
+    "òa": "oà", "óa": "oá", "ỏa": "oả", "õa": "oã", "ọa": "oạ",
+    
+    "oè": "oè", "oé": "oé", "oẻ": "oẻ", "oẽ": "oẽ", "oẹ": "oẹ",
+    "òe": "oè", "óe": "oé", "ỏe": "oẻ", "õe": "oẽ", "ọe": "oẹ",
+    
+    "uề": "uề", "uế": "uế", "uể": "uể", "uễ": "uễ", "uệ": "uệ",
+    "ùê": "uề", "úê": "uế", "ủê": "uể", "ũê": "uễ", "ụê": "uệ",
+    
+   
+    # "uá": "úa", "uà": "ùa", "uả": "ủa", "uã": "ũa", "uạ": "ụa",
+    
+    "ưà": "ừa", "ưá": "ứa", "ưả": "ửa", "ưã": "ữa", "ưạ": "ựa",
+    "ưa": "ưa", "ưá": "ứa", "ưà": "ừa", "ưả": "ửa", "ưã": "ữa", "ưạ": "ựa",
+    "aò": "ào", "aó": "áo", "aỏ": "ảo", "aõ": "ão", "aọ": "ạo",
+    "eò": "èo", "eó": "éo", "eỏ": "ẻo", "eõ": "ẽo", "eọ": "ẹo",
+    
+    
+    "uừ": "ừu", "uứ": "ứu", "uử": "ửu", "uữ": "ữu", "uự": "ựu",   
+    
+    "aừ": "ừa", "aứ": "ứa", "aử": "ửa", "aữ": "ữa", "aự": "ựa",
+}
+
+html_entities = {
+    "&#91;": "[", "&#93;": "]", "&quot;": "\"", "&apos;": "'",
+    "&lt;": "<", "&gt;": ">", "&amp;": "&", "&nbsp;": " "
+}
+
+all_corrections = {
+    **gi_consonant_corrections,
+    **o_vowel_pairs,
+    **u_vowel_pairs,
+    **i_vowel_pairs,
+    **ư_vowel_pairs,
+    **incorrect_diacritic_placement,
+    **reversed_vowels,
+    **html_entities
+}
+
+
+def _overlaps(a: str, b: str) -> bool:
+    """Một lần xuất hiện của b có thể chồng lên một lần xuất hiện của a không."""
+    if not a or a in b or b in a:
+        return True
+    return any(a[-k:] == b[:k] or b[-k:] == a[:k] for k in range(1, min(len(a), len(b))))
+
+
+class _ReplaceChain:
+    """
+    Chuỗi ``text.replace(src, tgt)`` theo thứ tự của ``corrections``, biên dịch một lần
+
+    Kết quả giống hệt việc gọi lần lượt mọi ``str.replace``, nhưng chỉ các quy tắc thực sự
+    xuất hiện trong văn bản mới được chạy:
+    - một regex (trie của mọi ``src``, ưu tiên khớp dài nhất) quét văn bản một lượt và cho
+      biết tại mỗi vị trí các ``src`` nào bắt đầu ở đó,
+    - các quy tắc tìm được chạy theo thứ tự ban đầu; khi một quy tắc làm đổi văn bản, các
+      quy tắc sau nó có ``src`` có thể chồng lên ``tgt`` của nó cũng được xét (chuỗi
+      replace cũ có thể tạo ra lần xuất hiện mới cho quy tắc sau).
+    """
+
+    def __init__(self, corrections: dict):
+        self.rules = [(src, tgt) for src, tgt in corrections.items() if src != tgt]
+        self._trigger = re.compile('(?=(' + trie_pattern(build_trie(src for src, _ in self.rules)) + '))')
+        index = {src: i for i, (src, _) in enumerate(self.rules)}
+        # src dài nhất khớp tại một vị trí -> mọi quy tắc có src là tiền tố của nó
+        self._starting = {src: [index[src[:k]] for k in range(1, len(src) + 1) if src[:k] in index] for src in index}
+        chars = [set(src) for src, _ in self.rules]
+        self._creates = [
+            [j for j in range(i + 1, len(self.rules))
+             if (not tgt or not chars[j].isdisjoint(tgt)) and _overlaps(tgt, self.rules[j][0])]
+            for i, (_, tgt) in enumerate(self.rules)
+        ]
+
+    def apply(self, text: str) -> str:
+        queued = set()
+        for match in self._trigger.finditer(text):
+            queued.update(self._starting[match.group(1)])
+        heap = list(queued)
+        heapq.heapify(heap)
+        while heap:
+            i = heapq.heappop(heap)
+            src, tgt = self.rules[i]
+            replaced = text.replace(src, tgt)
+            if replaced != text:
+                text = replaced
+                for j in self._creates[i]:
+                    if j not in queued:
+                        queued.add(j)
+                        heapq.heappush(heap, j)
+        return text
+
+
+_corrections = _ReplaceChain(all_corrections)
+
+# Các luật regex chạy sau bảng sửa. Bản cũ gồm 12 lần re.sub nối tiếp:
+#   (?<!g)i(à|á|ả|ã|ạ) -> ì\1, rồi (?<!g)ìá -> ía, ìà -> ìa, ìả -> ỉa, ìã -> ĩa, ìạ -> ịa;
+#   \bu(à|á|ả|ã|ạ)\b -> ì\1;  (?<!q)ùá -> úa, ùà -> ùa, ùả -> ủa, ùã -> ũa, ùạ -> ụa.
+# Các lần khớp của ba nhóm không thể chồng nhau (ký tự đầu i/ì, u, ù không nằm trong
+# nhóm nguyên âm mang dấu) và không luật nào tạo ra 'g', 'q' hay đổi ranh giới từ,
+# nên một lần re.sub dưới đây cho kết quả giống hệt.
+_TONE_VOWEL_RULES = re.compile(r'(?<!g)[iì]([àáảãạ])|\bu([àáảãạ])\b|(?<!q)ù([àáảãạ])')
+_I_TONE = {'à': 'ìa', 'á': 'ía', 'ả': 'ỉa', 'ã': 'ĩa', 'ạ': 'ịa'}
+_U_TONE = {'à': 'ùa', 'á': 'úa', 'ả': 'ủa', 'ã': 'ũa', 'ạ': 'ụa'}
+
+
+def _tone_vowel(match: re.Match) -> str:
+    i_vowel, u_vowel, u_grave = match.groups()
+    if i_vowel:
+        return _I_TONE[i_vowel]
+    if u_vowel:
+        return 'ì' + u_vowel
+    return _U_TONE[u_grave]
+
+
+@lru_cache(maxsize=1 << 16)
+def normalize_vietnamese_text(text):
+    """
+    Chuẩn hoá NFKC rồi sửa dấu/vần theo các bảng trên và các luật regex.
+
+    Các bảng được biên dịch một lần (``_ReplaceChain``), kết quả được nhớ theo chuỗi đầu
+    vào vì các dòng sau align lặp lại nhiều.
+    """
+    text = unicodedata.normalize('NFKC', text)
+    text = _corrections.apply(text)
+    return _TONE_VOWEL_RULES.sub(_tone_vowel, text)
+
 
 def similarity(target, candidates):
     return "".join(target).find(candidates)
@@ -267,14 +344,14 @@ def sort_by_similarity(target, candidates):
     scored = [char for char, _ in scored]  # giữ lại chỉ ký tự
     return scored  # giữ lại cả điểm để debug
 
-def convert_txt_to_ecel(file_path: str, output_path: str , debug=False,namebook='book'):
+def convert_txt_to_ecel(file_path: str, output_path: str , debug=False,namebook='book', log=print):
     with open(file_path, "r", encoding="utf-8") as file:
         lines = file.readlines()
     data = []
     last_name = ""
     count_box = 0
     count_page = 0
-    print("Đang chuyển đổi file txt sang file excel...")
+    log("Đang chuyển đổi file txt sang file excel...")
     for line in tqdm(lines, desc="Converting", unit="line"):
         file_name , bbox,  nom , vi = line.split("\t")
         pattern = r'_\d+_\.json'
@@ -316,47 +393,72 @@ def convert_txt_to_ecel(file_path: str, output_path: str , debug=False,namebook=
     output_file = output_path
     df.to_excel(output_file, index=False)
 
-    print(f"File Excel đã được tạo tại: {output_file}")
+    log(f"File Excel đã được tạo tại: {output_file}")
 
 
 import ast
 
-def compare(quoc_ngu: str, ocr: str):
-    quoc_ngu = quoc_ngu.strip().lower()
-    ocr = ocr.strip()
+def _index_quocngu(df: pd.DataFrame) -> dict:
+    """Quốc ngữ (strip, lower) -> frozenset các chữ Hán Nôm tương ứng."""
+    index = {}
+    for key, sino in zip(df['QuocNgu'].str.strip().str.lower(), df['SinoNom']):
+        if isinstance(key, str):
+            index.setdefault(key, []).append(sino)
+    return {key: frozenset(values) for key, values in index.items()}
 
-    # Lấy danh sách từ Hán Nôm tương ứng với Quốc ngữ
-    result_word = list(quocngu_dict[quocngu_dict['QuocNgu'].str.strip().str.lower() == quoc_ngu]['SinoNom'])
 
-    # Lấy top 20 ký tự giống ký tự OCR
-    row = similar_dict[similar_dict['Input Character'] == ocr]
+def _index_similar(df: pd.DataFrame) -> dict:
+    """Ký tự -> ô 'Top 20 Similar Characters' của dòng đầu tiên có ký tự đó."""
+    index = {}
+    for char, cell in zip(df['Input Character'], df['Top 20 Similar Characters']):
+        index.setdefault(char, cell)
+    return index
+
 
-    if row.empty:
-        return []
+# Tra cứu O(1) thay cho lọc DataFrame ở mỗi lần compare
+quocngu_index = _index_quocngu(quocngu_dict)
+similar_index = _index_similar(similar_dict)
 
-    top_20_str = row['Top 20 Similar Characters'].iloc[0]
 
+@lru_cache(maxsize=None)
+def _similar_chars(ocr: str) -> tuple:
+    """(ocr, các ký tự giống ocr...) theo thứ tự trong từ điển; ô được parse một lần cho mỗi ký tự."""
+    top_20_str = similar_index[ocr]
     try:
         result_OCR = ast.literal_eval(top_20_str) if isinstance(top_20_str, str) else top_20_str
     except Exception as e:
         raise ValueError(f"[❌] Lỗi khi parse similar list của `{ocr}`:", e)
 
-
     # Nếu list giống có 1 phần tử và nó cũng là list (dạng [[...]])
     if len(result_OCR) == 1 and isinstance(result_OCR[0], list):
-        result_OCR = [ocr] + list(result_OCR[0])
-    else:
-        result_OCR = [ocr] + list(result_OCR)
+        return (ocr, *result_OCR[0])
+    return (ocr, *result_OCR)
+
+
+@lru_cache(maxsize=1 << 16)
+def _compare(quoc_ngu: str, ocr: str) -> tuple:
+    if ocr not in similar_index:
+        return ()
+
+    # Lấy danh sách từ Hán Nôm tương ứng với Quốc ngữ
+    result_word = quocngu_index.get(quoc_ngu, frozenset())
+    # Top 20 ký tự giống ký tự OCR
+    result_OCR = _similar_chars(ocr)
 
     # Nếu ký tự OCR khớp trực tiếp
     if ocr in result_word:
-        return [ocr]
+        return (ocr,)
 
     # Tìm giao giữa từ đúng và các ký tự tương tự
-    temp = list(set(result_word) & set(result_OCR))
+    temp = list(result_word & set(result_OCR))
 
     # Trả kết quả đã sắp xếp nếu có hơn 1, còn không thì trả trực tiếp
-    return sort_by_similarity(result_OCR, temp) if len(temp) > 1 else temp
+    return tuple(sort_by_similarity(result_OCR, temp) if len(temp) > 1 else temp)
+
+
+def compare(quoc_ngu: str, ocr: str):
+    """Các chữ Hán Nôm vừa đọc được là quoc_ngu vừa giống ocr (kết quả được nhớ theo cặp)."""
+    return list(_compare(quoc_ngu.strip().lower(), ocr.strip()))
 
 
 def safe_write_rich_string(ws, row, col, fragments):
@@ -366,12 +468,101 @@ def safe_write_rich_string(ws, row, col, fragments):
     else:
         ws.write_rich_string(row, col, *fragments)
 
-def marking(df: pd.DataFrame, output_path: str, debug=False, type_qn=2):
+# Số dòng mỗi worker xử lý một lần khi marking song song
+MARKING_CHUNK_SIZE = 256
+
+
+def _mark_row(word, ocr, type_qn=2):
+    """
+    Tô màu một dòng (không đụng tới xlsxwriter)
+
+    Returns:
+        (None, (a, b)) nếu số từ Quốc ngữ và số chữ Hán Nôm không khớp (để cảnh báo),
+        ngược lại ((fragment cột SinoNom OCR, SinoNom char, Chữ Quốc ngữ, số chữ,
+        số đỏ, số xanh), None); fragment là dãy 'red'/'blue'/'black', text
+    """
+    word = normalize_vietnamese_text(word)
+    a = word.split()
+    b = list(ocr)
+
+    if len(a) != len(b):
+        return None, (a, b)
+
+    max_len = len(b)
+    n_red = 0
+    n_blue = 0
+
+    temp = []     # nội dung cột 'SinoNom OCR'
+    _tem_1 = []   # type_qn == 1, tô syllable đúng
+    _tem_2 = []   # type_qn == 2, tô chữ Quốc ngữ
+    _tem_3 = []   # cột mới: SinoNom char tô theo Hán Nôm
+
+    if type_qn == 1:
+        for i in range(len(a)):
+            color = 'black' if model.is_syllable(a[i]) else 'red'
+            _tem_1 += [color, a[i] + " "]
+
+    for i in range(max_len):
+        result = compare(a[i], b[i])
+
+        if len(result) > 1:
+            n_blue += 1
+            temp += ['blue', result[0]]
+            _tem_2 += ['blue', a[i] + " "]
+            _tem_3 += ['red', b[i]]
+
+        elif a[i] == '*' and b[i] != '*':
+            n_red += 1
+            temp += ['red', b[i]]
+            _tem_2 += ['red', a[i] + " "]
+            _tem_3 += ['red', b[i]]
+
+        elif b[i] == '*' and a[i] != '*':
+            n_red += 1
+            temp += ['red', b[i]]
+            _tem_2 += ['red', a[i] + " "]
+            _tem_3 += ['red', b[i]]
+
+        elif len(result) == 1:
+            temp += ['black', b[i]]
+            _tem_2 += ['black', a[i] + " "]
+            _tem_3 += ['black', b[i]]
+
+        elif len(result) == 0:
+            n_red += 1
+            temp += ['red', b[i]]
+            _tem_2 += ['red', a[i] + " "]
+            _tem_3 += ['red', b[i]]
+
+    return (_tem_3, temp, _tem_1 if type_qn == 1 else _tem_2, max_len, n_red, n_blue), None
+
+
+def _mark_rows(rows, type_qn=2):
+    """_mark_row cho một khối dòng; chạy trong worker khi marking song song."""
+    return [_mark_row(word, ocr, type_qn) for word, ocr in rows]
+
+
+def _iter_marked_rows(rows, type_qn=2, workers=1, chunk_size=MARKING_CHUNK_SIZE):
+    """Kết quả _mark_row theo đúng thứ tự dòng; workers > 1 thì tính theo khối trong process pool."""
+    chunks = [rows[start:start + chunk_size] for start in range(0, len(rows), chunk_size)]
+    if workers <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            yield from _mark_rows(chunk, type_qn)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for marked in executor.map(partial(_mark_rows, type_qn=type_qn), chunks):
+            yield from marked
+
+
+def marking(df: pd.DataFrame, output_path: str, debug=False, type_qn=2, workers=1, log=print):
     """
     column_qn = {0, 1, 2} nghĩa tương ứng: 
         0: không tô màu.
         1: tô màu từ có trong danh sách syllable.
         2: tô màu theo từ hán nôm.
+    workers: số tiến trình tính màu song song (theo khối MARKING_CHUNK_SIZE dòng);
+        việc ghi file Excel luôn do một tiến trình làm theo đúng thứ tự dòng.
+    log: hàm nhận các thông báo/cảnh báo (mặc định print).
     """
 
     list_quocngu = df['Chữ Quốc ngữ'].tolist()
@@ -384,6 +575,7 @@ def marking(df: pd.DataFrame, output_path: str, debug=False, type_qn=2):
     blue = workbook.add_format({'font_color': 'blue'})
     black = workbook.add_format({'font_color': 'black'})
     header = workbook.add_format({'bold': True, 'align': 'center'})
+    formats = {'red': red, 'blue': blue, 'black': black}
 
     column_widths = {
         'A': 18,
@@ -408,84 +600,46 @@ def marking(df: pd.DataFrame, output_path: str, debug=False, type_qn=2):
     worksheet.write(0, 4, 'SinoNom char', header)
     worksheet.write(0, 5, 'Chữ Quốc ngữ', header)
 
+    list_image = df['Image_name_path' if debug else 'Image_name'].tolist()
+    list_id = df['ID'].tolist()
+    list_bbox = df['Image Box'].tolist()
+
+    def fragments(marked):
+        # Tên màu -> Format của workbook này (Format không gửi qua worker được)
+        return [formats[t] if i % 2 == 0 else t for i, t in enumerate(marked)]
+
     sum_char = 0
     sum_char_red = 0
     sum_char_blue = 0
 
-    print("Đang đánh dấu các từ trong file excel...")
-    for row_num, (word, ocr) in enumerate(tqdm(zip(list_quocngu, list_ocr), desc="Marking: ", unit="row")):
-        word = normalize_vietnamese_text(word)
-        a = word.split()
-        b = list(ocr)
-
-        if len(a) != len(b):
-            print(f"[⚠️ Warning] Dữ liệu không khớp tại dòng {row_num + 1}: {a} vs {b}")
+    log("Đang đánh dấu các từ trong file excel...")
+    rows = list(zip(list_quocngu, list_ocr))
+    marked_rows = _iter_marked_rows(rows, type_qn=type_qn, workers=workers)
+    for row_num, (marked, mismatch) in enumerate(tqdm(marked_rows, total=len(rows), desc="Marking: ", unit="row")):
+        if marked is None:
+            a, b = mismatch
+            log(f"[⚠️ Warning] Dữ liệu không khớp tại dòng {row_num + 1}: {a} vs {b}")
             continue
 
-        max_len = len(b)
+        _tem_3, temp, _tem_qn, max_len, n_red, n_blue = marked
         sum_char += max_len
-
-        temp = []     # nội dung cột 'SinoNom OCR'
-        _tem_1 = []   # type_qn == 1, tô syllable đúng
-        _tem_2 = []   # type_qn == 2, tô chữ Quốc ngữ
-        _tem_3 = []   # cột mới: SinoNom char tô theo Hán Nôm
-
-        for i in range(len(a)):
-            color = black if model.is_syllable(a[i]) else red
-            _tem_1 += [color, a[i] + " "]
-
-        for i in range(max_len):
-            result = compare(a[i], b[i])
-
-            if len(result) > 1:
-                sum_char_blue += 1
-                temp += [blue, result[0]]
-                _tem_2 += [blue, a[i] + " "]
-                _tem_3 += [red, b[i]]
-
-            elif a[i] == '*' and b[i] != '*':
-                sum_char_red += 1
-                temp += [red, b[i]]
-                _tem_2 += [red, a[i] + " "]
-                _tem_3 += [red, b[i]]
-
-            elif b[i] == '*' and a[i] != '*':
-                sum_char_red += 1
-                temp += [red, b[i]]
-                _tem_2 += [red, a[i] + " "]
-                _tem_3 += [red, b[i]]
-
-            elif len(result) == 1:
-                temp += [black, b[i]]
-                _tem_2 += [black, a[i] + " "]
-                _tem_3 += [black, b[i]]
-
-            elif len(result) == 0:
-                sum_char_red += 1
-                temp += [red, b[i]]
-                _tem_2 += [red, a[i] + " "]
-                _tem_3 += [red, b[i]]
+        sum_char_red += n_red
+        sum_char_blue += n_blue
 
         # Write to Excel
-        if debug:
-            worksheet.write(row_num + 1, 0, df['Image_name_path'].iloc[row_num])
-        else:
-            worksheet.write(row_num + 1, 0, df['Image_name'].iloc[row_num])
-
-        worksheet.write(row_num + 1, 1, df['ID'].iloc[row_num])
-        worksheet.write(row_num + 1, 2, df['Image Box'].iloc[row_num])
-        safe_write_rich_string(worksheet, row_num + 1, 3, _tem_3)
-        safe_write_rich_string(worksheet, row_num + 1, 4, temp)
+        worksheet.write(row_num + 1, 0, list_image[row_num])
+        worksheet.write(row_num + 1, 1, list_id[row_num])
+        worksheet.write(row_num + 1, 2, list_bbox[row_num])
+        safe_write_rich_string(worksheet, row_num + 1, 3, fragments(_tem_3))
+        safe_write_rich_string(worksheet, row_num + 1, 4, fragments(temp))
 
         if type_qn == 0:
-            worksheet.write(row_num + 1, 5, df['Chữ Quốc ngữ'].iloc[row_num])
-        elif type_qn == 1:
-            safe_write_rich_string(worksheet, row_num + 1, 5, _tem_1)
-        elif type_qn == 2:
-            safe_write_rich_string(worksheet, row_num + 1, 5, _tem_2)
-
-    print(f"Số Đỏ: {sum_char_red}/{sum_char} chữ => lỗi: {(sum_char_red/sum_char)*100:.2f}%")
-    print(f"Số Xanh: {sum_char_blue}/{sum_char} chữ => lỗi {(sum_char_blue/sum_char)*100:.2f}%")
+            worksheet.write(row_num + 1, 5, list_quocngu[row_num])
+        elif type_qn in (1, 2):
+            safe_write_rich_string(worksheet, row_num + 1, 5, fragments(_tem_qn))
+
+    log(f"Số Đỏ: {sum_char_red}/{sum_char} chữ => lỗi: {(sum_char_red/sum_char)*100:.2f}%")
+    log(f"Số Xanh: {sum_char_blue}/{sum_char} chữ => lỗi {(sum_char_blue/sum_char)*100:.2f}%")
     workbook.close()
 
 # if __name__ == "__main__":
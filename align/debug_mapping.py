@@ -12,6 +12,12 @@ import pandas as pd
 from pathlib import Path
 from typing import Dict, List, Tuple
 
+try:
+    from .directory_index import get_directory_index
+except ImportError:
+    # Chạy trực tiếp: python debug_mapping.py ...
+    from directory_index import get_directory_index
+
 # Fix encoding for Windows console
 if sys.platform == 'win32':
     import io
@@ -31,40 +37,17 @@ def find_file_flexible(dir_path: str, target_filename: str) -> Tuple[bool, str]:
     Returns:
         (found: bool, full_path_or_reason: str)
     """
-    if not os.path.isdir(dir_path):
+    index = get_directory_index(dir_path)
+    if not index.exists:
         return False, f"Directory not found: {dir_path}"
     
-    # Thử kiểm tra trực tiếp trước
-    full_path = os.path.join(dir_path, target_filename)
-    if os.path.exists(full_path):
-        return True, full_path
-    
-    # Lấy base name (không có extension)
-    target_base = os.path.splitext(target_filename)[0]
-    target_ext = os.path.splitext(target_filename)[1].lower()
-    
-    # Tìm file với base name giống nhau (ignore case, ignore extension)
-    for item in os.listdir(dir_path):
-        item_path = os.path.join(dir_path, item)
-        if not os.path.isfile(item_path):
-            continue
-        
-        item_base = os.path.splitext(item)[0]
-        item_ext = os.path.splitext(item)[1].lower()
-        
-        # Match nếu base name giống (không case sensitive)
-        if item_base.lower() == target_base.lower():
-            if item_ext in ['.json', '.txt', '.jpg', '.png']:
-                return True, item_path
+    found = index.find(target_filename)
+    if found:
+        return True, found
     
     # Không tìm thấy, hiển thị available files
-    available = []
-    for item in os.listdir(dir_path):
-        item_path = os.path.join(dir_path, item)
-        if os.path.isfile(item_path):
-            item_base = os.path.splitext(item)[0]
-            if target_base.lower() == item_base.lower():
-                available.append(item)
+    target_base = os.path.splitext(target_filename)[0]
+    available = index.similar(target_filename)
     
     if available:
         reason = f"Not found exactly, but similar files exist: {available}"
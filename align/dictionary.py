@@ -0,0 +1,443 @@
+"""
+Chỉ mục tương thích Hán Nôm ↔ Quốc Ngữ dạng id nguyên, biên dịch một lần cho mỗi
+phiên bản từ điển.
+
+``is_compatible(c, w)`` đúng khi tập chữ Hán Nôm ứng với âm ``w`` giao với tập
+{c} ∪ similar_dict[c]. Ở đây mỗi âm Quốc Ngữ và mỗi chữ Hán/Nôm được gán một id;
+tập ứng viên của âm và tập mở rộng (chữ tương tự) của chữ được lưu dạng CSR
+(indptr + mảng id đã sắp xếp), và ma trận tương thích của cả trang được tính
+bằng một phép nhân ma trận.
+
+Các bảng dict/*.xlsx và chỉ mục đã biên dịch được lưu thành cache nhị phân
+(mảng .npy + bảng chuỗi UTF-8 với offset theo byte) theo hash của file nguồn, nên
+worker và web app không phải parse lại Excel hay dựng lại chỉ mục. Cache cũ (hash
+khác) được dựng lại tự động. Chỉ mục nạp từ cache memory-map cả mảng CSR lẫn bảng
+tra âm/chữ (sắp xếp sẵn, tra bằng tìm kiếm nhị phân), nên các tiến trình dùng chung
+trang bộ nhớ và không giải mã chuỗi nào ngoài các khoá được tra. DataFrame của
+``load_dictionary`` giữ nguyên kiểu từng cột/ô như ``pd.read_excel``; cột chuỗi
+vẫn được giải mã thành ``str`` vì pandas cần đối tượng Python.
+"""
+import hashlib
+import json
+import math
+import os
+import shutil
+from bisect import bisect_left
+from typing import Dict, Hashable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .dp import CostRows
+
+
+def _to_csr(groups: List[List[int]]) -> Tuple[np.ndarray, np.ndarray]:
+    indptr = np.zeros(len(groups) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(g) for g in groups])
+    indices = np.fromiter((x for g in groups for x in g), dtype=np.int32, count=int(indptr[-1]))
+    return indptr, indices
+
+
+def build_dicts(similar_df: pd.DataFrame, trans_df: pd.DataFrame) -> Tuple[Dict[Hashable, list], Dict[Hashable, list]]:
+    trans_dict = {}
+    for word, han_char in zip(trans_df.iloc[:, 0], trans_df.iloc[:, 1]):
+        trans_dict.setdefault(word, []).append(han_char)
+
+    similar_dict = {}
+    for char, sim_char in zip(similar_df.iloc[:, 0], similar_df.iloc[:, 1]):
+        similar_dict.setdefault(char, []).append(sim_char)
+
+    return trans_dict, similar_dict
+
+
+def dictionary_version(similar_df: pd.DataFrame, trans_df: pd.DataFrame) -> str:
+    """Mã phiên bản theo hash file nguồn (nếu nạp bằng ``load_dictionary``) hoặc
+    theo nội dung hai cột đầu của mỗi bảng từ điển."""
+    h = hashlib.sha1()
+    sources = [df.attrs.get('dictionary_sha1') for df in (similar_df, trans_df)]
+    if all(sources):
+        h.update(':'.join(sources).encode())
+        return h.hexdigest()
+    for df in (similar_df, trans_df):
+        h.update(pd.util.hash_pandas_object(df.iloc[:, :2], index=False).values.tobytes())
+    return h.hexdigest()
+
+
+# Tăng khi đổi định dạng cache để mọi cache cũ bị bỏ qua
+CACHE_FORMAT = 2
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def default_cache_dir(path: str) -> str:
+    """Thư mục cache: DICT_CACHE_DIR nếu có, ngược lại ``.cache`` cạnh file nguồn."""
+    return os.environ.get('DICT_CACHE_DIR') or os.path.join(os.path.dirname(os.path.abspath(path)), '.cache')
+
+
+def _save_strings(entry: str, name: str, texts: Sequence[str]) -> None:
+    """Lưu một bảng chuỗi: dữ liệu UTF-8 nối liền và offset theo byte (memory-map được)."""
+    encoded = [t.encode('utf-8') for t in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    np.save(os.path.join(entry, f'{name}.data.npy'), np.frombuffer(b''.join(encoded), dtype=np.uint8))
+    np.save(os.path.join(entry, f'{name}.offsets.npy'), offsets)
+
+
+class StringTable(Sequence):
+    """Bảng chuỗi đã lưu bằng ``_save_strings``, giải mã từng phần tử khi truy cập."""
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def load(cls, entry: str, name: str, mmap_mode: Optional[str] = 'r') -> 'StringTable':
+        return cls(np.load(os.path.join(entry, f'{name}.data.npy'), mmap_mode=mmap_mode),
+                   np.load(os.path.join(entry, f'{name}.offsets.npy'), mmap_mode=mmap_mode))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return [self[i] for i in range(*k.indices(len(self)))]
+        return self.data[self.offsets[k]:self.offsets[k + 1]].tobytes().decode('utf-8')
+
+
+def _load_strings(entry: str, name: str) -> List[str]:
+    """Đọc cả bảng chuỗi thành list ``str`` (đọc thẳng, không memory-map)."""
+    data = np.load(os.path.join(entry, f'{name}.data.npy'))
+    offsets = np.load(os.path.join(entry, f'{name}.offsets.npy')).tolist()
+    raw = data.tobytes()
+    return [raw[offsets[k]:offsets[k + 1]].decode('utf-8') for k in range(len(offsets) - 1)]
+
+
+# Kiểu của từng ô trong cột object (cột số/ngày giờ được lưu nguyên mảng numpy)
+_STR, _NULL, _INT, _FLOAT, _BOOL = range(5)
+
+
+def _save_column(entry: str, name: str, column: pd.Series) -> str:
+    """Lưu một cột DataFrame, trả về loại đã lưu ('array' hoặc 'object')."""
+    if isinstance(column.dtype, np.dtype) and column.dtype != object:
+        np.save(os.path.join(entry, f'{name}.npy'), column.to_numpy())
+        return 'array'
+    kinds, texts = [], []
+    for value in column.astype(object).tolist():
+        if isinstance(value, str):
+            kind, text = _STR, value
+        elif isinstance(value, (bool, np.bool_)):
+            kind, text = _BOOL, str(bool(value))
+        elif isinstance(value, (int, np.integer)):
+            kind, text = _INT, str(int(value))
+        elif isinstance(value, (float, np.floating)) and not math.isnan(value):
+            kind, text = _FLOAT, repr(float(value))
+        elif value is None or pd.isna(value):
+            kind, text = _NULL, ''
+        else:
+            # Kiểu khác (ngày giờ lẫn trong cột chuỗi...) lưu dạng chuỗi
+            kind, text = _STR, str(value)
+        kinds.append(kind)
+        texts.append(text)
+    np.save(os.path.join(entry, f'{name}.kind.npy'), np.array(kinds, dtype=np.uint8))
+    _save_strings(entry, name, texts)
+    return 'object'
+
+
+def _load_column(entry: str, name: str, kind: str, dtype: str) -> pd.Series:
+    if kind == 'array':
+        return pd.Series(np.load(os.path.join(entry, f'{name}.npy'), allow_pickle=False))
+    decode = {_STR: str, _NULL: lambda text: np.nan, _INT: int, _FLOAT: float, _BOOL: lambda text: text == 'True'}
+    kinds = np.load(os.path.join(entry, f'{name}.kind.npy')).tolist()
+    column = pd.Series([decode[k](text) for k, text in zip(kinds, _load_strings(entry, name))], dtype=object)
+    # Cột kiểu mở rộng của pandas (vd. kiểu chuỗi ``str`` của pandas 3) được đổi lại đúng kiểu
+    return column if dtype == 'object' else column.astype(pd.api.types.pandas_dtype(dtype))
+
+
+def _write_entry(entry: str, meta: dict, write) -> None:
+    """Ghi cache vào thư mục tạm rồi đổi tên, để tiến trình khác không đọc phải bản dở."""
+    tmp = f"{entry}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    # Entry hỏng hoặc khác định dạng: xoá để đổi tên được
+    shutil.rmtree(entry, ignore_errors=True)
+    os.makedirs(tmp)
+    write(tmp)
+    with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    try:
+        os.replace(tmp, entry)
+    except OSError:
+        # Tiến trình khác đã ghi xong cùng entry
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _valid_entry(entry: str, digest: str) -> bool:
+    try:
+        with open(os.path.join(entry, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return meta.get('format') == CACHE_FORMAT and meta.get('sha1') == digest
+
+
+def compile_dictionary(path: str, cache_dir: Optional[str] = None) -> str:
+    """Biên dịch một file dict/*.xlsx thành cache nhị phân, trả về thư mục cache."""
+    cache_dir = cache_dir or default_cache_dir(path)
+    digest = file_digest(path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    entry = os.path.join(cache_dir, f'{stem}-{digest[:16]}')
+    if _valid_entry(entry, digest):
+        return entry
+
+    os.makedirs(cache_dir, exist_ok=True)
+    df = pd.read_excel(path)
+    columns = [str(c) for c in df.columns]
+    kinds = []
+    dtypes = [str(dtype) for dtype in df.dtypes]
+
+    def write(tmp):
+        for k in range(len(columns)):
+            kinds.append(_save_column(tmp, f'col{k}', df.iloc[:, k]))
+
+    _write_entry(entry, {'format': CACHE_FORMAT, 'sha1': digest, 'source': os.path.basename(path),
+                         'columns': columns, 'kinds': kinds, 'dtypes': dtypes}, write)
+
+    # Xoá các bản cache cũ của cùng file nguồn
+    for name in os.listdir(cache_dir):
+        old = os.path.join(cache_dir, name)
+        if name.startswith(f'{stem}-') and old != entry and '.tmp-' not in name:
+            shutil.rmtree(old, ignore_errors=True)
+    return entry
+
+
+def load_dictionary(path: str, cache_dir: Optional[str] = None) -> pd.DataFrame:
+    """Thay cho ``pd.read_excel`` với các file từ điển: đọc từ cache, dựng lại khi cũ.
+
+    Giữ kiểu như ``pd.read_excel``: cột số/ngày giờ giữ dtype numpy, cột chuỗi giữ dtype
+    của pandas, ô của cột object giữ kiểu str/int/float/bool; ô rỗng là NaN. Tên cột
+    được lưu dạng chuỗi.
+    """
+    cache_dir = cache_dir or default_cache_dir(path)
+    entry = compile_dictionary(path, cache_dir)
+    with open(os.path.join(entry, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    df = pd.DataFrame({col: _load_column(entry, f'col{k}', kind, dtype)
+                       for k, (col, kind, dtype) in enumerate(zip(meta['columns'], meta['kinds'], meta['dtypes']))})
+    df.attrs['dictionary_sha1'] = meta['sha1']
+    df.attrs['dictionary_cache'] = cache_dir
+    return df
+
+
+class _SortedIds(Mapping):
+    """Bảng tra chuỗi -> id trên bảng chuỗi đã sắp xếp (memory-map), tìm kiếm nhị phân."""
+
+    def __init__(self, keys: StringTable, ids: np.ndarray):
+        self.keys = keys
+        self.ids = ids
+
+    def get(self, key, default=None):
+        if not isinstance(key, str):
+            return default
+        pos = bisect_left(self.keys, key)
+        if pos < len(self.keys) and self.keys[pos] == key:
+            return int(self.ids[pos])
+        return default
+
+    def __getitem__(self, key) -> int:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key) -> bool:
+        return self.get(key) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+def _save_ids(entry: str, name: str, ids: Mapping) -> None:
+    """Lưu bảng tra chuỗi -> id theo thứ tự khoá; khoá không phải chuỗi (NaN) không
+    bao giờ khớp token nên bị bỏ, id giữ nguyên."""
+    items = sorted((key, k) for key, k in ids.items() if isinstance(key, str))
+    _save_strings(entry, name, [key for key, _ in items])
+    np.save(os.path.join(entry, f'{name}.ids.npy'), np.array([k for _, k in items], dtype=np.int64))
+
+
+def _load_ids(entry: str, name: str) -> _SortedIds:
+    return _SortedIds(StringTable.load(entry, name), np.load(os.path.join(entry, f'{name}.ids.npy'), mmap_mode='r'))
+
+
+class CompatibilityIndex:
+    """Chỉ mục tương thích đã biên dịch.
+
+    Attributes:
+        syllable_ids: âm Quốc Ngữ -> id (dict, hoặc ``_SortedIds`` khi nạp từ cache)
+        char_ids: chữ Hán/Nôm -> id (như trên)
+        cand_indptr, cand_indices: CSR, id âm -> id các chữ ứng viên (đã sắp xếp)
+        expand_indptr, expand_indices: CSR, id chữ -> id chính nó và các chữ tương tự
+    """
+
+    def __init__(self, trans_dict: Dict[Hashable, list], similar_dict: Dict[Hashable, list], version: str = ''):
+        self.version = version
+        char_ids: Dict[Hashable, int] = {}
+
+        def cid(ch):
+            return char_ids.setdefault(ch, len(char_ids))
+
+        self.syllable_ids = {word: k for k, word in enumerate(trans_dict)}
+        candidates = [sorted({cid(ch) for ch in trans_dict[word]}) for word in trans_dict]
+        for ch, sims in similar_dict.items():
+            cid(ch)
+            for sim in sims:
+                cid(sim)
+        expansions = [sorted({cid(sim) for sim in similar_dict.get(ch, [])} | {k}) for ch, k in list(char_ids.items())]
+
+        self.char_ids = char_ids
+        self.cand_indptr, self.cand_indices = _to_csr(candidates)
+        self.expand_indptr, self.expand_indices = _to_csr(expansions)
+
+    @classmethod
+    def from_frames(cls, similar_df: pd.DataFrame, trans_df: pd.DataFrame, version: str = None) -> 'CompatibilityIndex':
+        trans_dict, similar_dict = build_dicts(similar_df, trans_df)
+        return cls(trans_dict, similar_dict, version or dictionary_version(similar_df, trans_df))
+
+    _ARRAYS = ('cand_indptr', 'cand_indices', 'expand_indptr', 'expand_indices')
+
+    def save(self, cache_dir: str) -> str:
+        entry = os.path.join(cache_dir, f'compat-{self.version[:16]}')
+
+        def write(tmp):
+            for name in self._ARRAYS:
+                np.save(os.path.join(tmp, f'{name}.npy'), getattr(self, name))
+            _save_ids(tmp, 'syllables', self.syllable_ids)
+            _save_ids(tmp, 'chars', self.char_ids)
+
+        os.makedirs(cache_dir, exist_ok=True)
+        _write_entry(entry, {'format': CACHE_FORMAT, 'sha1': self.version}, write)
+        return entry
+
+    @classmethod
+    def load(cls, cache_dir: str, version: str) -> Optional['CompatibilityIndex']:
+        """Nạp chỉ mục đã lưu (mảng CSR và bảng tra được memory-map); None nếu chưa có hoặc đã cũ."""
+        entry = os.path.join(cache_dir, f'compat-{version[:16]}')
+        if not _valid_entry(entry, version):
+            return None
+        index = cls.__new__(cls)
+        index.version = version
+        for name in cls._ARRAYS:
+            setattr(index, name, np.load(os.path.join(entry, f'{name}.npy'), mmap_mode='r'))
+        index.syllable_ids = _load_ids(entry, 'syllables')
+        index.char_ids = _load_ids(entry, 'chars')
+        return index
+
+    @property
+    def syllable_count(self) -> int:
+        """Số id âm (kể cả âm không phải chuỗi đã bị bỏ khỏi bảng tra)."""
+        return len(self.cand_indptr) - 1
+
+    @property
+    def char_count(self) -> int:
+        """Số id chữ (kể cả chữ không phải chuỗi đã bị bỏ khỏi bảng tra)."""
+        return len(self.expand_indptr) - 1
+
+    def _incidence(self, ids: List[int], indptr: np.ndarray, indices: np.ndarray) -> List[np.ndarray]:
+        return [indices[indptr[k]:indptr[k + 1]] if k >= 0 else indices[:0] for k in ids]
+
+    def candidates(self, word: Hashable) -> np.ndarray:
+        """Id các chữ Hán/Nôm ứng với âm ``word`` (mảng đã sắp xếp)."""
+        k = self.syllable_ids.get(word, -1)
+        return self._incidence([k], self.cand_indptr, self.cand_indices)[0]
+
+    def expansion(self, ch: Hashable) -> np.ndarray:
+        """Id của ``ch`` và các chữ tương tự (mảng đã sắp xếp, rỗng nếu chưa biết)."""
+        k = self.char_ids.get(ch, -1)
+        return self._incidence([k], self.expand_indptr, self.expand_indices)[0]
+
+    def syllables(self, ch: Hashable) -> np.ndarray:
+        """Id các âm Quốc Ngữ tương thích với ``ch`` (qua các chữ tương tự), mảng đã sắp xếp."""
+        if getattr(self, '_reverse', None) is None:
+            # CSR ngược của cand: id chữ -> id các âm có chữ đó làm ứng viên
+            owners = np.repeat(np.arange(len(self.cand_indptr) - 1, dtype=np.int32), np.diff(self.cand_indptr))
+            order = np.argsort(self.cand_indices, kind='stable')
+            indptr = np.zeros(self.char_count + 1, dtype=np.int64)
+            indptr[1:] = np.cumsum(np.bincount(self.cand_indices, minlength=self.char_count))
+            self._reverse = (indptr, owners[order])
+        indptr, indices = self._reverse
+        groups = self._incidence(self.expansion(ch).tolist(), indptr, indices)
+        return np.unique(np.concatenate(groups)) if groups else indices[:0]
+
+    def compatibility(self, chars: Sequence[Hashable], words: Sequence[Hashable]) -> np.ndarray:
+        """Ma trận bool len(chars)×len(words), tương đương ``is_compatible`` từng ô."""
+        rows = self._incidence([self.char_ids.get(ch, -1) for ch in chars], self.expand_indptr, self.expand_indices)
+        cols = self._incidence([self.syllable_ids.get(w, -1) for w in words], self.cand_indptr, self.cand_indices)
+        table = np.zeros((len(chars), len(words)), dtype=bool)
+        if not rows or not cols:
+            return table
+        row_all = np.concatenate(rows)
+        col_all = np.concatenate(cols)
+        relevant = np.intersect1d(row_all, col_all)
+        if relevant.size == 0:
+            return table
+
+        def dense(groups, flat):
+            mat = np.zeros((len(groups), relevant.size), dtype=np.float32)
+            owner = np.repeat(np.arange(len(groups)), [len(g) for g in groups])
+            pos = np.searchsorted(relevant, flat)
+            hit = (pos < relevant.size) & (relevant[np.minimum(pos, relevant.size - 1)] == flat)
+            mat[owner[hit], pos[hit]] = 1.0
+            return mat
+
+        return (dense(rows, row_all) @ dense(cols, col_all).T) > 0
+
+    def cost_rows(self, nom_list: Sequence[Hashable], qn_list: Sequence[Hashable]) -> CostRows:
+        """Ma trận chi phí m×n của một trang, tính trên các token khác nhau."""
+        nom_vocab, qn_vocab = {}, {}
+        row_ids = [nom_vocab.setdefault(t, len(nom_vocab)) for t in nom_list]
+        col_ids = [qn_vocab.setdefault(t, len(qn_vocab)) for t in qn_list]
+        return CostRows(row_ids, col_ids, self.compatibility(list(nom_vocab), list(qn_vocab)))
+
+
+_INDEX_BY_VERSION: Dict[str, CompatibilityIndex] = {}
+_INDEX_BY_FRAMES: Dict[Tuple[int, int], Tuple[pd.DataFrame, pd.DataFrame, CompatibilityIndex]] = {}
+
+
+def get_compatibility_index(similar_df: pd.DataFrame, trans_df: pd.DataFrame) -> CompatibilityIndex:
+    """Lấy chỉ mục cho cặp bảng từ điển, chỉ biên dịch lại khi nội dung đổi."""
+    key = (id(similar_df), id(trans_df))
+    cached = _INDEX_BY_FRAMES.get(key)
+    if cached is not None and cached[0] is similar_df and cached[1] is trans_df:
+        return cached[2]
+    version = dictionary_version(similar_df, trans_df)
+    index = _INDEX_BY_VERSION.get(version)
+    if index is None:
+        cache_dir = trans_df.attrs.get('dictionary_cache')
+        index = CompatibilityIndex.load(cache_dir, version) if cache_dir else None
+        if index is None:
+            index = CompatibilityIndex.from_frames(similar_df, trans_df, version)
+            if cache_dir:
+                index.save(cache_dir)
+        _INDEX_BY_VERSION[version] = index
+    _INDEX_BY_FRAMES.clear()
+    _INDEX_BY_FRAMES[key] = (similar_df, trans_df, index)
+    return index
+
+
+if __name__ == '__main__':
+    # Biên dịch trước cache cho các từ điển cấu hình trong .env
+    import sys
+    from pathlib import Path
+    from dotenv import load_dotenv
+    load_dotenv(dotenv_path=Path(__file__).parent.parent / '.env', override=True)
+
+    paths = sys.argv[1:] or [os.environ['NOM_SIMILARITY_DICTIONARY'], os.environ['QN2NOM_DICTIONARY']]
+    for p in paths:
+        print(f"✓ {p} -> {compile_dictionary(p)}")
@@ -0,0 +1,132 @@
+"""
+Kernel 'diff': căn chỉnh O((m+n)·D) kiểu Ukkonen/Myers, với D là khoảng cách Levenshtein.
+
+Dùng cho hai văn bản gần giống nhau (align_han so chữ Hán với chữ Hán): D nhỏ nên chỉ
+cần đi theo các đường chéo quanh đường chéo chính thay vì điền bảng m×n.
+
+Với mỗi d = 0, 1, ... và mỗi đường chéo k = j - i, ``fronts[d][k + d]`` là hàng xa nhất
+trên đường chéo k có chi phí DP ≤ d. Vì chi phí không giảm dọc theo một đường chéo nên
+dp(i, j) = d nhỏ nhất mà fronts[d][j - i + d] ≥ i; backtrace dùng đúng các giá trị này
+với cùng thứ tự ưu tiên như ``dp.trace`` (D trước L, L trước U) nên kết quả giống hệt
+các kernel DP đầy đủ.
+"""
+from typing import List, Optional
+
+import numpy as np
+
+from .dp import LEFT, MATCH, UP, CostRows
+
+# Số lỗi tối đa trước khi 'auto' bỏ cuộc để kernel DP xử lý (chi phí ~ D² + (m+n)·D).
+# Ngưỡng thực tế còn bị giới hạn bởi min(m, n) // 4: D lớn hơn thì DP dải nhanh hơn.
+DEFAULT_DIFF_MAX_EDITS = 2048
+MIN_DIFF_MAX_EDITS = 64
+
+
+def diff_max_edits(m: int, n: int, max_edits: int = DEFAULT_DIFF_MAX_EDITS) -> int:
+    """Số lỗi tối đa mà 'auto' thử kernel 'diff' cho bài toán m×n."""
+    return min(max_edits, max(MIN_DIFF_MAX_EDITS, min(m, n) // 4))
+
+
+def _matches(cost: CostRows, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    """Ô (i, j) có khớp không, vector hoá theo từng cặp chỉ số."""
+    a, b = cost.row_ids[i], cost.col_ids[j]
+    return a == b if cost.table is None else cost.table[a, b]
+
+
+def _slide(cost: CostRows, i: int, j: int, m: int, n: int) -> int:
+    """Đi dọc đường chéo từ (i, j) khi còn khớp, so từng khối tăng dần; trả về hàng dừng."""
+    size = 16
+    while i < m and j < n:
+        step = min(size, m - i, n - j)
+        miss = np.flatnonzero(~_matches(cost, np.arange(i, i + step), np.arange(j, j + step)))
+        if miss.size:
+            return i + int(miss[0])
+        i += step
+        j += step
+        size *= 2
+    return i
+
+
+def _fronts(cost: CostRows, max_edits: int) -> Optional[List[np.ndarray]]:
+    """Các hàng xa nhất theo từng d cho tới khi chạm (m, n); None nếu D > max_edits."""
+    m, n = cost.shape
+    if abs(n - m) > max_edits:
+        return None
+    none = -(m + n + 2)
+    fronts = []
+    for d in range(max_edits + 1):
+        ks = np.arange(-d, d + 1)
+        if d == 0:
+            front = np.zeros(1, dtype=np.int64)
+        else:
+            prev = fronts[-1]
+            front = np.full(2 * d + 1, none, dtype=np.int64)
+            front[1:-1] = prev + 1  # thay thế, cùng đường chéo
+            np.maximum(front[2:], prev, out=front[2:])  # LEFT từ đường chéo k - 1, cùng hàng
+            np.maximum(front[:-2], prev + 1, out=front[:-2])  # UP từ đường chéo k + 1
+            np.minimum(front, np.minimum(m, n - ks), out=front)
+        front[(ks < -m) | (ks > n) | (front < np.maximum(0, -ks))] = none
+        # Chỉ các đường chéo có ô kế tiếp khớp mới cần trượt tiếp
+        live = np.flatnonzero((front >= 0) & (front < m) & (front + ks < n))
+        if live.size:
+            live = live[_matches(cost, front[live], front[live] + ks[live])]
+        for pos in live.tolist():
+            i = int(front[pos])
+            front[pos] = _slide(cost, i, i + pos - d, m, n)
+        fronts.append(front)
+        if abs(n - m) <= d and front[n - m + d] >= m:
+            return fronts
+    return None
+
+
+def diff_ops(cost: CostRows, max_edits: int = DEFAULT_DIFF_MAX_EDITS) -> Optional[List[int]]:
+    """Dãy mã căn chỉnh giống ``trace(numpy_backtrace(cost))``, hoặc None nếu khoảng
+    cách vượt quá ``max_edits`` (bên gọi chuyển sang kernel khác)."""
+    m, n = cost.shape
+    fronts = _fronts(cost, max_edits)
+    if fronts is None:
+        return None
+    fronts = [front.tolist() for front in fronts]
+    cap = len(fronts)
+    rows, cols, table = cost.row_ids.tolist(), cost.col_ids.tolist(), cost.table
+
+    def match(i: int, j: int) -> bool:
+        return rows[i] == cols[j] if table is None else bool(table[rows[i], cols[j]])
+
+    def value(i: int, j: int) -> int:
+        """dp(i, j), hoặc ``cap`` nếu lớn hơn D."""
+        k = j - i
+        lo, hi = abs(k), cap
+        while lo < hi:
+            d = (lo + hi) // 2
+            if fronts[d][k + d] >= i:
+                hi = d
+            else:
+                lo = d + 1
+        return lo
+
+    ops = []
+    i, j = m, n
+    while i > 0 and j > 0:
+        if match(i - 1, j - 1):
+            # Ô khớp: dp(i, j) = dp(i-1, j-1) ≤ hai ô kề + 1 nên luôn chọn đường chéo
+            ops.append(MATCH)
+            i -= 1
+            j -= 1
+            continue
+        diag = value(i - 1, j - 1) + 1
+        up = value(i - 1, j) + 1
+        left = value(i, j - 1) + 1
+        if diag <= min(up, left):
+            ops.append(MATCH)
+            i -= 1
+            j -= 1
+        elif left <= up:
+            ops.append(LEFT)
+            j -= 1
+        else:
+            ops.append(UP)
+            i -= 1
+    ops.extend([UP] * i + [LEFT] * j)
+    ops.reverse()
+    return ops
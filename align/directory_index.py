@@ -0,0 +1,120 @@
+"""
+Chỉ mục thư mục dùng chung cho việc tìm file "flexible" trong mapping (k=2).
+
+Mỗi thư mục chỉ được liệt kê một lần: tên file -> đường dẫn, tên file đã casefold
+-> đường dẫn (None nếu nhiều file trùng tên khi không phân biệt hoa thường), và base
+name viết thường -> các file cùng base name (theo thứ tự ``os.listdir``). Tra cứu sau
+đó không cần thêm lời gọi hệ thống nào.
+"""
+import os
+from typing import Dict, List, Optional, Tuple
+
+# Phần mở rộng được chấp nhận khi tên trong mapping lệch phần mở rộng với file thật
+FLEXIBLE_EXTENSIONS = ('.json', '.txt', '.jpg', '.png')
+
+
+class DirectoryIndex:
+    """Chỉ mục một thư mục, dựng lười ở lần tra cứu đầu tiên."""
+
+    def __init__(self, dir_path: str):
+        self.dir_path = dir_path
+        self._names = None
+        self._folded: Dict[str, Optional[str]] = {}
+        self._by_base: Dict[str, List[Tuple[str, str, str]]] = {}
+        self._is_dir = False
+
+    def refresh(self) -> 'DirectoryIndex':
+        """Liệt kê lại thư mục ngay."""
+        names = set()
+        folded = {}
+        by_base = {}
+        self._is_dir = os.path.isdir(self.dir_path)
+        if self._is_dir:
+            with os.scandir(self.dir_path) as entries:
+                for entry in entries:
+                    names.add(entry.name)
+                    key = entry.name.casefold()
+                    # Nhiều tên chỉ khác hoa thường: không đoán, đánh dấu là mơ hồ
+                    folded[key] = None if key in folded else os.path.join(self.dir_path, entry.name)
+                    if not entry.is_file():
+                        continue
+                    base, ext = os.path.splitext(entry.name)
+                    by_base.setdefault(base.lower(), []).append((entry.name, ext.lower(), os.path.join(self.dir_path, entry.name)))
+        self._names = names
+        self._folded = folded
+        self._by_base = by_base
+        return self
+
+    def invalidate(self) -> None:
+        """Đánh dấu chỉ mục đã cũ; lần tra cứu sau sẽ liệt kê lại thư mục."""
+        self._names = None
+
+    def _ensure(self) -> None:
+        if self._names is None:
+            self.refresh()
+
+    @property
+    def exists(self) -> bool:
+        self._ensure()
+        return self._is_dir
+
+    def find(self, target_filename: str, any_extension: bool = False) -> Optional[str]:
+        """
+        Tìm file flexible - support case insensitive và mismatch extension
+
+        Args:
+            target_filename: Tên file cần tìm
+            any_extension: Nếu tên cần tìm không có extension, chấp nhận file cùng
+                base name với extension bất kỳ
+
+        Returns:
+            Full path nếu tìm thấy, None nếu không
+        """
+        self._ensure()
+        if not self._is_dir:
+            return None
+
+        # Thử kiểm tra trực tiếp trước (tên có thư mục con thì hỏi hệ thống file)
+        full_path = os.path.join(self.dir_path, target_filename)
+        if os.path.dirname(target_filename):
+            if os.path.exists(full_path):
+                return full_path
+        elif target_filename in self._names:
+            return full_path
+        elif self._folded.get(target_filename.casefold()):
+            # Trùng đúng một tên khi không phân biệt hoa thường (như os.path.exists trên
+            # Windows); nhiều tên trùng thì dùng cách so base name bên dưới như trước
+            return self._folded[target_filename.casefold()]
+
+        # Match nếu base name giống (không case sensitive)
+        target_base, target_ext = os.path.splitext(target_filename)
+        for _, item_ext, item_path in self._by_base.get(target_base.lower(), []):
+            if (any_extension and not target_ext) or item_ext in FLEXIBLE_EXTENSIONS:
+                return item_path
+        return None
+
+    def similar(self, target_filename: str) -> List[str]:
+        """Tên các file cùng base name (không phân biệt hoa thường), mọi extension."""
+        self._ensure()
+        target_base = os.path.splitext(target_filename)[0]
+        return [name for name, _, _ in self._by_base.get(target_base.lower(), [])]
+
+
+_indexes: Dict[str, DirectoryIndex] = {}
+
+
+def get_directory_index(dir_path: str) -> DirectoryIndex:
+    """Chỉ mục dùng chung của tiến trình cho ``dir_path``."""
+    key = os.path.abspath(dir_path)
+    index = _indexes.get(key)
+    if index is None:
+        index = _indexes[key] = DirectoryIndex(dir_path)
+    return index
+
+
+def invalidate_directory_indexes(dir_path: Optional[str] = None) -> None:
+    """Bỏ chỉ mục của ``dir_path`` (hoặc mọi thư mục) để lần sau liệt kê lại."""
+    if dir_path is None:
+        _indexes.clear()
+    else:
+        _indexes.pop(os.path.abspath(dir_path), None)
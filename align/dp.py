@@ -0,0 +1,454 @@
+"""
+Levenshtein alignment kernels dùng chung cho align.align và align_han.
+
+Backtrace được lưu dưới dạng mã uint8 thay vì mảng object các ký tự 'D'/'L'/'U'.
+Thứ tự ưu tiên khi hoà điểm giữ nguyên như bản Python gốc (min trên tuple
+(cost, letter)): D trước L, L trước U.
+"""
+import os
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Mã backtrace
+STOP, MATCH, LEFT, UP = 0, 1, 2, 3
+
+# 'anchored' chia bài toán theo các điểm neo chắc chắn: gần tuyến tính nhưng không
+# đảm bảo chi phí tối ưu như các kernel còn lại. 'sparse' tối ưu về chi phí nhưng
+# có thể đặt khoảng trống khác khi hoà điểm. 'diff' (O((m+n)·D)) cho kết quả giống
+# hệt DP đầy đủ; 'auto' thử nó trước khi chi phí chỉ là so bằng (``table`` là None).
+KERNELS = ('auto', 'numpy', 'banded', 'hirschberg', 'python', 'anchored', 'sparse', 'diff')
+
+# Ngưỡng số ô m×n để 'auto' chuyển sang Hirschberg (bộ nhớ tuyến tính)
+DEFAULT_LINEAR_MEMORY_CELLS = 50_000_000
+# Khối con nhỏ hơn ngưỡng này được điền đầy đủ thay vì chia tiếp
+HIRSCHBERG_BLOCK_CELLS = 1 << 20
+# Nửa độ rộng dải ban đầu cho kernel 'banded' (nhân đôi khi chưa chứng minh được tối ưu)
+DEFAULT_BAND_WIDTH = 64
+# Số cặp khớp trung bình trên mỗi token (cặp khớp / (m + n)) tối đa để 'auto' chọn
+# kernel 'sparse'. Đo với bảng tương thích, m, n từ 500 đến 5000: 'sparse' nhanh hơn
+# 'banded' khi dưới khoảng 0,6-0,8 cặp/token, bất kể m×n; 0 là tắt
+DEFAULT_SPARSE_DENSITY = 0.6
+
+
+class CostRows:
+    """Ma trận chi phí thay thế m×n (0 = khớp, 1 = không khớp) sinh theo từng dòng.
+
+    Mỗi token được quy về một id nguyên; ``table[row_id, col_id]`` cho biết cặp
+    id có khớp hay không. Khi ``table`` là None, hai token khớp khi id bằng nhau.
+    """
+
+    def __init__(self, row_ids: np.ndarray, col_ids: np.ndarray, table: Optional[np.ndarray] = None):
+        self.row_ids = np.asarray(row_ids, dtype=np.int64)
+        self.col_ids = np.asarray(col_ids, dtype=np.int64)
+        self.table = table
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self.row_ids), len(self.col_ids)
+
+    @classmethod
+    def equality(cls, left: Sequence[str], right: Sequence[str]) -> 'CostRows':
+        vocab = {}
+        row_ids = [vocab.setdefault(t, len(vocab)) for t in left]
+        col_ids = [vocab.setdefault(t, len(vocab)) for t in right]
+        return cls(row_ids, col_ids)
+
+    @classmethod
+    def from_predicate(cls, left: Sequence[str], right: Sequence[str], predicate: Callable[[str, str], bool]) -> 'CostRows':
+        """Gọi ``predicate`` một lần cho mỗi cặp token khác nhau thay vì mỗi ô DP."""
+        left_vocab, right_vocab = {}, {}
+        row_ids = [left_vocab.setdefault(t, len(left_vocab)) for t in left]
+        col_ids = [right_vocab.setdefault(t, len(right_vocab)) for t in right]
+        table = np.zeros((len(left_vocab), len(right_vocab)), dtype=bool)
+        for l_tok, l_id in left_vocab.items():
+            for r_tok, r_id in right_vocab.items():
+                table[l_id, r_id] = predicate(l_tok, r_tok)
+        return cls(row_ids, col_ids, table)
+
+    def row(self, i: int, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        cols = self.col_ids[start:stop]
+        if self.table is None:
+            return (cols != self.row_ids[i]).astype(np.int64)
+        return (~self.table[self.row_ids[i], cols]).astype(np.int64)
+
+
+def _step_row(prev: np.ndarray, first: int, cost_row: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Tính một dòng DP từ dòng trước, trả về (dòng mới, mã backtrace cho cột 1..n).
+
+    ``first`` là giá trị ô đầu dòng. Chuỗi phụ thuộc trái-phải được khử bằng
+    prefix-min: dp[j] = min_k (t[k] - k) + j với t = min(up, diag).
+    """
+    width = len(prev)
+    ar = np.arange(width, dtype=np.int64)
+    up = prev[1:] + 1
+    diag = prev[:-1] + cost_row
+    t = np.empty(width, dtype=np.int64)
+    t[0] = first
+    np.minimum(up, diag, out=t[1:])
+    cur = np.minimum.accumulate(t - ar) + ar
+    left = cur[:-1] + 1
+    codes = np.where(diag <= np.minimum(up, left), MATCH, np.where(left <= up, LEFT, UP)).astype(np.uint8)
+    return cur, codes
+
+
+def numpy_backtrace(cost: CostRows) -> np.ndarray:
+    """Điền bảng backtrace (m+1)×(n+1) kiểu uint8, mỗi dòng một bước vector hoá."""
+    m, n = cost.shape
+    back = np.empty((m + 1, n + 1), dtype=np.uint8)
+    back[0, 0] = STOP
+    back[0, 1:] = LEFT
+    back[1:, 0] = UP
+    prev = np.arange(n + 1, dtype=np.int64)
+    for i in range(1, m + 1):
+        prev, back[i, 1:] = _step_row(prev, i, cost.row(i - 1))
+    return back
+
+
+def python_backtrace(cost: CostRows) -> np.ndarray:
+    """Bản tham chiếu: vòng lặp đôi thuần Python như cài đặt ban đầu."""
+    m, n = cost.shape
+    dp = np.zeros((m + 1, n + 1), dtype=int)
+    back = np.zeros((m + 1, n + 1), dtype=np.uint8)
+    for i in range(m + 1):
+        dp[i][0] = i
+        back[i][0] = UP
+    for j in range(n + 1):
+        dp[0][j] = j
+        back[0][j] = LEFT
+    back[0][0] = STOP
+    letters = {'D': MATCH, 'L': LEFT, 'U': UP}
+    for i in range(1, m + 1):
+        cost_row = cost.row(i - 1)
+        for j in range(1, n + 1):
+            options = [
+                (dp[i - 1][j] + 1, 'U'),
+                (dp[i][j - 1] + 1, 'L'),
+                (dp[i - 1][j - 1] + cost_row[j - 1], 'D'),
+            ]
+            dp[i][j], letter = min(options)
+            back[i][j] = letters[letter]
+    return back
+
+
+def trace(back: np.ndarray) -> List[int]:
+    """Đi ngược từ góc (m, n) về (0, 0), trả về dãy mã theo thứ tự xuôi."""
+    i, j = back.shape[0] - 1, back.shape[1] - 1
+    ops = []
+    while i > 0 or j > 0:
+        code = int(back[i, j])
+        ops.append(code)
+        if code == MATCH:
+            i -= 1
+            j -= 1
+        elif code == UP:
+            i -= 1
+        else:
+            j -= 1
+    ops.reverse()
+    return ops
+
+
+def render(ops: Sequence[int], left: Sequence[str], right: Sequence[str], gap: str = '*') -> Tuple[List[str], List[str]]:
+    """Chuyển dãy mã thành hai danh sách đã căn, chèn ``gap`` tại vị trí trống."""
+    aligned_left, aligned_right = [], []
+    i = j = 0
+    for code in ops:
+        if code == MATCH:
+            aligned_left.append(left[i])
+            aligned_right.append(right[j])
+            i += 1
+            j += 1
+        elif code == UP:
+            aligned_left.append(left[i])
+            aligned_right.append(gap)
+            i += 1
+        else:
+            aligned_left.append(gap)
+            aligned_right.append(right[j])
+            j += 1
+    return aligned_left, aligned_right
+
+
+class SegmentCursor:
+    """Con trỏ cắt dãy đã căn thành các đoạn liên tiếp theo số token khác ``gap``.
+
+    Vị trí kết thúc của mỗi token khác ``gap`` được tính một lần, nên mỗi lần
+    ``take`` chỉ tốn O(1) và không sao chép phần còn lại của dãy.
+    Một đoạn dừng ngay sau token thứ ``num``; các ``gap`` theo sau thuộc về đoạn kế tiếp.
+    """
+
+    def __init__(self, aligned: Sequence[str], gap: str = '*'):
+        self.length = len(aligned)
+        self.stops = [i + 1 for i, token in enumerate(aligned) if token != gap]
+        self.pos = 0
+        self.taken = 0
+
+    @property
+    def exhausted(self) -> bool:
+        return self.pos >= self.length
+
+    def take(self, num: int) -> Tuple[int, int, int]:
+        """Lấy đoạn chứa ``num`` token khác gap, trả về (start, stop, số token thực lấy được)."""
+        start = self.pos
+        need = self.taken + num
+        if need <= len(self.stops):
+            self.pos = self.stops[need - 1] if num else start
+            self.taken = need
+            return start, self.pos, num
+        count = len(self.stops) - self.taken
+        self.pos = self.length
+        self.taken = len(self.stops)
+        return start, self.pos, count
+
+
+def _solve_block(cost: CostRows, r0: int, r1: int, c0: int, c1: int, top: np.ndarray, left: np.ndarray, ops: List[int], block_cells: int) -> Tuple[int, int]:
+    """Đi ngược đường backtrace từ (r1, c1) cho tới khi chạm dòng r0 hoặc cột c0.
+
+    ``top`` = dp[r0][c0..c1] và ``left`` = dp[r0..r1][c0] là giá trị toàn cục trên
+    biên khối, nên mã backtrace bên trong khối trùng với bảng đầy đủ. Mã được nối
+    vào ``ops`` theo thứ tự ngược; trả về ô chạm biên.
+    """
+    h, w = r1 - r0, c1 - c0
+    if h == 0 or w == 0:
+        return r1, c1
+
+    if h == 1 or (h + 1) * (w + 1) <= block_cells:
+        back = np.empty((h + 1, w + 1), dtype=np.uint8)
+        prev = top
+        for i in range(1, h + 1):
+            prev, back[i, 1:] = _step_row(prev, left[i], cost.row(r0 + i - 1, c0, c1))
+        i, j = h, w
+        while i > 0 and j > 0:
+            code = int(back[i, j])
+            ops.append(code)
+            if code == MATCH:
+                i -= 1
+                j -= 1
+            elif code == UP:
+                i -= 1
+            else:
+                j -= 1
+        return r0 + i, c0 + j
+
+    # Duyệt xuôi toàn khối, từ dòng giữa trở đi lan truyền "cột thoát": cột mà
+    # đường backtrace của mỗi ô chạm dòng giữa lần đầu (-1 nếu chạm cột c0 trước).
+    mid = h // 2
+    ar = np.arange(w + 1)
+    prev = top
+    exit_col = None
+    for i in range(1, h + 1):
+        prev, codes = _step_row(prev, left[i], cost.row(r0 + i - 1, c0, c1))
+        if i == mid:
+            mid_row = prev
+            exit_col = ar.copy()
+        elif i > mid:
+            vals = np.empty(w + 1, dtype=np.int64)
+            vals[0] = -1
+            vals[1:] = np.where(codes == MATCH, exit_col[:-1], exit_col[1:])
+            src = np.where(np.concatenate(([False], codes == LEFT)), 0, ar)
+            exit_col = vals[np.maximum.accumulate(src)]
+    k = int(exit_col[w])
+
+    if k < 0:
+        # Đường đi chạm cột c0 bên dưới dòng giữa: chỉ cần nửa dưới
+        return _solve_block(cost, r0 + mid, r1, c0, c1, mid_row, left[mid:], ops, block_cells)
+
+    # Nửa dưới: từ (r1, c1) tới (r0 + mid, c0 + k). Lấy cột biên c0 + k - 1 bằng
+    # một lượt duyệt phụ để ô ở cột c0 + k nằm trong khối con.
+    kc = max(k - 1, 0)
+    if kc == 0:
+        sub_left = left[mid:]
+    else:
+        sub_left = np.empty(h - mid + 1, dtype=np.int64)
+        sub_left[0] = mid_row[kc]
+        prev = mid_row[:kc + 1]
+        for i in range(mid + 1, h + 1):
+            prev, _ = _step_row(prev, left[i], cost.row(r0 + i - 1, c0, c0 + kc))
+            sub_left[i - mid] = prev[kc]
+    _solve_block(cost, r0 + mid, r1, c0 + kc, c1, mid_row[kc:], sub_left, ops, block_cells)
+    del mid_row, sub_left
+
+    if k == 0:
+        return r0 + mid, c0
+    # Nửa trên: từ (r0 + mid, c0 + k) về biên của khối hiện tại
+    return _solve_block(cost, r0, r0 + mid, c0, c0 + k, top[:k + 1], left[:mid + 1], ops, block_cells)
+
+
+def hirschberg_ops(cost: CostRows, block_cells: int = HIRSCHBERG_BLOCK_CELLS) -> List[int]:
+    """Dãy mã backtrace giống hệt ``trace(numpy_backtrace(cost))`` với bộ nhớ O(m + n).
+
+    Chia đôi theo dòng kiểu Hirschberg, nhưng điểm cắt được chọn theo đường
+    backtrace thực (lan truyền cột thoát) nên giữ nguyên thứ tự ưu tiên khi hoà.
+    """
+    m, n = cost.shape
+    ops: List[int] = []
+    i, j = _solve_block(cost, 0, m, 0, n, np.arange(n + 1, dtype=np.int64), np.arange(m + 1, dtype=np.int64), ops, block_cells)
+    ops.extend([LEFT] * j if i == 0 else [UP] * i)
+    ops.reverse()
+    return ops
+
+
+def _band_limits(m: int, n: int, w: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Cột đầu/cuối của dải ±w quanh đường chéo đã co giãn j = i·n/m cho mỗi dòng."""
+    i = np.arange(m + 1, dtype=np.int64)
+    lo = np.clip(-((w * m - i * n) // m), 0, n)
+    hi = np.clip((i * n + w * m) // m, 0, n)
+    return lo, hi
+
+
+def _outside_lower_bound(m: int, n: int, lo: np.ndarray, hi: np.ndarray) -> float:
+    """Cận dưới chi phí của mọi đường đi qua một ô nằm ngoài dải.
+
+    Đi qua ô (i, j) tốn ít nhất |j - i| + |(n - j) - (m - i)| thao tác chèn/xoá.
+    """
+    i = np.arange(m + 1, dtype=np.int64)
+    p = np.minimum(i, i + n - m)
+    q = np.maximum(i, i + n - m)
+
+    def g(j):
+        return np.abs(j - i) + np.abs(j - (i + n - m))
+
+    best = np.inf
+    for has_cells, a, b in ((lo > 0, 0, lo - 1), (hi < n, hi + 1, n)):
+        if has_cells.any():
+            vals = np.minimum(g(np.clip(p, a, b)), g(np.clip(q, a, b)))
+            best = min(best, float(vals[has_cells].min()))
+    return best
+
+
+def _banded_try(cost: CostRows, w: int) -> Tuple[Optional[List[int]], int]:
+    """Chạy DP trong dải ±w.
+
+    Trả về (dãy mã, điểm) nếu chứng minh được trùng bảng đầy đủ, ngược lại
+    (None, điểm trong dải) — điểm này là cận trên của khoảng cách thật.
+    """
+    m, n = cost.shape
+    lo, hi = _band_limits(m, n, w)
+    if not lo.any() and (hi == n).all():
+        return trace(numpy_backtrace(cost)), 0
+
+    inf = np.int64(2 * (m + n) + 2)
+    back = np.empty((m + 1, int((hi - lo).max()) + 1), dtype=np.uint8)
+    prev = np.arange(hi[0] + 1, dtype=np.int64)
+    back[0, 0] = STOP
+    back[0, 1:hi[0] + 1] = LEFT
+    for i in range(1, m + 1):
+        lo_i, hi_i, lo_p, hi_p = int(lo[i]), int(hi[i]), int(lo[i - 1]), int(hi[i - 1])
+        base = max(lo_i - 1, 0)
+        prev_ext = np.full(hi_i - base + 1, inf, dtype=np.int64)
+        a, b = max(base, lo_p), min(hi_i, hi_p)
+        if a <= b:
+            prev_ext[a - base:b - base + 1] = prev[a - lo_p:b - lo_p + 1]
+        cur, codes = _step_row(prev_ext, i if lo_i == 0 else inf, cost.row(i - 1, base, hi_i))
+        if lo_i == 0:
+            prev = cur
+            back[i, 0] = UP
+            back[i, 1:hi_i + 1] = codes
+        else:
+            prev = cur[1:]
+            back[i, :hi_i - lo_i + 1] = codes
+    score = int(prev[-1])
+
+    ops = []
+    touched = False
+    i, j = m, n
+    while i > 0 or j > 0:
+        if (j == lo[i] and lo[i] > 0) or (j == hi[i] and hi[i] < n):
+            touched = True
+        code = int(back[i, j - lo[i]])
+        ops.append(code)
+        if code == MATCH:
+            i -= 1
+            j -= 1
+        elif code == UP:
+            i -= 1
+        else:
+            j -= 1
+    # Chạm mép dải, hoặc có thể tồn tại đường ngoài dải rẻ hơn/bằng (ảnh hưởng
+    # thứ tự ưu tiên khi hoà): chưa chắc chắn, cần nới dải.
+    if touched or score >= _outside_lower_bound(m, n, lo, hi):
+        return None, score
+    ops.reverse()
+    return ops, score
+
+
+def banded_ops(cost: CostRows, band_width: int = DEFAULT_BAND_WIDTH) -> List[int]:
+    """Dãy mã giống hệt bảng đầy đủ, nhưng chỉ tính các ô trong dải quanh đường chéo.
+
+    Dải bắt đầu với nửa độ rộng ``band_width`` và được nhân đôi cho tới khi
+    đường tối ưu không chạm mép dải và không đường nào ra ngoài dải có thể
+    rẻ bằng, nên kết quả luôn chính xác. Chi phí ~O((m + n)·w).
+    """
+    m, n = cost.shape
+    if m == 0 or n == 0:
+        return trace(numpy_backtrace(cost))
+    # Dải phải đủ rộng để các dòng liên tiếp chồng lên nhau
+    w = max(band_width, -(-n // m) + 1)
+    while True:
+        ops, score = _banded_try(cost, w)
+        if ops is not None:
+            return ops
+        # Nhân đôi ít nhất một lần, và đủ để cận dưới ngoài dải vượt điểm đã biết
+        w *= 2
+        while w < max(m, n) and _outside_lower_bound(m, n, *_band_limits(m, n, w)) <= score:
+            w *= 2
+
+
+def resolve_kernel(kernel: str, m: int, n: int, linear_memory_cells: Optional[int] = None) -> str:
+    """Quy 'auto' về kernel cụ thể theo kích thước bài toán."""
+    if kernel not in KERNELS:
+        raise ValueError(f"kernel không hợp lệ: {kernel!r} (chọn một trong {KERNELS})")
+    if kernel != 'auto':
+        return kernel
+    if linear_memory_cells is None:
+        linear_memory_cells = int(os.environ.get('ALIGN_LINEAR_MEMORY_CELLS', DEFAULT_LINEAR_MEMORY_CELLS))
+    return 'hirschberg' if m * n > linear_memory_cells else 'banded'
+
+
+def sparse_density_threshold(sparse_density: Optional[float] = None) -> float:
+    """Ngưỡng số cặp khớp / token cho 'auto' → 'sparse' (mặc định: biến môi trường ALIGN_SPARSE_DENSITY)."""
+    if sparse_density is None:
+        sparse_density = float(os.environ.get('ALIGN_SPARSE_DENSITY', DEFAULT_SPARSE_DENSITY))
+    return sparse_density
+
+
+def kernel_ops(cost: CostRows, kernel: str = 'auto', linear_memory_cells: Optional[int] = None, band_width: int = DEFAULT_BAND_WIDTH, sparse_density: Optional[float] = None) -> List[int]:
+    """Dãy mã căn chỉnh (MATCH/LEFT/UP) của ``cost`` theo kernel đã chọn.
+
+    ``sparse_density`` (chỉ dùng với 'auto'): nếu số cặp khớp không vượt quá
+    ``sparse_density * (m + n)`` thì dùng kernel 'sparse'; None/0 là tắt.
+    """
+    m, n = cost.shape
+    if kernel == 'auto' and cost.table is None:
+        # So bằng thuần tuý (align_han): hai văn bản gần giống nhau nên D nhỏ
+        from .diff import diff_max_edits, diff_ops
+        ops = diff_ops(cost, diff_max_edits(m, n))
+        if ops is not None:
+            return ops
+    if kernel == 'auto' and sparse_density:
+        from .sparse import match_count
+        if match_count(cost) <= sparse_density * (m + n):
+            kernel = 'sparse'
+    kernel = resolve_kernel(kernel, m, n, linear_memory_cells)
+    if kernel == 'diff':
+        from .diff import diff_ops
+        return diff_ops(cost, max(m, n))
+    if kernel == 'sparse':
+        from .sparse import sparse_ops
+        return sparse_ops(cost)
+    if kernel == 'anchored':
+        from .sparse import anchored_ops
+        return anchored_ops(cost, linear_memory_cells=linear_memory_cells, band_width=band_width)
+    if kernel == 'hirschberg':
+        return hirschberg_ops(cost)
+    if kernel == 'banded':
+        return banded_ops(cost, band_width)
+    if kernel == 'numpy':
+        return trace(numpy_backtrace(cost))
+    return trace(python_backtrace(cost))
+
+
+def align_tokens(left: Sequence[str], right: Sequence[str], cost: CostRows, kernel: str = 'auto', linear_memory_cells: Optional[int] = None, band_width: int = DEFAULT_BAND_WIDTH, sparse_density: Optional[float] = None) -> Tuple[List[str], List[str]]:
+    """Căn hai dãy token theo ``cost`` bằng kernel đã chọn."""
+    return render(kernel_ops(cost, kernel, linear_memory_cells, band_width, sparse_density), left, right)
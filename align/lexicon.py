@@ -0,0 +1,130 @@
+"""
+Danh sách âm tiết Quốc Ngữ (model/tokenization/syllable.txt) dùng chung cho
+vi_process, tokenizer và color.
+
+File chỉ được đọc ở lần dùng đầu tiên (không đọc lúc import) và được biên dịch
+thành cache nhị phân theo sha1 của file, cùng định dạng và thư mục cache với từ
+điển (DICT_CACHE_DIR hoặc ``.cache`` cạnh file nguồn). Mọi module trong tiến trình
+dùng chung một bản trong bộ nhớ; bản này được nạp lại khi file nguồn đổi nội dung.
+"""
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .automaton import AhoCorasick
+from .trie import build_trie
+from .dictionary import _load_strings, _save_strings, _valid_entry, _write_entry, CACHE_FORMAT, default_cache_dir, file_digest
+
+DEFAULT_SYLLABLE_PATH = Path(__file__).parent.parent / 'model' / 'tokenization' / 'syllable.txt'
+
+
+def syllable_path() -> str:
+    """Đường dẫn file âm tiết: biến môi trường SYLLABLE, mặc định file trong repo."""
+    return os.environ.get('SYLLABLE') or str(DEFAULT_SYLLABLE_PATH)
+
+
+class Lexicon:
+    """
+    Tập âm tiết
+
+    Attributes:
+        words: Danh sách âm tiết theo thứ tự trong file
+        syllables: frozenset để tra cứu O(1)
+        max_len: Độ dài âm tiết dài nhất
+        digest: sha1 của file nguồn ('' nếu không rõ), dùng làm phiên bản cho cache
+    """
+
+    def __init__(self, words: Iterable[str], digest: str = ''):
+        self.words: List[str] = list(words)
+        self.digest = digest
+        self.syllables = frozenset(self.words)
+        self.max_len = max(map(len, self.words), default=0)
+        self._trie = None
+        self._automaton = None
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.syllables
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    @property
+    def trie(self) -> dict:
+        """Trie ký tự -> nút con; khoá '' đánh dấu nút kết thúc một âm tiết."""
+        if self._trie is None:
+            self._trie = build_trie(self.words)
+        return self._trie
+
+    @property
+    def automaton(self) -> AhoCorasick:
+        """Automaton Aho–Corasick trên các âm tiết (dựng ở lần dùng đầu tiên)."""
+        if self._automaton is None:
+            self._automaton = AhoCorasick(self.words)
+        return self._automaton
+
+    def prefix_ends(self, text: str, start: int = 0) -> List[int]:
+        """Các vị trí end tăng dần sao cho text[start:end] là một âm tiết."""
+        ends = []
+        node = self.trie
+        for pos in range(start, len(text)):
+            node = node.get(text[pos])
+            if node is None:
+                break
+            if '' in node:
+                ends.append(pos + 1)
+        return ends
+
+
+def _read_words(path: str) -> List[str]:
+    with open(path, encoding='utf-16') as f:
+        return [line.strip() for line in f.read().splitlines()]
+
+
+def compile_lexicon(path: str, cache_dir: Optional[str] = None, digest: Optional[str] = None) -> str:
+    """Biên dịch file âm tiết thành cache nhị phân, trả về thư mục cache.
+
+    ``digest``: sha1 của file nếu bên gọi đã tính (tránh đọc file nguồn hai lần).
+    """
+    cache_dir = cache_dir or default_cache_dir(path)
+    digest = digest or file_digest(path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    entry = os.path.join(cache_dir, f'{stem}-{digest[:16]}')
+    if _valid_entry(entry, digest):
+        return entry
+    os.makedirs(cache_dir, exist_ok=True)
+    words = _read_words(path)
+    _write_entry(entry, {'format': CACHE_FORMAT, 'sha1': digest, 'source': os.path.basename(path)},
+                 lambda tmp: _save_strings(tmp, 'words', words))
+    return entry
+
+
+# đường dẫn tuyệt đối -> ((mtime_ns, kích thước) của file lúc nạp, lexicon)
+_lexicons: Dict[str, Tuple[Tuple[int, int], Lexicon]] = {}
+
+
+def get_lexicon(path: Optional[str] = None) -> Lexicon:
+    """Lexicon dùng chung của tiến trình cho ``path`` (mặc định: ``syllable_path()``).
+
+    Mỗi lần gọi chỉ ``stat`` file nguồn; khi mtime/kích thước đổi thì hash lại và
+    nạp lại nếu nội dung thật sự khác (tiến trình chạy lâu như align_service thấy
+    được file âm tiết mới).
+    """
+    path = path or syllable_path()
+    key = os.path.abspath(path)
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _lexicons.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    digest = file_digest(path)
+    if cached is not None and cached[1].digest == digest:
+        lexicon = cached[1]
+    else:
+        try:
+            words = _load_strings(compile_lexicon(path, digest=digest), 'words')
+        except OSError:
+            # Không ghi được cache (thư mục chỉ đọc): đọc thẳng file nguồn
+            words = _read_words(path)
+        lexicon = Lexicon(words, digest)
+    _lexicons[key] = (stamp, lexicon)
+    return lexicon
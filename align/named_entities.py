@@ -0,0 +1,63 @@
+"""
+Viết lại tên riêng (tên thánh, địa danh phiên âm) theo ``saint_name.dict_saint``
+trong một lượt duyệt văn bản.
+
+Các khoá được chuẩn hoá NFC, viết thường và dựng thành trie ký tự; trie được biên dịch
+thành một regex lồng theo tiền tố (mỗi nhánh chỉ thử khi ký tự trước đã khớp), nên
+một lần ``re.sub`` duyệt văn bản tuyến tính và chi phí gần như không phụ thuộc số cặp
+trong từ điển (khác với một chuỗi ``str.replace``). Chỉ khớp trọn từ (hai đầu là ranh
+giới từ), không phân biệt hoa thường, lấy khoá dài nhất, không chồng lấn.
+"""
+import re
+import unicodedata
+from typing import Mapping, Optional
+
+from .saint_name import dict_saint
+from .trie import build_trie, trie_pattern
+
+# Ranh giới từ: không đứng sau / trước một ký tự chữ hoặc số
+_BEFORE = r'(?<![^\W_])'
+_AFTER = r'(?![^\W_])'
+
+
+def _nfc(text: str) -> str:
+    return unicodedata.normalize('NFC', text)
+
+
+class NameRewriter:
+    """
+    Bộ viết lại đã biên dịch
+
+    Args:
+        mapping: khoá -> chuỗi thay thế; khoá trùng nhau sau khi chuẩn hoá thì cặp
+            sau cùng được dùng (như khi viết đè trong dict)
+    """
+
+    def __init__(self, mapping: Mapping[str, str]):
+        self._values = {}
+        for key, value in mapping.items():
+            key = _nfc(key).lower()
+            if key:
+                self._values[key] = _nfc(value)
+        trie = build_trie(self._values)
+        body = trie_pattern(trie) if trie else '(?!)'
+        self._regex = re.compile(_BEFORE + body + _AFTER, re.IGNORECASE)
+
+    def _replace(self, match: re.Match) -> str:
+        name = match.group(0)
+        return self._values.get(name.lower(), name)
+
+    def rewrite(self, text: str) -> str:
+        """Thay mọi tên riêng trong ``text`` (văn bản được chuẩn hoá NFC trước khi khớp)."""
+        return self._regex.sub(self._replace, _nfc(text))
+
+
+_rewriter: Optional[NameRewriter] = None
+
+
+def get_saint_rewriter() -> NameRewriter:
+    """Bộ viết lại dùng chung của tiến trình cho ``saint_name.dict_saint`` (biên dịch ở lần dùng đầu tiên)."""
+    global _rewriter
+    if _rewriter is None:
+        _rewriter = NameRewriter(dict_saint)
+    return _rewriter
@@ -0,0 +1,130 @@
+"""
+Tự ghép trang JSON Hán Nôm với trang TXT Quốc Ngữ cho align k=1.
+
+Mỗi trang được quy về tập bigram id âm trong từ điển:
+- Trang Quốc Ngữ: các cặp token liền nhau (bỏ token không có trong từ điển).
+- Trang Hán Nôm: mọi cặp âm có thể đọc của hai chữ liền nhau (qua ``CompatibilityIndex.syllables``).
+Điểm của một cặp trang là tỉ lệ bigram Quốc Ngữ được trang Hán Nôm giải thích.
+Chỉ mục ngược bigram -> trang TXT cho số bigram chung của một trang Hán Nôm với mọi
+trang TXT trong một lượt (chi phí theo số bigram trùng, không theo số cặp trang);
+chỉ các cặp trong cửa sổ quanh đường chéo tỉ lệ được giữ. Sau đó một DP đơn điệu
+chọn dãy cặp có tổng điểm lớn nhất, cho phép bỏ trang thừa/thiếu ở cả hai bên.
+"""
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from .nom_process import process_nom
+from .vi_process import process_quoc_ngu
+
+# Số trang lệch tối đa so với vị trí tỉ lệ khi tìm trang tương ứng
+DEFAULT_PAIR_WINDOW = 8
+# Điểm tối thiểu để coi hai trang là một cặp
+DEFAULT_MIN_PAIR_SCORE = 0.05
+
+
+def _nom_signature(path: str, k: int, index) -> np.ndarray:
+    nom_data = process_nom(path, k)
+    syllables = [index.syllables(ch) for ch in "".join(nom_data.get('text', []))]
+    size = index.syllable_count
+    grams = [np.add.outer(a.astype(np.int64) * size, b).ravel() for a, b in zip(syllables, syllables[1:]) if a.size and b.size]
+    return np.unique(np.concatenate(grams)) if grams else np.empty(0, dtype=np.int64)
+
+
+def _qn_signature(path: str, index) -> np.ndarray:
+    ids = [index.syllable_ids.get(token, -1) for token in process_quoc_ngu(path)]
+    size = index.syllable_count
+    grams = [a * size + b for a, b in zip(ids, ids[1:]) if a >= 0 and b >= 0]
+    return np.unique(np.array(grams, dtype=np.int64))
+
+
+def _signatures(paths: Sequence[str], make) -> List[np.ndarray]:
+    signatures = []
+    for path in paths:
+        try:
+            signatures.append(make(path))
+        except Exception:
+            # Trang không đọc được sẽ không được ghép; align báo bỏ qua
+            signatures.append(np.empty(0, dtype=np.int64))
+    return signatures
+
+
+class _BigramIndex:
+    """Chỉ mục ngược bigram -> các trang TXT chứa bigram đó (mảng đã sắp xếp)."""
+
+    def __init__(self, signatures: Sequence[np.ndarray]):
+        self.sizes = np.array([signature.size for signature in signatures], dtype=np.int64)
+        grams = np.concatenate(signatures).astype(np.int64)
+        pages = np.repeat(np.arange(len(signatures)), self.sizes)
+        order = np.argsort(grams, kind='stable')
+        self.grams, first = np.unique(grams[order], return_index=True)
+        self.starts = np.append(first, grams.size)
+        self.pages = pages[order]
+
+    def overlaps(self, signature: np.ndarray) -> np.ndarray:
+        """Số bigram chung của ``signature`` (đã unique) với từng trang TXT."""
+        pos = np.searchsorted(self.grams, signature)
+        found = pos < self.grams.size
+        found[found] = self.grams[pos[found]] == signature[found]
+        pos = pos[found]
+        lengths = self.starts[pos + 1] - self.starts[pos]
+        # Nối các đoạn posting [starts[p], starts[p + 1]) của các bigram trùng
+        offsets = np.repeat(self.starts[pos] - (np.cumsum(lengths) - lengths), lengths)
+        postings = self.pages[np.arange(lengths.sum()) + offsets]
+        return np.bincount(postings, minlength=self.sizes.size)
+
+
+def pair_pages(json_paths: Sequence[str], txt_paths: Sequence[str], index, k: int = 1,
+               window: int = DEFAULT_PAIR_WINDOW, min_score: float = DEFAULT_MIN_PAIR_SCORE) -> List[Tuple[int, int, float]]:
+    """
+    Ghép trang theo nội dung, giữ thứ tự tăng dần ở cả hai danh sách
+
+    Args:
+        json_paths, txt_paths: Các trang theo thứ tự cần giữ (như khi ghép theo vị trí)
+        index: CompatibilityIndex của từ điển đang dùng
+
+    Returns:
+        Danh sách (chỉ số JSON, chỉ số TXT, điểm) theo thứ tự tăng dần
+    """
+    n_json, n_txt = len(json_paths), len(txt_paths)
+    if not n_json or not n_txt:
+        return []
+    nom = _signatures(json_paths, lambda p: _nom_signature(p, k, index))
+    qn = _signatures(txt_paths, lambda p: _qn_signature(p, index))
+
+    bigrams = _BigramIndex(qn)
+    scores = np.full((n_json, n_txt), -1.0)
+    for i in range(n_json):
+        if not nom[i].size:
+            continue
+        center = i * n_txt // n_json
+        lo, hi = max(0, center - window), min(n_txt, center + window + 1)
+        sizes = bigrams.sizes[lo:hi]
+        overlap = bigrams.overlaps(nom[i])[lo:hi]
+        score = overlap / np.maximum(sizes, 1)
+        keep = (sizes > 0) & (score >= min_score)
+        scores[i, lo:hi][keep] = score[keep]
+
+    # DP đơn điệu: best[i, j] = tổng điểm lớn nhất khi dùng i trang JSON, j trang TXT đầu
+    best = np.zeros((n_json + 1, n_txt + 1))
+    for i in range(1, n_json + 1):
+        for j in range(1, n_txt + 1):
+            value = max(best[i - 1, j], best[i, j - 1])
+            if scores[i - 1, j - 1] >= 0:
+                value = max(value, best[i - 1, j - 1] + scores[i - 1, j - 1])
+            best[i, j] = value
+
+    pairs = []
+    i, j = n_json, n_txt
+    while i > 0 and j > 0:
+        score = scores[i - 1, j - 1]
+        if score >= 0 and best[i, j] == best[i - 1, j - 1] + score:
+            pairs.append((i - 1, j - 1, float(score)))
+            i -= 1
+            j -= 1
+        elif best[i, j] == best[i - 1, j]:
+            i -= 1
+        else:
+            j -= 1
+    pairs.reverse()
+    return pairs
@@ -0,0 +1,91 @@
+"""
+Sàng lọc nhanh một cặp trang (hoặc một dòng mapping) trước khi chạy DP.
+
+Cặp ghép sai (lệch thứ tự, trang trắng, trang bìa) vẫn tốn một lần DP O(mn) rồi
+sinh ra các dòng rác. Ở đây chỉ dùng ``CostRows`` đã có để kiểm tra, theo thứ tự
+từ rẻ tới đắt:
+- tỉ lệ độ dài hai bên,
+- tỉ lệ chữ Hán Nôm (lấy mẫu đều) có token khớp gần vị trí tương ứng bên kia,
+- số điểm neo (cặp khớp duy nhất cục bộ, xem ``sparse.find_anchors``) so với độ dài.
+"""
+import os
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+from .dp import CostRows
+from .sparse import DEFAULT_ANCHOR_WINDOW, find_anchors
+
+# Ngưỡng mặc định, cặp dưới ngưỡng bị bỏ qua và đưa vào danh sách review
+DEFAULT_MIN_LENGTH_RATIO = 0.25
+DEFAULT_MIN_HIT_RATE = 0.3
+DEFAULT_MIN_ANCHOR_RATE = 0.15
+# Số chữ lấy mẫu khi đo tỉ lệ khớp
+DEFAULT_HIT_SAMPLE = 64
+# Tên file danh sách review, ghi cạnh file kết quả
+REVIEW_FILE_NAME = 'screening_review.tsv'
+
+
+@dataclass
+class ScreeningReject:
+    """Một cặp bị sàng lọc loại. ``message`` là dòng cảnh báo/skip report của bên gọi."""
+    left: str
+    right: str
+    reason: str
+    message: str
+
+    def __str__(self) -> str:
+        return self.message
+
+
+def hit_rate(cost: CostRows, sample: int = DEFAULT_HIT_SAMPLE, window: int = DEFAULT_ANCHOR_WINDOW) -> float:
+    """Tỉ lệ dòng (lấy mẫu đều) có ít nhất một cột khớp trong cửa sổ quanh i*n/m."""
+    m, n = cost.shape
+    if m == 0 or n == 0:
+        return 0.0
+    rows = np.unique(np.linspace(0, m - 1, min(m, sample)).astype(np.int64))
+    hits = 0
+    for i in rows:
+        center = int(i) * n // m
+        start = max(0, center - window)
+        hits += bool((cost.row(int(i), start, center + window + 1) == 0).any())
+    return hits / len(rows)
+
+
+def screen_pair(cost: CostRows,
+                min_length_ratio: float = DEFAULT_MIN_LENGTH_RATIO,
+                min_hit_rate: float = DEFAULT_MIN_HIT_RATE,
+                min_anchor_rate: float = DEFAULT_MIN_ANCHOR_RATE) -> Optional[str]:
+    """
+    Kiểm tra nhanh một cặp trước DP
+
+    Returns:
+        None nếu cặp đáng align, ngược lại là lý do loại
+    """
+    m, n = cost.shape
+    if m == 0 or n == 0:
+        return f"empty side ({m} vs {n} tokens)"
+    ratio = min(m, n) / max(m, n)
+    if ratio < min_length_ratio:
+        return f"length ratio {ratio:.2f} < {min_length_ratio} ({m} vs {n} tokens)"
+    rate = hit_rate(cost)
+    if rate < min_hit_rate:
+        return f"dictionary hit rate {rate:.2f} < {min_hit_rate}"
+    anchors = len(find_anchors(cost))
+    if anchors < min_anchor_rate * min(m, n):
+        return f"anchor count {anchors} < {min_anchor_rate} x {min(m, n)}"
+    return None
+
+
+def write_review_list(rejects: List[ScreeningReject], path: str) -> None:
+    """Ghi các cặp bị loại (trái, phải, lý do) ra file TSV để review; không có thì xoá file cũ."""
+    if not rejects:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('left\tright\treason\n')
+        for reject in rejects:
+            f.write(f"{reject.left}\t{reject.right}\t{reject.reason}\n")
@@ -0,0 +1,414 @@
+"""
+Các chế độ căn chỉnh dựa trên danh sách cặp khớp thưa của ``CostRows``.
+
+Với từ điển tương thích, phần lớn ô của bảng DP là không khớp; ở đây chỉ liệt kê
+các cặp (i, j) khớp, sắp theo vị trí, rồi dùng chúng thay cho toàn bộ bảng m×n.
+"""
+from bisect import bisect_left
+from heapq import heappop, heappush
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .dp import DEFAULT_BAND_WIDTH, LEFT, MATCH, UP, CostRows, kernel_ops
+
+# Nửa độ rộng cửa sổ quanh đường chéo tỉ lệ i*n/m để kiểm tra tính duy nhất của điểm neo
+DEFAULT_ANCHOR_WINDOW = 32
+
+
+def _positions(ids: np.ndarray) -> Dict[int, np.ndarray]:
+    """id -> các vị trí (tăng dần) mà id xuất hiện."""
+    order = np.argsort(ids, kind='stable')
+    uniq, starts = np.unique(ids[order], return_index=True)
+    bounds = np.append(starts, len(ids))
+    return {int(u): order[bounds[k]:bounds[k + 1]] for k, u in enumerate(uniq)}
+
+
+def match_positions(ids: np.ndarray, other_ids: np.ndarray, table: Optional[np.ndarray]) -> Dict[int, np.ndarray]:
+    """id bên này -> các vị trí (tăng dần) bên kia khớp với nó.
+
+    ``table`` có dạng [id bên này, id bên kia]; None nghĩa là khớp khi id bằng nhau.
+    """
+    other = _positions(other_ids)
+    empty = np.empty(0, dtype=np.int64)
+    result = {}
+    for a in np.unique(ids):
+        a = int(a)
+        if table is None:
+            result[a] = other.get(a, empty)
+            continue
+        hits = [other[int(b)] for b in np.nonzero(table[a])[0] if int(b) in other]
+        result[a] = np.sort(np.concatenate(hits)) if hits else empty
+    return result
+
+
+def _increasing_chain(values: List[int]) -> List[int]:
+    """Chỉ số của một dãy con tăng ngặt dài nhất (patience sorting, O(k log k))."""
+    tails, tail_idx = [], []
+    prev = [-1] * len(values)
+    for k, v in enumerate(values):
+        pos = bisect_left(tails, v)
+        if pos > 0:
+            prev[k] = tail_idx[pos - 1]
+        if pos == len(tails):
+            tails.append(v)
+            tail_idx.append(k)
+        else:
+            tails[pos] = v
+            tail_idx[pos] = k
+    chain = []
+    k = tail_idx[-1] if tail_idx else -1
+    while k >= 0:
+        chain.append(k)
+        k = prev[k]
+    chain.reverse()
+    return chain
+
+
+def find_anchors(cost: CostRows, window: int = DEFAULT_ANCHOR_WINDOW) -> List[Tuple[int, int]]:
+    """Các cặp (i, j) khớp duy nhất theo cả hai chiều trong cửa sổ cục bộ, giữ
+    chuỗi tăng dài nhất theo cả i lẫn j."""
+    m, n = cost.shape
+    if m == 0 or n == 0:
+        return []
+    table = cost.table
+    by_row = match_positions(cost.row_ids, cost.col_ids, table)
+    by_col = match_positions(cost.col_ids, cost.row_ids, None if table is None else table.T)
+
+    def unique_in_window(pos, center):
+        lo, hi = np.searchsorted(pos, [center - window, center + window + 1])
+        return int(pos[lo]) if hi - lo == 1 else None
+
+    cand_i, cand_j = [], []
+    for i in range(m):
+        j = unique_in_window(by_row[int(cost.row_ids[i])], i * n // m)
+        if j is None:
+            continue
+        # Cột j cũng chỉ khớp đúng dòng i quanh vị trí tương ứng
+        if unique_in_window(by_col[int(cost.col_ids[j])], j * m // n) != i:
+            continue
+        cand_i.append(i)
+        cand_j.append(j)
+    return [(cand_i[k], cand_j[k]) for k in _increasing_chain(cand_j)]
+
+
+def anchored_ops(cost: CostRows, window: int = DEFAULT_ANCHOR_WINDOW, linear_memory_cells: Optional[int] = None, band_width: int = DEFAULT_BAND_WIDTH) -> List[int]:
+    """Căn theo điểm neo: mỗi neo là một cặp khớp cố định, các khối nhỏ giữa
+    hai neo liên tiếp được căn bằng kernel 'auto'."""
+    ops = []
+    r0 = c0 = 0
+    m, n = cost.shape
+    for i, j in find_anchors(cost, window) + [(m, n)]:
+        block = CostRows(cost.row_ids[r0:i], cost.col_ids[c0:j], cost.table)
+        ops.extend(kernel_ops(block, 'auto', linear_memory_cells, band_width))
+        if i < m:
+            ops.append(MATCH)
+        r0, c0 = i + 1, j + 1
+    return ops
+
+
+def match_count(cost: CostRows) -> int:
+    """Số cặp (i, j) khớp, tính qua bảng id mà không liệt kê từng cặp."""
+    m, n = cost.shape
+    if m == 0 or n == 0:
+        return 0
+    if cost.table is None:
+        size = int(max(cost.row_ids.max(), cost.col_ids.max())) + 1
+        per_row = np.bincount(cost.col_ids, minlength=size)
+    else:
+        per_row = cost.table.astype(np.int64) @ np.bincount(cost.col_ids, minlength=cost.table.shape[1])
+    return int(per_row[cost.row_ids].sum())
+
+
+# Phần tử rỗng của Fenwick: (giá trị, chỉ số điểm)
+_NONE = (float('inf'), -1)
+
+
+class _PrefixMin:
+    """Fenwick tree cho min tiền tố, phần tử là (giá trị, chỉ số điểm)."""
+
+    def __init__(self, size: int):
+        self.tree = [_NONE] * (size + 1)
+
+    def update(self, pos: int, item) -> None:
+        pos += 1
+        tree = self.tree
+        while pos < len(tree):
+            if item < tree[pos]:
+                tree[pos] = item
+            pos += pos & -pos
+
+    def query(self, count: int):
+        """Min của ``count`` vị trí đầu."""
+        best = _NONE
+        tree = self.tree
+        while count > 0:
+            if tree[count] < best:
+                best = tree[count]
+            count -= count & -count
+        return best
+
+
+class _IntSet:
+    """Tập số nguyên trong [lo, hi] trên Fenwick đếm: thêm/xoá, phần tử liền trước/liền sau, O(log n)."""
+
+    def __init__(self, lo: int, hi: int):
+        self.lo = lo
+        self.size = hi - lo + 1
+        self.tree = [0] * (self.size + 1)
+        self.top = 1 << self.size.bit_length()
+        self.count = 0
+
+    def _add(self, x: int, delta: int) -> None:
+        self.count += delta
+        pos, size, tree = x - self.lo + 1, self.size, self.tree
+        while pos <= size:
+            tree[pos] += delta
+            pos += pos & -pos
+
+    def add(self, x: int) -> None:
+        self._add(x, 1)
+
+    def remove(self, x: int) -> None:
+        self._add(x, -1)
+
+    def _rank(self, x: int) -> int:
+        """Số phần tử <= x."""
+        pos = x - self.lo + 1
+        if pos > self.size:
+            return self.count
+        total, tree = 0, self.tree
+        while pos > 0:
+            total += tree[pos]
+            pos &= pos - 1
+        return total
+
+    def _select(self, k: int) -> int:
+        """Phần tử nhỏ thứ k (đếm từ 1)."""
+        pos, step, size, tree = 0, self.top, self.size, self.tree
+        while step:
+            nxt = pos + step
+            if nxt <= size and tree[nxt] < k:
+                pos = nxt
+                k -= tree[nxt]
+            step >>= 1
+        return pos + self.lo
+
+    def before(self, x: int) -> Optional[int]:
+        """Phần tử lớn nhất <= x."""
+        k = self._rank(x)
+        return self._select(k) if k else None
+
+    def after(self, x: int) -> Optional[int]:
+        """Phần tử nhỏ nhất >= x."""
+        k = self._rank(x - 1) + 1
+        return self._select(k) if k <= self.count else None
+
+
+# Chủ của khoảng chưa được điểm nào phủ
+_GAP = -1
+
+
+class _Envelope:
+    """Min theo khoá của các điểm q phủ đường chéo d ở dòng i, tức dq <= d <= i - qj - 1.
+
+    Mỗi điểm bắt đầu phủ đúng đường chéo của nó ở dòng sau dòng của nó rồi mỗi dòng
+    lan thêm một đường chéo sang phải, nên hàm min là dãy đoạn hằng có chủ: đầu đoạn
+    hoặc cố định (tại dq của chủ) hoặc trôi theo mép phải của đoạn bên trái (vị trí
+    ``neo + i``, neo = -qj). Đoạn có đầu trôi và đầu đoạn sau cố định co lại mỗi dòng
+    một ô; lúc nó biến mất được xếp trong heap. Mỗi điểm thêm/xoá O(1) đầu đoạn,
+    mỗi thao tác O(log n).
+    """
+
+    def __init__(self, m: int, n: int, keys: List[int]):
+        self.keys = keys
+        self.fixed = _IntSet(1 - n, m - 1)
+        self.moving = _IntSet(1 - n, 0)
+        self.fixed_owner: Dict[int, int] = {}
+        self.moving_owner: Dict[int, int] = {}
+        self.events: List[Tuple[int, int, int]] = []
+
+    def _key(self, owner: int) -> float:
+        return float('inf') if owner == _GAP else self.keys[owner]
+
+    def _start_before(self, x: int, t: int) -> Optional[Tuple[int, bool, int]]:
+        """Đầu đoạn (vị trí, trôi?, vị trí cố định hoặc neo) lớn nhất <= x ở dòng t."""
+        f = self.fixed.before(x)
+        a = self.moving.before(x - t)
+        if a is not None and (f is None or a + t > f):
+            return a + t, True, a
+        return None if f is None else (f, False, f)
+
+    def _start_after(self, x: int, t: int) -> Optional[Tuple[int, bool, int]]:
+        """Đầu đoạn nhỏ nhất >= x ở dòng t."""
+        f = self.fixed.after(x)
+        a = self.moving.after(x - t)
+        if a is not None and (f is None or a + t < f):
+            return a + t, True, a
+        return None if f is None else (f, False, f)
+
+    def _owner(self, start: Optional[Tuple[int, bool, int]]) -> int:
+        if start is None:
+            return _GAP
+        return self.moving_owner[start[2]] if start[1] else self.fixed_owner[start[2]]
+
+    def _set(self, start: Tuple[int, bool, int], owner: int) -> None:
+        if start[1]:
+            self.moving.add(start[2])
+            self.moving_owner[start[2]] = owner
+        else:
+            self.fixed.add(start[2])
+            self.fixed_owner[start[2]] = owner
+
+    def _unset(self, start: Tuple[int, bool, int]) -> None:
+        if start[1]:
+            self.moving.remove(start[2])
+            del self.moving_owner[start[2]]
+        else:
+            self.fixed.remove(start[2])
+            del self.fixed_owner[start[2]]
+
+    def _schedule(self, start: Optional[Tuple[int, bool, int]], t: int) -> None:
+        """Đoạn bắt đầu ở ``start`` (nếu trôi) biến mất khi chạm đầu đoạn cố định kế tiếp."""
+        if start is None or not start[1]:
+            return
+        anchor = start[2]
+        nxt = self._start_after(anchor + t + 1, t)
+        if nxt is not None and not nxt[1]:
+            heappush(self.events, (nxt[0] - anchor, anchor, self.moving_owner[anchor]))
+
+    def advance(self, t: int) -> None:
+        """Xử lý mọi đoạn biến mất đến hết dòng t."""
+        events = self.events
+        while events and events[0][0] <= t:
+            when, anchor, owner = heappop(events)
+            if self.moving_owner.get(anchor, None) != owner or anchor not in self.moving_owner:
+                continue
+            end = anchor + when
+            nxt = self._start_after(anchor + when, when - 1)
+            if nxt is None or nxt[1] or nxt[0] != end:
+                continue
+            self._unset((end, True, anchor))
+            right = self.fixed_owner[end]
+            left = self._owner(self._start_before(end - 1, when))
+            if left != _GAP and self._key(left) < self._key(right):
+                self._unset(nxt)
+                self._set((end, True, anchor), right)
+                self._schedule((end, True, anchor), when)
+            else:
+                self._schedule(self._start_before(end - 1, when), when)
+
+    def query(self, d: int, t: int) -> int:
+        """Chủ của đường chéo d ở dòng t (``_GAP`` nếu chưa điểm nào phủ)."""
+        return self._owner(self._start_before(d, t))
+
+    def insert(self, owner: int, d: int, t: int) -> None:
+        """Điểm ``owner`` trên đường chéo d bắt đầu phủ từ dòng t."""
+        key = self.keys[owner]
+        start = self._start_before(d, t)
+        current = self._owner(start)
+        if current != _GAP and self._key(current) <= key:
+            return  # bị ``current`` phủ trùm với khoá không lớn hơn mãi mãi
+        anchor = d - t + 1
+        nxt = self._start_after(d + 1, t)
+        if nxt is None or nxt[0] > d + 1:
+            # Phần còn lại của đoạn cũ bắt đầu sau mép phải của điểm mới
+            self._set((d + 1, True, anchor), current)
+            self._schedule((d + 1, True, anchor), t)
+        elif not nxt[1] and key < self._key(self.fixed_owner[nxt[2]]):
+            right = self.fixed_owner[nxt[2]]
+            self._unset(nxt)
+            self._set((d + 1, True, anchor), right)
+            self._schedule((d + 1, True, anchor), t)
+        if start is None or start[0] < d:
+            self._set((d, False, d), owner)
+        else:
+            self._unset(start)
+            left = self._owner(self._start_before(d - 1, t))
+            if left != _GAP and self._key(left) < key:
+                self._set((d, True, d - t), owner)
+                self._schedule((d, True, d - t), t)
+            else:
+                self._set((d, False, d), owner)
+        self._schedule(self._start_before(d - 1, t), t)
+
+
+def _fill_gap(ops: List[int], rows: int, cols: int) -> None:
+    """Khoảng không dùng cặp khớp nào: chi phí tối thiểu max(rows, cols)."""
+    ops.extend([UP] * (rows - cols) if rows > cols else [LEFT] * (cols - rows))
+    ops.extend([MATCH] * min(rows, cols))
+
+
+def sparse_ops(cost: CostRows) -> List[int]:
+    """Căn chỉnh tối ưu (cùng chi phí Levenshtein như DP đầy đủ) chỉ từ các cặp khớp.
+
+    Mọi cách căn là một chuỗi cặp khớp tăng theo cả i và j; giữa hai cặp liên tiếp
+    cách nhau a dòng, b cột thì chi phí nhỏ nhất là max(a, b). Với f(q) là chi phí tốt
+    nhất kết thúc tại cặp q và d = i - j:
+
+        f(p) = min(max(pi, pj),
+                   min_{qj < pj, dq <= dp} f(q) - qi + pi - 1,
+                   min_{qi < pi, dq >= dp} f(q) - qj + pj - 1)
+
+    Điều kiện còn lại (qi < pi, hay qj < pj) được suy ra từ hai điều kiện đã viết.
+    Quét các cặp khớp theo từng dòng (không liệt kê trước): vế thứ ba là một Fenwick
+    min tiền tố theo d. Vế thứ hai thì không: khi quét theo dòng, Fenwick theo d còn
+    thấy cả các điểm qj >= pj và cho chi phí thấp hơn thật; nó được giữ bằng
+    ``_Envelope``. Tổng cộng O((r + m + n) log n) với r là số cặp khớp.
+    Khi hoà điểm, vị trí khoảng trống có thể khác các kernel DP.
+    """
+    m, n = cost.shape
+    ops = []
+    if m == 0 or n == 0:
+        _fill_gap(ops, m, n)
+        return ops
+    by_row = match_positions(cost.row_ids, cost.col_ids, cost.table)
+    pi, pj, prev, below_keys = [], [], [], []
+    below = _Envelope(m, n, below_keys)
+    above = _PrefixMin(m + n - 1)  # chỉ số m - 1 - d: tiền tố = d lớn
+    best, last = max(m, n), -1
+
+    for i in range(m):
+        js = by_row[int(cost.row_ids[i])].tolist()
+        if not js:
+            continue
+        below.advance(i)
+        # Tính cả dòng rồi mới chèn, để mọi truy vấn chỉ thấy các dòng trên
+        row = []
+        for j in js:
+            d = i - j
+            value, arg = max(i, j), -1
+            q = below.query(d, i)
+            if q != _GAP and below_keys[q] + i - 1 < value:
+                value, arg = below_keys[q] + i - 1, q
+            key, q = above.query(m - d)
+            if q >= 0 and key + j - 1 < value:
+                value, arg = key + j - 1, q
+            row.append(value)
+            pi.append(i)
+            pj.append(j)
+            prev.append(arg)
+            below_keys.append(value - i)
+        below.advance(i + 1)
+        first = len(pi) - len(js)
+        for k, (j, value) in enumerate(zip(js, row)):
+            p = first + k
+            below.insert(p, i - j, i + 1)
+            above.update(m - 1 - i + j, (value - j, p))
+            total = value + max(m - i - 1, n - j - 1)
+            if total < best:
+                best, last = total, p
+
+    chain = []
+    while last >= 0:
+        chain.append(last)
+        last = prev[last]
+    chain.reverse()
+
+    r0 = c0 = 0
+    for p in chain:
+        _fill_gap(ops, pi[p] - r0, pj[p] - c0)
+        ops.append(MATCH)
+        r0, c0 = pi[p] + 1, pj[p] + 1
+    _fill_gap(ops, m - r0, n - c0)
+    return ops
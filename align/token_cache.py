@@ -0,0 +1,100 @@
+"""
+Sidecar token hoá cho các file TXT (Quốc Ngữ sau OCR, chữ Hán của align_han).
+
+Mỗi file TXT được làm sạch/tách token một lần; dãy token lưu thành một file JSON
+nhỏ, khoá theo sha1 nội dung file nguồn, loại token hoá và phiên bản bộ làm sạch
+(ví dụ sha1 danh sách âm tiết). Align lại một cuốn sách chỉ làm sạch các trang có
+nội dung thay đổi; ``vi_process.clean_directory`` điền sẵn sidecar song song.
+
+Thư mục sidecar có giới hạn dung lượng (TOKEN_CACHE_MAX_MB): ``prune`` xoá các
+sidecar lâu không dùng nhất, như cache của align (``align_cache``).
+"""
+import hashlib
+import json
+import os
+from typing import Callable, List, Optional
+
+from .align_cache import prune_directory
+
+# Tăng khi đổi định dạng entry để mọi sidecar cũ bị bỏ qua
+CACHE_FORMAT = 1
+
+# Dung lượng tối đa mặc định của thư mục sidecar (MB), 0 = không giới hạn
+DEFAULT_MAX_MB = 256
+
+
+def default_cache_dir(path: str) -> str:
+    """Thư mục sidecar: TOKEN_CACHE_DIR nếu có, ngược lại ``.token_cache`` cạnh thư mục
+    chứa ``path`` (không ghi lẫn vào thư mục TXT mà align đang liệt kê)."""
+    txt_dir = os.path.dirname(os.path.abspath(path))
+    return os.environ.get('TOKEN_CACHE_DIR') or os.path.join(os.path.dirname(txt_dir), '.token_cache')
+
+
+def _entry_path(cache_dir: str, key: str) -> str:
+    return os.path.join(cache_dir, key[:2], f'{key}.json')
+
+
+def _load(path: str) -> Optional[List[str]]:
+    try:
+        with open(path, encoding='utf-8') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if entry.get('format') != CACHE_FORMAT:
+        return None
+    try:
+        # Đánh dấu vừa dùng để prune giữ lại
+        os.utime(path)
+    except OSError:
+        pass
+    return entry['tokens']
+
+
+def _store(path: str, tokens: List[str]) -> None:
+    tmp = f'{path}.tmp-{os.getpid()}'
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'format': CACHE_FORMAT, 'tokens': tokens}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError:
+        # Sidecar chỉ để tăng tốc: không ghi được thì bỏ qua
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def cached_tokens(path: str, kind: str, tokenize: Callable[[str], List[str]],
+                  version: str = '', cache_dir: Optional[str] = None) -> List[str]:
+    """
+    Token của file TXT ``path``, lấy từ sidecar nếu nội dung chưa đổi
+
+    Args:
+        kind: Loại token hoá ('quoc_ngu', 'han', ...), tách riêng các sidecar
+        tokenize: Hàm nội dung file -> danh sách token, chỉ gọi khi chưa có sidecar
+        version: Phiên bản bộ làm sạch (đổi thì sidecar cũ bị bỏ qua)
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    source = hashlib.sha1(text.encode('utf-8')).hexdigest()
+    key = hashlib.sha1('|'.join([str(CACHE_FORMAT), kind, version, source]).encode('utf-8')).hexdigest()
+    entry = _entry_path(cache_dir or default_cache_dir(path), key)
+    tokens = _load(entry)
+    if tokens is None:
+        tokens = tokenize(text)
+        _store(entry, tokens)
+    return tokens
+
+
+def prune(cache_dir: str, max_bytes: Optional[int] = None) -> int:
+    """
+    Xoá các sidecar lâu không dùng nhất cho tới khi ``cache_dir`` không vượt quá
+    ``max_bytes`` (mặc định: TOKEN_CACHE_MAX_MB)
+
+    Returns:
+        Số sidecar đã xoá
+    """
+    if max_bytes is None:
+        max_bytes = int(float(os.environ.get('TOKEN_CACHE_MAX_MB') or DEFAULT_MAX_MB) * 1024 * 1024)
+    return prune_directory(cache_dir, max_bytes)
@@ -1,49 +1,61 @@
 import pandas as pd
 import torch
 import torch.nn as nn
+from .lexicon import Lexicon, get_lexicon
 
 class LoadModel:
-    def __init__(self):
-        with open("model/tokenization/syllable.txt", "r", encoding="utf-16") as f:
-            self.words = f.readlines()
-            self.words = [word.strip() for word in self.words]
+    def __init__(self, lexicon: Lexicon = None):
+        # Danh sách âm tiết dùng chung (align.lexicon), chỉ nạp ở lần dùng đầu tiên
+        self._lexicon = lexicon
+
+    @property
+    def lexicon(self) -> Lexicon:
+        if self._lexicon is None:
+            self._lexicon = get_lexicon()
+        return self._lexicon
+
+    @property
+    def words(self) -> list:
+        return self.lexicon.words
 
     #===================end init===============================#
     
     def is_syllable(self, word):
-        return word in self.words
+        return word in self.lexicon.syllables
 
     def find_syllabel(self, word: str) -> list:
-        lst_syllabel = []
-        for word_ in self.words:
-            if word.find(word_) != -1:
-                lst_syllabel.append(word_)
-        return lst_syllabel
+        """Các âm tiết là chuỗi con của word, theo thứ tự trong danh sách âm tiết."""
+        # Chuỗi rỗng luôn là chuỗi con (như word.find('') == 0)
+        found = {''}
+        found.update(word[end - length:end] for end, length in self.lexicon.automaton.matches(word))
+        return [word_ for word_ in self.words if word_ in found]
 
 
     # Chỉnh lại tên riêng cho đúng
     def correct_named_entities(self, word: str):
         """
         Chỉnh sửa các tên riêng trong văn bản.
+
+        Tách word từ trái sang phải: tại mỗi vị trí lấy âm tiết dài nhất bắt đầu ở đó
+        (chỉ tính lần xuất hiện đầu tiên của mỗi âm tiết trong word, như word.find),
+        không có thì giữ nguyên một ký tự. Các lần xuất hiện được tìm trong một lượt
+        bằng automaton Aho–Corasick của lexicon.
         """
         if self.is_syllable(word) == False:
-            lst_word = self.find_syllabel(word)
+            longest = [0] * len(word)
+            seen = set()
+            for end, length in self.lexicon.automaton.matches(word):
+                syllable = word[end - length:end]
+                if syllable not in seen:
+                    seen.add(syllable)
+                    longest[end - length] = max(longest[end - length], length)
+            tokens = []
             i = 0
-            token = ""
             while i < len(word):
-                lst_need = [ word_ for word_ in lst_word if word_.find(word[i]) == 0]
-                lst_need = [word_ for word_ in lst_need if word.find(word_) == i]
-                lst_need = sorted(lst_need ,key = lambda x: len(x))
-                lst_need.reverse()
-                if len(lst_need) == 0:
-                    token += word[i] +" "
-                    i += 1
-                elif len(lst_need) >= 1:
-                    token += lst_need[0] + " "
-                    i += len(lst_need[0])
-                else:
-                    raise "error!"
-            word = token.strip()
+                step = longest[i] or 1
+                tokens.append(word[i:i + step])
+                i += step
+            word = " ".join(tokens).strip()
         return word
                 
 
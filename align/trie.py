@@ -0,0 +1,34 @@
+"""
+Trie ký tự dùng chung (danh sách âm tiết, tên riêng, bảng sửa dấu của color).
+
+Trie là dict lồng nhau: ký tự -> nút con; khoá '' đánh dấu nút kết thúc một chuỗi.
+"""
+import re
+from typing import Iterable
+
+
+def build_trie(words: Iterable[str]) -> dict:
+    """Trie của các chuỗi trong ``words`` (chuỗi rỗng bị bỏ qua)."""
+    root: dict = {}
+    for word in words:
+        if not word:
+            continue
+        node = root
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = True
+    return root
+
+
+def trie_pattern(node: dict) -> str:
+    """Regex cho trie: nhánh con trước, kết thúc tại nút sau cùng (ưu tiên khoá dài nhất).
+
+    Mỗi nhánh chỉ được thử khi ký tự trước đã khớp, nên regex khớp một vị trí với chi
+    phí theo độ dài khoá thay vì theo số khoá.
+    """
+    branches = [re.escape(ch) + trie_pattern(child) for ch, child in sorted(node.items()) if ch]
+    if '' in node:
+        branches.append('')
+    if len(branches) == 1:
+        return branches[0]
+    return '(?:' + '|'.join(branches) + ')'
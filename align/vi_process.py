@@ -1,12 +1,21 @@
 import re
 import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from typing import List, Optional
 from dotenv import load_dotenv
+from .lexicon import get_lexicon
+from .named_entities import get_saint_rewriter
+from .token_cache import cached_tokens, default_cache_dir, prune
 load_dotenv('.env')
-# syllable_file_path = os.environ['SYLLABLE']
-syllable_file_path = os.environ['SYLLABLE']
+# Danh sách âm tiết (SYLLABLE) được nạp ở lần dùng đầu tiên, dùng chung qua align.lexicon
 
-with open(syllable_file_path, encoding='utf-16') as f:
-    morpho_syllable = f.read().splitlines() 
+# Tăng khi đổi clean_text/split_words để sidecar token cũ bị bỏ qua
+CLEAN_VERSION = 1
+
+def named_entities_enabled() -> bool:
+    """Mặc định có viết lại tên riêng (saint_name) khi làm sạch không: REWRITE_NAMED_ENTITIES=1."""
+    return bool(int(os.environ.get('REWRITE_NAMED_ENTITIES', 0)))
 
 def number_to_text(n: str):
     ones = ["", "một", "hai", "ba", "bốn", "năm", "sáu", "bảy", "tám", "chín"]
@@ -53,26 +62,45 @@ def number_to_text(n: str):
         return ' '.join(result).strip()
 
 # Regex to find numbers in the text
+@lru_cache(maxsize=1 << 16)
 def split_words(word):
+    """
+    Tách một token dính liền thành các âm tiết, mỗi âm tiết theo sau một dấu cách.
+    Trả về '' nếu không tách được.
+
+    Kết quả giống bản đệ quy cũ (thử tiền tố ngắn nhất trước, quay lui khi phần còn
+    lại không tách được) nhưng dùng DP trên trie âm tiết:
+    O(len × max_syllable_len) thay vì hàm mũ với token dài.
+    """
     if word == '':
         return ''
-    list_chars=list(word)
-    words = ''
-    for i in range(len(list_chars)):
-        if ''.join(list_chars[:i+1]) in morpho_syllable:
-            words = ''.join(list_chars[:i+1]) + ' '
-            new_list_chars = list_chars[i+1:]
-            words += split_words(''.join(new_list_chars))
-            if len(word)==len(''.join(words.strip().split())):
-                return words
-    if len(list_chars)> 0 and ''.join(list_chars) not in morpho_syllable:
+    lexicon = get_lexicon()
+    n = len(word)
+    # ends[i]: các vị trí kết thúc âm tiết bắt đầu tại i (đi theo trie)
+    ends = [lexicon.prefix_ends(word, start) for start in range(n)]
+    # ok[i]: word[i:] tách được hoàn toàn thành các âm tiết
+    ok = [False] * n + [True]
+    for start in range(n - 1, -1, -1):
+        ok[start] = any(ok[end] for end in ends[start])
+    if not ok[0]:
         return ''
+    words = ''
+    start = 0
+    while start < n:
+        # Tiền tố ngắn nhất mà phần còn lại vẫn tách được
+        end = next(end for end in ends[start] if ok[end])
+        words += word[start:end] + ' '
+        start = end
+    return words
 
-def clean_text(text):
+def clean_text(text, named_entities: bool = False):
     """ 
     Removing non-latin chars
     But keeping numbers and punctuations as default
+    named_entities: viết lại tên riêng theo saint_name.dict_saint trước khi làm sạch
     """
+    if named_entities:
+        text = get_saint_rewriter().rewrite(text)
     text = text.replace('\n', ' ')
     text = re.sub(r'-\s*\d+\s*-', '', text)  # Remove "- digits -"
     text = re.sub(r'\(\s*\d+\s*\)', '', text)  # Remove "( digits )"
@@ -89,8 +117,9 @@ def clean_text(text):
     text = re.sub(r'\d+', replace_number, text.lower())
     text = re.sub(r'\s+', ' ', text).strip()
     new_line = ''
+    syllables = get_lexicon().syllables
     for word in text.split():
-        if (word in morpho_syllable) or (word.isdigit()) or len(word)==1:
+        if (word in syllables) or (word.isdigit()) or len(word)==1:
             new_line += word + ' '
         else:
             candidate = split_words(word)
@@ -100,9 +129,44 @@ def clean_text(text):
                 new_line += word + ' '
     return re.sub(r'\s+', ' ', new_line).strip()
 
-def process_quoc_ngu(path):
-    with open(path, 'r', encoding='utf-8') as f:
-        text = f.read()
-        text_clearn = clean_text(text)
-        data = text_clearn.split()     
-    return data
\ No newline at end of file
+def _quoc_ngu_tokens(text: str, named_entities: bool = False) -> List[str]:
+    return clean_text(text, named_entities=named_entities).split()
+
+def process_quoc_ngu(path, cache_dir: Optional[str] = None, named_entities: Optional[bool] = None):
+    """Token Quốc Ngữ đã làm sạch của file TXT; chỉ chạy clean_text khi sidecar
+    (xem align.token_cache) chưa có bản cho nội dung hiện tại của file.
+    named_entities: viết lại tên riêng, mặc định theo named_entities_enabled()."""
+    if named_entities is None:
+        named_entities = named_entities_enabled()
+    version = f'{CLEAN_VERSION}-{get_lexicon().digest}'
+    kind = 'quoc_ngu+names' if named_entities else 'quoc_ngu'
+    return cached_tokens(path, kind, partial(_quoc_ngu_tokens, named_entities=named_entities), version=version, cache_dir=cache_dir)
+
+def clean_directory(txt_dir: str, workers: Optional[int] = None, cache_dir: Optional[str] = None,
+                    named_entities: Optional[bool] = None) -> int:
+    """
+    Làm sạch song song mọi file .txt trong thư mục (vd. Quoc_Ngu_ocr) và ghi sidecar token
+
+    File đã có sidecar cho đúng nội dung hiện tại chỉ bị đọc và hash, không làm sạch lại.
+    Xong thì prune thư mục sidecar (xem ``token_cache.prune``).
+
+    Args:
+        workers: Số tiến trình (mặc định: số CPU); 1 để chạy tuần tự
+
+    Returns:
+        Số file đã xử lý
+    """
+    paths = sorted(os.path.join(txt_dir, f) for f in os.listdir(txt_dir) if f.endswith('.txt'))
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    task = partial(process_quoc_ngu, cache_dir=cache_dir, named_entities=named_entities)
+    if workers <= 1:
+        for path in paths:
+            task(path)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for _ in executor.map(task, paths, chunksize=max(1, len(paths) // (workers * 4))):
+                pass
+    if paths:
+        # Giữ thư mục sidecar trong giới hạn TOKEN_CACHE_MAX_MB
+        prune(cache_dir or default_cache_dir(paths[0]))
+    return len(paths)
\ No newline at end of file
@@ -1,11 +1,22 @@
 ﻿import os
 import ast
 from typing import List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import numpy as np
 import pandas as pd
 from difflib import SequenceMatcher
 from tqdm import tqdm
 from align.nom_process import process_nom
+from align.dp import CostRows, SegmentCursor, align_tokens
+from align.checkpoint import AlignmentCheckpoint, progress_path
+from align.dictionary import file_digest
+from align.directory_index import get_directory_index, invalidate_directory_indexes
+from align.screening import REVIEW_FILE_NAME, ScreeningReject, screen_pair, write_review_list
+from align.token_cache import cached_tokens, default_cache_dir, prune as prune_token_cache
+
+# Bump when _split_txt_tokens changes so stale token sidecars are ignored
+SPLIT_VERSION = 1
 
 
 def _extract_name_and_last_number(filename: str) -> Tuple[str, int]:
@@ -22,9 +33,8 @@ def _extract_name_and_last_number(filename: str) -> Tuple[str, int]:
     return (first_name, last_num)
 
 
-def _read_txt_tokens(txt_path: str) -> List[str]:
-    with open(txt_path, 'r', encoding='utf-8') as f:
-        content = f.read().strip().replace('。', '').replace('，', '').replace('\n', '')
+def _split_txt_tokens(content: str) -> List[str]:
+    content = content.strip().replace('。', '').replace('，', '').replace('\n', '')
     if not content:
         return []
     if ' ' in content:
@@ -32,47 +42,13 @@ def _read_txt_tokens(txt_path: str) -> List[str]:
     return list(content)
 
 
-def _levenshtein_align_tokens(left: List[str], right: List[str]) -> Tuple[List[str], List[str]]:
-    m, n = len(left), len(right)
-    dp = np.zeros((m + 1, n + 1), dtype=int)
-    back = np.full((m + 1, n + 1), '', dtype=object)
-    for i in range(m + 1):
-        dp[i][0] = i
-        back[i][0] = 'U'
-    for j in range(n + 1):
-        dp[0][j] = j
-        back[0][j] = 'L'
-    back[0][0] = ''
-    for i in range(1, m + 1):
-        li = left[i - 1]
-        for j in range(1, n + 1):
-            rj = right[j - 1]
-            cost = 0 if li == rj else 1
-            options = [
-                (dp[i - 1][j] + 1, 'U'),
-                (dp[i][j - 1] + 1, 'L'),
-                (dp[i - 1][j - 1] + cost, 'D'),
-            ]
-            dp[i][j], back[i][j] = min(options)
-    aligned_left, aligned_right = [], []
-    i, j = m, n
-    while i > 0 or j > 0:
-        if i > 0 and j > 0 and back[i][j] == 'D':
-            aligned_left.append(left[i - 1])
-            aligned_right.append(right[j - 1])
-            i -= 1
-            j -= 1
-        elif i > 0 and back[i][j] == 'U':
-            aligned_left.append(left[i - 1])
-            aligned_right.append('*')
-            i -= 1
-        elif j > 0 and back[i][j] == 'L':
-            aligned_left.append('*')
-            aligned_right.append(right[j - 1])
-            j -= 1
-    aligned_left.reverse()
-    aligned_right.reverse()
-    return aligned_left, aligned_right
+def _read_txt_tokens(txt_path: str) -> List[str]:
+    # Tokens are kept in a sidecar keyed by the file's content hash (align.token_cache)
+    return cached_tokens(txt_path, 'han', _split_txt_tokens, version=str(SPLIT_VERSION))
+
+
+def _levenshtein_align_tokens(left: List[str], right: List[str], kernel: str = 'auto', linear_memory_cells: int = None) -> Tuple[List[str], List[str]]:
+    return align_tokens(left, right, CostRows.equality(left, right), kernel=kernel, linear_memory_cells=linear_memory_cells)
 
 
 def _count_units_per_bbox(text_items: List[str]) -> List[int]:
@@ -132,18 +108,248 @@ def _calculate_similarity(str1: str, str2: str) -> float:
     return (match_count / len(filtered1)) * 100
 
 
-def _write_skip_report(skip_messages, skip_report_path):
+def _write_skip_report(skip_messages, skip_report_path, log=print):
     if not skip_messages:
-        print('No skipped files')
+        log('No skipped files')
         return
     with open(skip_report_path, 'w', encoding='utf-8') as f:
         f.write('=== BAO CAO FILE BO QUA - ALIGN HAN ===\n\n')
         for msg in skip_messages:
             f.write(f"{msg}\n")
-    print(f"Skip report: {skip_report_path} ({len(skip_messages)} warnings)")
+    log(f"Skip report: {skip_report_path} ({len(skip_messages)} warnings)")
+
+
+def _find_file_flexible(dir_path, target_filename):
+    """
+    Tìm file flexible - support case insensitive và mismatch extension
+    (tra trong DirectoryIndex dùng chung, mỗi thư mục chỉ liệt kê một lần)
+    
+    Args:
+        dir_path: Thư mục cần tìm
+        target_filename: Tên file cần tìm
+    
+    Returns:
+        Full path nếu tìm thấy, None nếu không
+    """
+    return get_directory_index(dir_path).find(target_filename)
+
+def _distribute(cursor: SegmentCursor, aligned_left: List[str], aligned_right: List[str], number_units: List[int]):
+    """Split aligned tokens into per-bbox segments from the cursor position; returns (segments, shortfalls)."""
+    segments = []
+    shortfalls = []
+    for num in number_units:
+        if num == 0:
+            segments.append(([], []))
+            continue
+        
+        # Check if we have enough tokens left
+        if cursor.exhausted:
+            # No more tokens - append empty segment
+            segments.append(([], []))
+            continue
+        
+        start, stop, count = cursor.take(num)
+        
+        # Remember if we couldn't get enough tokens
+        if count < num:
+            shortfalls.append((num, count))
+        
+        segments.append((aligned_left[start:stop], aligned_right[start:stop]))
+    return segments, shortfalls
+
+
+def _build_rows(file_name: str, out_name: str, nom_data: dict, segments, messages: List[str]) -> List[dict]:
+    rows = []
+    file_base = os.path.splitext(file_name)[0]
+    for bbox_idx, (bbox, text_orig, (lseg, rseg)) in enumerate(zip(nom_data['bbox'], nom_data['text'], segments)):
+        # Get original text from bbox
+        orig_chars = set(text_orig) if text_orig else set()
+        
+        # Validate lseg only contains original chars + '*'
+        lseg_chars = set([c for c in lseg if c != '*'])
+        if lseg_chars - orig_chars:
+            # lseg contains chars not in original bbox - this is wrong!
+            extra_chars = lseg_chars - orig_chars
+            messages.append(f"Error {file_name} bbox {bbox_idx}: OCR segment contains foreign chars {extra_chars}. Original: '{text_orig}', Got: {lseg}")
+            continue
+        
+        if len(lseg) != len(rseg):
+            lseg, rseg = _pad_segments(lseg, rseg)
+        left_str = ' '.join(lseg).strip()
+        right_str = ' '.join(rseg).strip()
+        if not left_str and not right_str:
+            continue
+        similarity = _calculate_similarity(left_str, right_str)
+        rows.append({
+            'ID': f"{file_base}_{bbox_idx}",
+            'File Name': out_name,
+            'bbox': str(bbox),
+            'OCR': left_str,
+            'SinomChar': right_str,
+            'rate': round(similarity, 2),
+        })
+    return rows
+
+
+def _screen(left: List[str], right: List[str], left_name: str, right_name: str, label: str):
+    """Pre-DP screening; returns a ScreeningReject (also a skip message) or None."""
+    reason = screen_pair(CostRows.equality(left, right))
+    if reason is None:
+        return None
+    return ScreeningReject(left_name, right_name, reason, f"Skip {label}: failed pre-DP screening ({reason})")
+
 
+def _align_mapping_row(lst_left, lst_right, left_dir: str, right_dir: str, kernel: str = 'auto', linear_memory_cells: int = None, screening: bool = False):
+    """Align one mapping row (k=2). Returns (rows, messages).
 
-def align_han(left_dir: str, right_dir: str, output_excel: str, k: int = 1, name_book: str = 'book', reverse: bool = False, mapping_path: str = None):
+    Messages are strings for the skip report, or (text, False) for console-only lines.
+    """
+    messages = []
+    results = []
+    preprocess_left = []
+    right_tokens = []
+    files_left = ast.literal_eval(lst_left)
+    files_right = ast.literal_eval(lst_right)
+    
+    # Sử dụng flexible file finding
+    actual_left_files = []
+    actual_right_files = []
+    missing_left_list = []
+    missing_right_list = []
+    
+    for f in files_left:
+        actual_file = _find_file_flexible(left_dir, f)
+        if actual_file:
+            actual_left_files.append(actual_file)
+        else:
+            missing_left_list.append(f)
+    
+    for f in files_right:
+        actual_file = _find_file_flexible(right_dir, f)
+        if actual_file:
+            actual_right_files.append(actual_file)
+        else:
+            missing_right_list.append(f)
+    
+    if missing_left_list or missing_right_list:
+        msg = f"Skip mapping: missing files"
+        if missing_left_list:
+            msg += f" - Left: {missing_left_list}"
+        if missing_right_list:
+            msg += f" - Right: {missing_right_list}"
+        messages.append(msg)
+        # Console-only detail, not part of the skip report
+        messages.append((f"   Found: Left={len(actual_left_files)}, Right={len(actual_right_files)}", False))
+        return results, messages
+    
+    for lf in actual_left_files:
+        if lf.lower().endswith('.json'):
+            nom_data = process_nom(lf, 1)
+            number_units = _count_units_per_bbox(nom_data['text']) if nom_data.get('text') else []
+            file_name = os.path.basename(lf)
+            preprocess_left.append({'file_name': file_name, 'data': nom_data, 'number_units': number_units})
+        else:
+            file_name = os.path.basename(lf)
+            messages.append(f"Skip {file_name}: left must be JSON to include bbox")
+    
+    for rf in actual_right_files:
+        right_tokens.extend(_read_txt_tokens(rf))
+    flat_left_all = []
+    for page in preprocess_left:
+        flat_left_all.extend(_flatten_units(page['data'].get('text', [])))
+    if screening:
+        left_names = ', '.join(page['file_name'] for page in preprocess_left)
+        right_names = ', '.join(os.path.basename(rf) for rf in actual_right_files)
+        reject = _screen(flat_left_all, right_tokens, left_names, right_names, f"mapping [{left_names}]")
+        if reject:
+            messages.append(reject)
+            return results, messages
+    aligned_left, aligned_right = _levenshtein_align_tokens(flat_left_all, right_tokens, kernel=kernel, linear_memory_cells=linear_memory_cells)
+    cursor = SegmentCursor(aligned_left)
+    for page in preprocess_left:
+        segments, shortfalls = _distribute(cursor, aligned_left, aligned_right, page['number_units'])
+        for num, count in shortfalls:
+            messages.append(f"Warning {page['file_name']}: Not enough tokens for bbox (need {num}, got {count})")
+        
+        # Don't reset the cursor here - let it continue to next page
+        nom_data = page['data']
+        if len(nom_data['bbox']) != len(segments):
+            messages.append(f"ERROR {page['file_name']}: bbox count ({len(nom_data['bbox'])}) != segments ({len(segments)}) - this should not happen!")
+            # Pad segments if needed
+            while len(segments) < len(nom_data['bbox']):
+                segments.append(([], []))
+            messages.append(f"  → Padded {len(nom_data['bbox']) - len(segments)} empty segments")
+        results.extend(_build_rows(page['file_name'], page['file_name'], nom_data, segments, messages))
+    
+    # After all pages processed, check for remaining tokens
+    left_remain, right_remain = aligned_left[cursor.pos:], aligned_right[cursor.pos:]
+    if left_remain or right_remain:
+        left_excess = ' '.join([t for t in left_remain if t != '*'])
+        right_excess = ' '.join([t for t in right_remain if t != '*'])
+        if left_excess or right_excess:
+            messages.append(f"Warning after all pages: Excess tokens - Left: '{left_excess}', Right: '{right_excess}'")
+    return results, messages
+
+
+def _align_page(lf: str, rf: str, left_dir: str, right_dir: str, kernel: str = 'auto', linear_memory_cells: int = None, screening: bool = False):
+    """Align one left JSON page with one right TXT page (k=1). Returns (rows, skip messages)."""
+    messages = []
+    left_path = os.path.join(left_dir, lf)
+    right_path = os.path.join(right_dir, rf)
+    try:
+        if not lf.lower().endswith('.json'):
+            messages.append(f"Skip {lf}: left must be JSON to include bbox")
+            return [], messages
+        nom_data = process_nom(left_path, 1)
+        if not nom_data.get('text') or not nom_data.get('bbox'):
+            messages.append(f"Skip {lf}: missing text or bbox")
+            return [], messages
+        right_tokens = _read_txt_tokens(right_path)
+        if not right_tokens:
+            messages.append(f"Skip {lf}: right tokens empty")
+            return [], messages
+    except Exception as e:
+        import traceback
+        messages.append(f"Error reading {lf} or {rf}: {e}\n   Traceback: {traceback.format_exc()}")
+        return [], messages
+    number_units = _count_units_per_bbox(nom_data['text'])
+    flat_left = _flatten_units(nom_data['text'])
+    if screening:
+        reject = _screen(flat_left, right_tokens, lf, rf, lf)
+        if reject:
+            messages.append(reject)
+            return [], messages
+    aligned_left, aligned_right = _levenshtein_align_tokens(flat_left, right_tokens, kernel=kernel, linear_memory_cells=linear_memory_cells)
+    cursor = SegmentCursor(aligned_left)
+    segments, _ = _distribute(cursor, aligned_left, aligned_right, number_units)
+    left_remain, right_remain = aligned_left[cursor.pos:], aligned_right[cursor.pos:]
+    if left_remain or right_remain:
+        # Don't append remainder to last bbox - log warning instead
+        left_excess = ' '.join([t for t in left_remain if t != '*'])
+        right_excess = ' '.join([t for t in right_remain if t != '*'])
+        if left_excess or right_excess:
+            messages.append(f"Warning {lf}: Excess tokens after distribution - Left: '{left_excess}', Right: '{right_excess}'")
+    if len(nom_data['bbox']) != len(segments):
+        messages.append(f"Skip {lf}: bbox count ({len(nom_data['bbox'])}) != segments ({len(segments)})")
+        return [], messages
+    return _build_rows(lf, lf.replace('.json', '.jpg'), nom_data, segments, messages), messages
+
+
+def _call_unit(fn, options, unit):
+    return fn(*unit, **options)
+
+
+def _map_units(fn, units, workers: int, options: dict):
+    """Run ``fn`` over independent units, yielding results in the original order."""
+    if workers <= 1:
+        for unit in units:
+            yield fn(*unit, **options)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(partial(_call_unit, fn, options), units)
+
+
+def align_han(left_dir: str, right_dir: str, output_excel: str, k: int = 1, name_book: str = 'book', reverse: bool = False, mapping_path: str = None, kernel: str = 'auto', linear_memory_cells: int = None, workers: int = 1, screening: bool = False, checkpoint: bool = False, resume: bool = False, log=print):
     """
     Align pure Hán Nôm text (not OCR) with Vietnamese translation
     
@@ -155,6 +361,25 @@ def align_han(left_dir: str, right_dir: str, output_excel: str, k: int = 1, name
         name_book: Book name for output
         reverse: Reverse order
         mapping_path: Path to mapping Excel file (required for k=2)
+        kernel: Alignment DP kernel ('auto', 'numpy', 'banded', 'hirschberg' or the reference 'python'),
+            or 'anchored' to split long inputs at unique matches (faster, not guaranteed optimal),
+            or 'sparse' to solve from the matching pairs only (optimal cost),
+            or 'diff' for the O((m+n)D) engine. Tokens are compared by equality, so 'auto'
+            tries 'diff' first (identical output) and falls back to the DP kernels when
+            the texts differ too much
+        linear_memory_cells: m*n above which 'auto' switches to linear-memory Hirschberg
+            (default: ALIGN_LINEAR_MEMORY_CELLS env var)
+        workers: Number of processes; pages (k=1) or mapping rows (k=2) are
+            aligned in parallel and collected in the original order
+        screening: Cheap pre-DP check (length ratio, sampled hit rate, anchor count);
+            failing pairs are skipped, reported in the skip report and listed in
+            align_han_screening_review.tsv next to the output
+        checkpoint: Keep finished pages / mapping rows in ``<output_excel>.progress``
+            (rows and skip messages per unit) so an interrupted run can be resumed;
+            the file is removed once the output is written
+        resume: Continue an interrupted run (implies checkpoint): finished units are not
+            aligned again; without a checkpoint for the same settings, start over
+        log: Called with each progress / warning message (default: ``print``)
     """
     output_dir = os.path.dirname(output_excel) or '.'
     skip_report_path = os.path.join(output_dir, 'align_han_skip_report.txt')
@@ -166,49 +391,10 @@ def align_han(left_dir: str, right_dir: str, output_excel: str, k: int = 1, name
     
     results = []
     skip_messages = []
+    rejects = []
     left_files = sorted(os.listdir(left_dir), key=_extract_name_and_last_number)
     right_files = sorted([f for f in os.listdir(right_dir) if f.endswith('.txt')], key=_extract_name_and_last_number)
-    
-    # Helper function để flexible kiểm tra file tồn tại
-    def find_file_flexible(dir_path, target_filename):
-        """
-        Tìm file flexible - support case insensitive và mismatch extension
-        
-        Args:
-            dir_path: Thư mục cần tìm
-            target_filename: Tên file cần tìm
-        
-        Returns:
-            Full path nếu tìm thấy, None nếu không
-        """
-        if not os.path.isdir(dir_path):
-            return None
-        
-        # Thử kiểm tra trực tiếp trước
-        full_path = os.path.join(dir_path, target_filename)
-        if os.path.exists(full_path):
-            return full_path
-        
-        # Lấy base name (không có extension)
-        target_base = os.path.splitext(target_filename)[0]
-        target_ext = os.path.splitext(target_filename)[1].lower()
-        
-        # Tìm file với base name giống nhau (ignore case, ignore extension)
-        for item in os.listdir(dir_path):
-            item_path = os.path.join(dir_path, item)
-            if not os.path.isfile(item_path):
-                continue
-            
-            item_base = os.path.splitext(item)[0]
-            item_ext = os.path.splitext(item)[1].lower()
-            
-            # Match nếu base name giống (không case sensitive)
-            if item_base.lower() == target_base.lower():
-                # Nếu có extension, flexible match
-                if item_ext in ['.json', '.txt', '.jpg', '.png']:
-                    return item_path
-        
-        return None
+    options = {'kernel': kernel, 'linear_memory_cells': linear_memory_cells, 'screening': screening}
     
     if k == 2:
         if not mapping_path:
@@ -219,254 +405,72 @@ def align_han(left_dir: str, right_dir: str, output_excel: str, k: int = 1, name
         df = pd.read_excel(mapping_path)
         # df = df.iloc[57:].reset_index(drop=True)
         
-        for lst_left, lst_right in tqdm(zip(df['hannom'].to_list(), df['quocngu'].to_list()), desc='Preprocessing with mapping'):
-            preprocess_left = []
-            right_tokens = []
-            files_left = ast.literal_eval(lst_left)
-            files_right = ast.literal_eval(lst_right)
-            
-            # Sử dụng flexible file finding
-            actual_left_files = []
-            actual_right_files = []
-            missing_left_list = []
-            missing_right_list = []
-            
-            for f in files_left:
-                actual_file = find_file_flexible(left_dir, f)
-                if actual_file:
-                    actual_left_files.append(actual_file)
-                else:
-                    missing_left_list.append(f)
-            
-            for f in files_right:
-                actual_file = find_file_flexible(right_dir, f)
-                if actual_file:
-                    actual_right_files.append(actual_file)
-                else:
-                    missing_right_list.append(f)
-            
-            if missing_left_list or missing_right_list:
-                msg = f"Skip mapping: missing files"
-                if missing_left_list:
-                    msg += f" - Left: {missing_left_list}"
-                if missing_right_list:
-                    msg += f" - Right: {missing_right_list}"
-                print(msg)
-                skip_messages.append(msg)
-                print(f"   Found: Left={len(actual_left_files)}, Right={len(actual_right_files)}")
-                continue
-            
-            for lf in actual_left_files:
-                if lf.lower().endswith('.json'):
-                    nom_data = process_nom(lf, 1)
-                    number_units = _count_units_per_bbox(nom_data['text']) if nom_data.get('text') else []
-                    file_name = os.path.basename(lf)
-                    preprocess_left.append({'file_name': file_name, 'data': nom_data, 'number_units': number_units})
-                else:
-                    file_name = os.path.basename(lf)
-                    msg = f"Skip {file_name}: left must be JSON to include bbox"
-                    print(msg)
-                    skip_messages.append(msg)
-            
-            for rf in actual_right_files:
-                right_tokens.extend(_read_txt_tokens(rf))
-            flat_left_all = []
-            for page in preprocess_left:
-                flat_left_all.extend(_flatten_units(page['data'].get('text', [])))
-            aligned_left, aligned_right = _levenshtein_align_tokens(flat_left_all, right_tokens)
-            left_remain, right_remain = aligned_left.copy(), aligned_right.copy()
-            for page in preprocess_left:
-                segments = []
-                for num in page['number_units']:
-                    if num == 0:
-                        segments.append(([], []))
-                        continue
-                    
-                    # Check if we have enough tokens left
-                    if not left_remain:
-                        # No more tokens - append empty segment
-                        segments.append(([], []))
-                        continue
-                    
-                    count = 0
-                    i = 0
-                    while i < len(left_remain):
-                        if left_remain[i] != '*':
-                            count += 1
-                        i += 1
-                        if count == num:
-                            break
-                    
-                    # Warning if we couldn't get enough tokens
-                    if count < num and i >= len(left_remain):
-                        msg = f"Warning {page['file_name']}: Not enough tokens for bbox (need {num}, got {count})"
-                        print(msg)
-                        skip_messages.append(msg)
-                    
-                    lseg = left_remain[:i]
-                    rseg = right_remain[:i]
-                    segments.append((lseg, rseg))
-                    left_remain = left_remain[i:]
-                    right_remain = right_remain[i:]
-                
-                # Don't reset left_remain/right_remain here - let it continue to next page
-                nom_data = page['data']
-                if len(nom_data['bbox']) != len(segments):
-                    msg = f"ERROR {page['file_name']}: bbox count ({len(nom_data['bbox'])}) != segments ({len(segments)}) - this should not happen!"
-                    print(msg)
-                    skip_messages.append(msg)
-                    # Pad segments if needed
-                    while len(segments) < len(nom_data['bbox']):
-                        segments.append(([], []))
-                    msg = f"  → Padded {len(nom_data['bbox']) - len(segments)} empty segments"
-                    print(msg)
-                    skip_messages.append(msg)
-                for bbox_idx, (bbox, text_orig, (lseg, rseg)) in enumerate(zip(nom_data['bbox'], nom_data['text'], segments)):
-                    # Get original text from bbox
-                    orig_chars = set(text_orig) if text_orig else set()
-                    
-                    # Validate lseg only contains original chars + '*'
-                    lseg_chars = set([c for c in lseg if c != '*'])
-                    if lseg_chars - orig_chars:
-                        # lseg contains chars not in original bbox - this is wrong!
-                        extra_chars = lseg_chars - orig_chars
-                        msg = f"Error {page['file_name']} bbox {bbox_idx}: OCR segment contains foreign chars {extra_chars}. Original: '{text_orig}', Got: {lseg}"
-                        print(msg)
-                        skip_messages.append(msg)
-                        continue
-                    
-                    if len(lseg) != len(rseg):
-                        lseg, rseg = _pad_segments(lseg, rseg)
-                    left_str = ' '.join(lseg).strip()
-                    right_str = ' '.join(rseg).strip()
-                    if not left_str and not right_str:
-                        continue
-                    similarity = _calculate_similarity(left_str, right_str)
-                    file_base = os.path.splitext(page['file_name'])[0]
-                    results.append({
-                        'ID': f"{file_base}_{bbox_idx}",
-                        'File Name': page['file_name'],
-                        'bbox': str(bbox),
-                        'OCR': left_str,
-                        'SinomChar': right_str,
-                        'rate': round(similarity, 2),
-                    })
-            
-            # After all pages processed, check for remaining tokens
-            if left_remain or right_remain:
-                left_excess = ' '.join([t for t in left_remain if t != '*'])
-                right_excess = ' '.join([t for t in right_remain if t != '*'])
-                if left_excess or right_excess:
-                    msg = f"Warning after all pages: Excess tokens - Left: '{left_excess}', Right: '{right_excess}'"
-                    print(msg)
-                    skip_messages.append(msg)
+        # Re-list directories for this run (the align service may run many jobs)
+        invalidate_directory_indexes()
+        units = [(lst_left, lst_right, left_dir, right_dir) for lst_left, lst_right in zip(df['hannom'].to_list(), df['quocngu'].to_list())]
+        fn, desc, unit_name = _align_mapping_row, 'Preprocessing with mapping', 'it'
     else:
         if not reverse:
             right_files = list(reversed(right_files))
-        for idx, lf in enumerate(tqdm(left_files, desc='Processing files', unit='file')):
-            if idx >= len(right_files):
-                msg = f"Warning: more left files than right, skip {lf}"
-                print(msg)
-                skip_messages.append(msg)
-                break
-            rf = right_files[idx]
-            left_path = os.path.join(left_dir, lf)
-            right_path = os.path.join(right_dir, rf)
-            try:
-                if not lf.lower().endswith('.json'):
-                    msg = f"Skip {lf}: left must be JSON to include bbox"
-                    print(msg)
-                    skip_messages.append(msg)
-                    continue
-                nom_data = process_nom(left_path, 1)
-                if not nom_data.get('text') or not nom_data.get('bbox'):
-                    msg = f"Skip {lf}: missing text or bbox"
-                    print(msg)
-                    skip_messages.append(msg)
-                    continue
-                right_tokens = _read_txt_tokens(right_path)
-                if not right_tokens:
-                    msg = f"Skip {lf}: right tokens empty"
-                    print(msg)
-                    skip_messages.append(msg)
-                    continue
-            except Exception as e:
-                import traceback
-                msg = f"Error reading {lf} or {rf}: {e}\n   Traceback: {traceback.format_exc()}"
-                print(msg)
-                skip_messages.append(msg)
-                continue
-            number_units = _count_units_per_bbox(nom_data['text'])
-            flat_left = _flatten_units(nom_data['text'])
-            aligned_left, aligned_right = _levenshtein_align_tokens(flat_left, right_tokens)
-            left_remain, right_remain = aligned_left.copy(), aligned_right.copy()
-            segments = []
-            for num in number_units:
-                if num == 0:
-                    segments.append(([], []))
-                    continue
-                count = 0
-                i = 0
-                while i < len(left_remain):
-                    if left_remain[i] != '*':
-                        count += 1
-                    i += 1
-                    if count == num:
-                        break
-                lseg = left_remain[:i]
-                rseg = right_remain[:i]
-                segments.append((lseg, rseg))
-                left_remain = left_remain[i:]
-                right_remain = right_remain[i:]
-            if left_remain or right_remain:
-                # Don't append remainder to last bbox - log warning instead
-                left_excess = ' '.join([t for t in left_remain if t != '*'])
-                right_excess = ' '.join([t for t in right_remain if t != '*'])
-                if left_excess or right_excess:
-                    msg = f"Warning {lf}: Excess tokens after distribution - Left: '{left_excess}', Right: '{right_excess}'"
-                    print(msg)
-                    skip_messages.append(msg)
-            if len(nom_data['bbox']) != len(segments):
-                msg = f"Skip {lf}: bbox count ({len(nom_data['bbox'])}) != segments ({len(segments)})"
-                print(msg)
-                skip_messages.append(msg)
-                continue
-            file_base = os.path.splitext(lf)[0]
-            for bbox_idx, (bbox, text_orig, (lseg, rseg)) in enumerate(zip(nom_data['bbox'], nom_data['text'], segments)):
-                # Get original text from bbox
-                orig_chars = set(text_orig) if text_orig else set()
-                
-                # Validate lseg only contains original chars + '*'
-                lseg_chars = set([c for c in lseg if c != '*'])
-                if lseg_chars - orig_chars:
-                    # lseg contains chars not in original bbox - this is wrong!
-                    extra_chars = lseg_chars - orig_chars
-                    msg = f"Error {lf} bbox {bbox_idx}: OCR segment contains foreign chars {extra_chars}. Original: '{text_orig}', Got: {lseg}"
-                    print(msg)
-                    skip_messages.append(msg)
-                    continue
-                
-                if len(lseg) != len(rseg):
-                    lseg, rseg = _pad_segments(lseg, rseg)
-                left_str = ' '.join(lseg).strip()
-                right_str = ' '.join(rseg).strip()
-                if not left_str and not right_str:
+        units = [(lf, rf, left_dir, right_dir) for lf, rf in zip(left_files, right_files)]
+        fn, desc, unit_name = _align_page, 'Processing files', 'file'
+    
+    checkpointing = checkpoint or resume
+    config = {
+        'left_dir': os.path.abspath(left_dir),
+        'right_dir': os.path.abspath(right_dir),
+        'k': k,
+        'reverse': reverse,
+        'mapping': file_digest(mapping_path) if k == 2 else None,
+        'kernel': kernel,
+        'screening': screening,
+    }
+    progress = AlignmentCheckpoint(progress_path(output_excel) if checkpointing else None, config)
+    done = progress.start(resume, log=log)
+    if done:
+        log(f"Resuming from checkpoint: {len(done)} units already done ({progress.path})")
+    todo = [index for index in range(len(units)) if index not in done]
+    outputs = tqdm(_map_units(fn, [units[index] for index in todo], workers, options), total=len(units),
+                   initial=len(units) - len(todo), desc=desc, unit=unit_name)
+    
+    # Single collector: each finished unit is checkpointed with its rows and skip messages
+    try:
+        # outputs first so zip drains it: the bar reaches n/n, closes, and the executor exits
+        for (rows, messages), index in zip(outputs, todo):
+            skip = []
+            for msg in messages:
+                if isinstance(msg, tuple):
+                    log(msg[0])
                     continue
-                similarity = _calculate_similarity(left_str, right_str)
-                results.append({
-                    'ID': f"{file_base}_{bbox_idx}",
-                    'File Name': lf.replace('.json', '.jpg'),
-                    'bbox': str(bbox),
-                    'OCR': left_str,
-                    'SinomChar': right_str,
-                    'rate': round(similarity, 2),
-                })
+                log(msg)
+                skip.append(msg)
+            progress.record(index, rows=rows, skip=[str(msg) for msg in skip],
+                            rejects=[[m.left, m.right, m.reason, m.message] for m in skip if isinstance(m, ScreeningReject)])
+    finally:
+        progress.close()
+    if right_files:
+        # Keep the token sidecar directory under TOKEN_CACHE_MAX_MB
+        prune_token_cache(default_cache_dir(os.path.join(right_dir, right_files[0])))
+    # Rows and skip messages keep the original unit order
+    for index in sorted(progress.done):
+        entry = progress.done[index]
+        results.extend(entry['rows'])
+        skip_messages.extend(entry['skip'])
+        rejects.extend(ScreeningReject(*reject) for reject in entry['rejects'])
+    if k != 2 and len(left_files) > len(right_files):
+        msg = f"Warning: more left files than right, skip {left_files[len(right_files)]}"
+        log(msg)
+        skip_messages.append(msg)
+    
     if results:
         df_out = pd.DataFrame(results)
         # Ensure column order
         df_out = df_out[['ID', 'File Name', 'bbox', 'OCR', 'SinomChar', 'rate']]
         df_out.to_excel(output_excel, index=False, engine='openpyxl')
-        print(f"Saved {len(results)} rows to {output_excel}")
+        log(f"Saved {len(results)} rows to {output_excel}")
     else:
-        print('No results to write')
-    _write_skip_report(skip_messages, skip_report_path)
+        log('No results to write')
+    _write_skip_report(skip_messages, skip_report_path, log)
+    if screening:
+        write_review_list(rejects, os.path.join(output_dir, f'align_han_{REVIEW_FILE_NAME}'))
+    progress.finish()
@@ -0,0 +1,258 @@
+"""
+Align Service - Tiến trình nền giữ sẵn tài nguyên align trong bộ nhớ
+
+Module này hỗ trợ:
+- Nạp một lần `align`, `align_han`, `align.color` (từ điển, syllable, chỉ mục tương thích)
+- Nhận job align / align_han / mark qua HTTP (Flask, chỉ nghe trên localhost)
+- Trả tiến độ dạng NDJSON (mỗi dòng một sự kiện) trong lúc job chạy
+- Client (`submit`) cho ocr_corrector.py và web UI: dùng service nếu đang chạy,
+  trả về False để bên gọi tự chạy trong tiến trình hiện tại
+
+Chạy service:
+    python align_service.py [--host 127.0.0.1] [--port 5055]
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import urllib.request
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path=Path(__file__).parent / '.env')
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SERVICE_URL = 'http://127.0.0.1:5055'
+JOBS = ('align', 'align_han', 'mark')
+
+
+def service_url() -> str:
+    return os.environ.get('ALIGN_SERVICE_URL') or DEFAULT_SERVICE_URL
+
+
+# ---------------------------------------------------------------------------
+# Client
+# ---------------------------------------------------------------------------
+
+def is_running(timeout: float = 0.5) -> bool:
+    """Service có đang chạy và trả lời /health không."""
+    try:
+        with urllib.request.urlopen(f"{service_url()}/health", timeout=timeout) as resp:
+            return json.load(resp).get('status') == 'ok'
+    except (OSError, ValueError):
+        return False
+
+
+def run_job(job: str, payload: Dict[str, Any], on_event: Optional[Callable[[Dict[str, Any]], None]] = None) -> None:
+    """Gửi job tới service và đọc luồng sự kiện tới khi xong.
+
+    Sự kiện 'log' được in ra console như khi chạy trực tiếp; mọi sự kiện được
+    chuyển cho ``on_event``. Lỗi của job được ném lại dưới dạng RuntimeError.
+    """
+    request = urllib.request.Request(
+        f"{service_url()}/{job}",
+        data=json.dumps(payload, ensure_ascii=False).encode('utf-8'),
+        headers={'Content-Type': 'application/json'},
+    )
+    with urllib.request.urlopen(request) as resp:
+        for raw in resp:
+            if not raw.strip():
+                continue
+            event = json.loads(raw)
+            if event['event'] == 'log':
+                print(event['message'])
+            if on_event:
+                on_event(event)
+            if event['event'] == 'error':
+                raise RuntimeError(event['message'])
+
+
+def submit(job: str, payload: Dict[str, Any], on_event: Optional[Callable[[Dict[str, Any]], None]] = None) -> bool:
+    """Chạy job trên service nếu service đang chạy.
+
+    Returns:
+        True nếu job đã chạy xong trên service, False nếu service không chạy
+        (bên gọi tự chạy trong tiến trình hiện tại)
+    """
+    if not is_running():
+        return False
+    logger.info(f"Dùng align service tại {service_url()} cho job '{job}'")
+    run_job(job, payload, on_event)
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Server
+# ---------------------------------------------------------------------------
+
+def _logger(emit: Callable[[Dict[str, Any]], None]) -> Callable[[Any], None]:
+    """Hàm ``log`` truyền cho align/align_han/marking: mỗi thông báo thành một sự kiện 'log'."""
+    def log(message: Any) -> None:
+        emit({'event': 'log', 'message': str(message)})
+    return log
+
+
+def _warm_up() -> None:
+    """Import các module nặng và biên dịch sẵn chỉ mục tương thích."""
+    import align.color  # noqa: F401  (nạp từ điển lúc import)
+    import align_han.align_han  # noqa: F401
+    from align.dictionary import get_compatibility_index, load_dictionary
+    from align.lexicon import get_lexicon
+
+    # Danh sách âm tiết được nạp lười: nạp sẵn cùng trie
+    get_lexicon().trie
+
+    similar = load_dictionary(os.environ['NOM_SIMILARITY_DICTIONARY'])
+    trans = load_dictionary(os.environ['QN2NOM_DICTIONARY']).iloc[:, [0, 1]]
+    get_compatibility_index(similar, trans)
+
+
+def _count_pages(nom_dir: str) -> int:
+    try:
+        return len(os.listdir(nom_dir))
+    except OSError:
+        return 0
+
+
+def _job_align(payload: Dict[str, Any], emit: Callable[[Dict[str, Any]], None]) -> None:
+    from align.align import align
+    from align.vi_process import clean_directory
+
+    total = _count_pages(payload['nom_dir'])
+    emit({'event': 'start', 'total': total})
+    # Điền sidecar token cho các trang TXT mới/đã sửa (trang không đổi chỉ bị hash).
+    # Tuần tự: job chạy trong thread của service, không fork process pool từ đây
+    clean_directory(payload['vi_dir'], workers=1)
+    page = None
+
+    def on_row(row):
+        nonlocal page
+        if row.page_index != page:
+            page = row.page_index
+            emit({'event': 'page', 'page_index': page, 'total': total, 'file': row.file})
+
+    align(
+        payload['nom_dir'],
+        payload['vi_dir'],
+        payload['output_txt'],
+        k=payload.get('k', 1),
+        reverse=payload.get('reverse', False),
+        mapping_path=payload.get('mapping_path'),
+        kernel=payload.get('kernel', 'auto'),
+        workers=payload.get('workers', 1),
+        use_cache=payload.get('use_cache', True),
+        pairing=payload.get('pairing', 'position'),
+        screening=payload.get('screening', False),
+        checkpoint=payload.get('checkpoint', False),
+        resume=payload.get('resume', False),
+        on_row=on_row,
+        log=_logger(emit),
+    )
+
+
+def _job_align_han(payload: Dict[str, Any], emit: Callable[[Dict[str, Any]], None]) -> None:
+    from align_han.align_han import align_han
+
+    emit({'event': 'start', 'total': _count_pages(payload['left_dir'])})
+    align_han(
+        payload['left_dir'],
+        payload['right_dir'],
+        payload['output_excel'],
+        k=payload.get('k', 1),
+        name_book=payload.get('name_book', 'book'),
+        reverse=payload.get('reverse', False),
+        mapping_path=payload.get('mapping_path'),
+        kernel=payload.get('kernel', 'auto'),
+        workers=payload.get('workers', 1),
+        screening=payload.get('screening', False),
+        checkpoint=payload.get('checkpoint', False),
+        resume=payload.get('resume', False),
+        log=_logger(emit),
+    )
+
+
+def _job_mark(payload: Dict[str, Any], emit: Callable[[Dict[str, Any]], None]) -> None:
+    import pandas as pd
+    from align.color import convert_txt_to_ecel, marking
+
+    emit({'event': 'start', 'total': 2})
+    log = _logger(emit)
+    convert_txt_to_ecel(payload['output_txt'], payload['result'], debug=payload.get('debug', False), namebook=payload.get('namebook', 'book'), log=log)
+    emit({'event': 'step', 'step': 'convert', 'total': 2})
+    df = pd.read_excel(payload['result'])
+    marking(df, payload['result'], debug=payload.get('debug', False), type_qn=payload.get('type_qn', 2), workers=payload.get('workers', 1), log=log)
+    emit({'event': 'step', 'step': 'marking', 'total': 2})
+
+
+_HANDLERS = {'align': _job_align, 'align_han': _job_align_han, 'mark': _job_mark}
+
+
+def create_app():
+    """Flask app với /health và một endpoint POST cho mỗi loại job."""
+    from flask import Flask, Response, jsonify, request
+
+    app = Flask(__name__)
+    # Các job dùng chung tài nguyên toàn cục: chạy lần lượt
+    job_lock = threading.Lock()
+
+    @app.get('/health')
+    def health():
+        return jsonify({'status': 'ok', 'pid': os.getpid(), 'jobs': list(JOBS)})
+
+    def stream(job: str, payload: Dict[str, Any]):
+        events: queue.Queue = queue.Queue()
+        done = object()
+
+        def worker():
+            with job_lock:
+                try:
+                    _HANDLERS[job](payload, events.put)
+                    events.put({'event': 'done'})
+                except Exception as e:
+                    logger.exception(f"Job '{job}' lỗi")
+                    events.put({'event': 'error', 'message': f"{type(e).__name__}: {e}"})
+                finally:
+                    events.put(done)
+
+        threading.Thread(target=worker, daemon=True).start()
+        while True:
+            event = events.get()
+            if event is done:
+                return
+            yield json.dumps(event, ensure_ascii=False) + '\n'
+
+    @app.post('/<job>')
+    def run(job):
+        if job not in _HANDLERS:
+            return jsonify({'error': f"job không hợp lệ: {job}"}), 404
+        payload = request.get_json(force=True)
+        return Response(stream(job, payload), mimetype='application/x-ndjson')
+
+    return app
+
+
+def main() -> int:
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    parser = argparse.ArgumentParser(description='Align service: giữ sẵn từ điển/mô hình align trong bộ nhớ')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Địa chỉ lắng nghe (mặc định chỉ localhost)')
+    parser.add_argument('--port', type=int, default=5055, help='Cổng lắng nghe')
+    args = parser.parse_args()
+
+    logger.info("Đang nạp tài nguyên align...")
+    _warm_up()
+    logger.info(f"✓ Align service sẵn sàng tại http://{args.host}:{args.port}")
+    create_app().run(host=args.host, port=args.port, threaded=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
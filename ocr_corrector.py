@@ -16,8 +16,10 @@ from typing import Dict, Any, Optional
 import pandas as pd
 from dotenv import load_dotenv
 
+import align_service
 from align.align import align
 from align.color import convert_txt_to_ecel, marking
+from align.vi_process import clean_directory
 from handle_data import read_file_info, write_file_info, str2bool
 from nom_ocr.nom_ocr import nom_ocr
 from vi_ocr.vi_ocr import vi_ocr
@@ -70,6 +72,8 @@ def process_ocr(
         os.makedirs(info['ocr_txt_qn'], exist_ok=True)
         
         vi_ocr(info['vi_dir'], info['ocr_txt_qn'])
+        # Làm sạch/tách token song song một lần, align sau đó đọc sidecar
+        clean_directory(info['ocr_txt_qn'])
         logger.info(f"✓ Hoàn thành OCR Quốc Ngữ: {info['ocr_txt_qn']}")
     
     # OCR Hán Nôm
@@ -95,7 +99,13 @@ def process_alignment(
     align_k: int,
     info: Dict[str, Any],
     align_reverse: bool = False,
-    mapping_path: Optional[str] = None
+    mapping_path: Optional[str] = None,
+    workers: int = 1,
+    use_cache: bool = True,
+    pairing: str = 'position',
+    screening: bool = False,
+    checkpoint: bool = False,
+    resume: bool = False
 ) -> Dict[str, Any]:
     """
     Xử lý alignment giữa Quốc Ngữ và Hán Nôm
@@ -105,6 +115,12 @@ def process_alignment(
         info: Dictionary chứa thông tin file
         align_reverse: Đảo ngược thứ tự (chỉ với k=1)
         mapping_path: Đường dẫn file mapping (bắt buộc khi k=2)
+        workers: Số tiến trình align song song
+        use_cache: Dùng lại kết quả align của các trang không đổi nội dung
+        pairing: Cách ghép trang JSON/TXT khi k=1 ('position' hoặc 'auto' theo nội dung)
+        screening: Sàng lọc nhanh trước DP, bỏ qua cặp trang lệch (ghi screening_review.tsv)
+        checkpoint: Ghi checkpoint (result.txt.progress) sau mỗi trang/dòng mapping để có thể resume
+        resume: Tiếp tục lần align bị ngắt từ checkpoint (result.txt.progress)
     
     Returns:
         Updated info dictionary
@@ -159,21 +175,45 @@ def process_alignment(
     
     os.makedirs(os.path.dirname(info['output_txt']), exist_ok=True)
     
-    # Remove old output if exists
-    if os.path.exists(info['output_txt']):
+    # Remove old output if exists (resume giữ lại phần đã align)
+    if not resume and os.path.exists(info['output_txt']):
         os.remove(info['output_txt'])
         logger.info("Đã xóa file output cũ")
     
-    # Run alignment
-    align(
-        ocr_json_nom,
-        ocr_txt_qn,
-        info['output_txt'],
-        k=align_k,
-        name_book=file_name,
-        reverse=align_reverse if align_k == 1 else False,
-        mapping_path=mapping_path
-    )
+    # Run alignment (qua align service nếu đang chạy)
+    payload = {
+        'nom_dir': os.path.abspath(ocr_json_nom),
+        'vi_dir': os.path.abspath(ocr_txt_qn),
+        'output_txt': os.path.abspath(info['output_txt']),
+        'k': align_k,
+        'reverse': align_reverse if align_k == 1 else False,
+        'mapping_path': os.path.abspath(mapping_path) if mapping_path else None,
+        'workers': workers,
+        'use_cache': use_cache,
+        'pairing': pairing,
+        'screening': screening,
+        'checkpoint': checkpoint,
+        'resume': resume
+    }
+    if not align_service.submit('align', payload):
+        # Điền sidecar token cho các trang TXT mới/đã sửa (trang không đổi chỉ bị hash);
+        # align service tự làm bước này trong job
+        clean_directory(ocr_txt_qn, workers=workers)
+        align(
+            ocr_json_nom,
+            ocr_txt_qn,
+            info['output_txt'],
+            k=align_k,
+            name_book=file_name,
+            reverse=align_reverse if align_k == 1 else False,
+            mapping_path=mapping_path,
+            workers=workers,
+            use_cache=use_cache,
+            pairing=pairing,
+            screening=screening,
+            checkpoint=checkpoint,
+            resume=resume
+        )
     
     logger.info(f"✓ Align thành công! Output: {info['output_txt']}")
     return info
@@ -181,7 +221,8 @@ def process_alignment(
 
 def process_correction(
     info: Dict[str, Any],
-    debug: bool = False
+    debug: bool = False,
+    workers: int = 1
 ) -> Dict[str, Any]:
     """
     Xử lý correction và marking
@@ -189,6 +230,7 @@ def process_correction(
     Args:
         info: Dictionary chứa thông tin file
         debug: Bật chế độ debug
+        workers: Số tiến trình tính màu song song khi marking
     
     Returns:
         Updated info dictionary
@@ -213,13 +255,22 @@ def process_correction(
     info['Result'] = f"{OUTPUT_FOLDER}/result.xlsx"
     os.makedirs(os.path.dirname(info['Result']), exist_ok=True)
     
-    # Run correction
-    logger.info("Chuyển đổi TXT sang Excel...")
-    convert_txt_to_ecel(info['output_txt'], info['Result'], debug=debug, namebook=file_name)
-    
-    logger.info("Đang marking...")
-    df = pd.read_excel(info['Result'])
-    marking(df, info['Result'], debug=debug, type_qn=type_qn)
+    # Run correction (qua align service nếu đang chạy)
+    payload = {
+        'output_txt': os.path.abspath(info['output_txt']),
+        'result': os.path.abspath(info['Result']),
+        'debug': debug,
+        'namebook': file_name,
+        'type_qn': type_qn,
+        'workers': workers
+    }
+    if not align_service.submit('mark', payload):
+        logger.info("Chuyển đổi TXT sang Excel...")
+        convert_txt_to_ecel(info['output_txt'], info['Result'], debug=debug, namebook=file_name)
+        
+        logger.info("Đang marking...")
+        df = pd.read_excel(info['Result'])
+        marking(df, info['Result'], debug=debug, type_qn=type_qn, workers=workers)
     
     logger.info(f"✓ Correction thành công! Output: {info['Result']}")
     return info
@@ -264,6 +315,45 @@ def main() -> int:
         help='Đường dẫn file mapping.xlsx (bắt buộc khi k=2)'
     )
     
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Số tiến trình song song cho align (mỗi trang/dòng mapping là một đơn vị) và marking'
+    )
+    
+    parser.add_argument(
+        '--no-align-cache',
+        action='store_true',
+        help='Align lại toàn bộ, không dùng cache kết quả align của các trang không đổi'
+    )
+    
+    parser.add_argument(
+        '--align-pairing',
+        type=str,
+        choices=['position', 'auto'],
+        default='position',
+        help='Cách ghép trang JSON/TXT khi k=1: theo vị trí (mặc định) hoặc tự động theo nội dung'
+    )
+    
+    parser.add_argument(
+        '--align-screening',
+        action='store_true',
+        help='Sàng lọc nhanh từng cặp trước khi align, bỏ qua cặp lệch và ghi lý do vào screening_review.tsv'
+    )
+    
+    parser.add_argument(
+        '--align-checkpoint',
+        action='store_true',
+        help='Ghi checkpoint sau mỗi trang/dòng mapping để lần align bị ngắt có thể chạy lại với --align-resume'
+    )
+    
+    parser.add_argument(
+        '--align-resume',
+        action='store_true',
+        help='Tiếp tục lần align bị ngắt: bỏ qua các trang/dòng mapping đã xong'
+    )
+    
     parser.add_argument(
         '--corrector',
         type=str2bool,
@@ -286,14 +376,20 @@ def main() -> int:
                 align_k=args.align,
                 info=info,
                 align_reverse=args.align_reverse or False,
-                mapping_path=args.mapping_path
+                mapping_path=args.mapping_path,
+                workers=args.workers,
+                use_cache=not args.no_align_cache,
+                pairing=args.align_pairing,
+                screening=args.align_screening,
+                checkpoint=args.align_checkpoint,
+                resume=args.align_resume
             )
             write_file_info(info)
         
         # Process Correction
         if args.corrector is not None:
             info = read_file_info()
-            info = process_correction(info, debug=args.corrector)
+            info = process_correction(info, debug=args.corrector, workers=args.workers)
             write_file_info(info)
         
         if not any([args.ocr, args.align is not None, args.corrector is not None]):
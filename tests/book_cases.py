@@ -0,0 +1,50 @@
+"""
+Sách nhỏ tự tạo (trang JSON Hán Nôm, trang TXT Quốc Ngữ) và từ điển nhỏ tương ứng, dùng
+chung cho các test chạy cả pipeline align (``align.align``, ``align.pairing``).
+"""
+import json
+import random
+
+import pandas as pd
+
+# Âm Quốc Ngữ -> chữ Hán Nôm của từ điển nhỏ
+WORDS = {
+    'an': '安', 'nam': '南', 'quốc': '國', 'gia': '家', 'thiên': '天', 'hạ': '下', 'nhân': '人', 'dân': '民',
+    'sơn': '山', 'hà': '河', 'đại': '大', 'việt': '越', 'minh': '明', 'đức': '德', 'tâm': '心', 'trung': '忠',
+    'hiếu': '孝', 'nghĩa': '義', 'lễ': '禮', 'trí': '智', 'tín': '信', 'bình': '平', 'phúc': '福', 'thọ': '壽',
+}
+
+
+def page_text(seed, columns=(1, 4), words=(1, 6)):
+    """Các cột chữ Hán Nôm của một trang (có chữ sai như OCR) và dãy âm Quốc Ngữ tương ứng."""
+    rng = random.Random(seed)
+    texts, syllables = [], []
+    for _ in range(rng.randint(*columns)):
+        line = [rng.choice(list(WORDS)) for _ in range(rng.randint(*words))]
+        syllables.extend(line)
+        texts.append(''.join(WORDS[w] if rng.random() < 0.85 else '丁' for w in line))
+    if rng.random() < 0.5:
+        syllables.insert(rng.randrange(len(syllables) + 1), 'và')
+    return texts, syllables
+
+
+def write_json(path, texts):
+    boxes = [{'points': [[1000 - 50 * col, 10], [0, 0], [0, 0], [0, 0]], 'transcription': text} for col, text in enumerate(texts)]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'data': {'result_bbox': boxes}}, f, ensure_ascii=False)
+
+
+def write_txt(path, syllables):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(' '.join(syllables))
+
+
+def write_dictionaries(tmp_path, monkeypatch):
+    """Ghi hai file từ điển nhỏ và trỏ NOM_SIMILARITY_DICTIONARY / QN2NOM_DICTIONARY tới chúng."""
+    similar_path, trans_path = tmp_path / 'similar.xlsx', tmp_path / 'trans.xlsx'
+    pd.DataFrame({'Input Character': ['安', '南'], 'Top 20 Similar Characters': ['案', '喃']}).to_excel(similar_path, index=False)
+    pd.DataFrame({'QuocNgu': list(WORDS), 'SinoNom': list(WORDS.values())}).to_excel(trans_path, index=False)
+    monkeypatch.setenv('NOM_SIMILARITY_DICTIONARY', str(similar_path))
+    monkeypatch.setenv('QN2NOM_DICTIONARY', str(trans_path))
+    monkeypatch.setenv('ALIGN_CACHE_DIR', str(tmp_path / 'align_cache'))
+    return str(similar_path), str(trans_path)
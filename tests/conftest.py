@@ -0,0 +1,26 @@
+import os
+import shutil
+import tempfile
+
+_previous_cache_dir = None
+_cache_dir = None
+
+
+def pytest_configure(config):
+    """Cache nhị phân của danh sách âm tiết / từ điển ghi vào thư mục tạm, không vào repo.
+
+    Đặt trước khi thu thập test vì ``align.color`` nạp từ điển ngay lúc import.
+    """
+    global _previous_cache_dir, _cache_dir
+    _previous_cache_dir = os.environ.get('DICT_CACHE_DIR')
+    _cache_dir = tempfile.mkdtemp(prefix='dict_cache-')
+    os.environ['DICT_CACHE_DIR'] = _cache_dir
+
+
+def pytest_unconfigure(config):
+    if _previous_cache_dir is None:
+        os.environ.pop('DICT_CACHE_DIR', None)
+    else:
+        os.environ['DICT_CACHE_DIR'] = _previous_cache_dir
+    if _cache_dir:
+        shutil.rmtree(_cache_dir, ignore_errors=True)
@@ -0,0 +1,71 @@
+"""
+Bài toán căn chỉnh ngẫu nhiên dùng chung cho các test kernel (``align.dp``, ``align.diff``,
+``align.sparse``). Bảng chữ nhỏ để có nhiều ô hoà điểm.
+"""
+import random
+
+import pytest
+
+from align.dp import MATCH, UP, CostRows
+
+SEEDS = range(40)
+
+
+def _tokens(rng, length, alphabet):
+    return [rng.choice(alphabet) for _ in range(length)]
+
+
+def random_pair(seed, max_len=40):
+    """Hai dãy token ngẫu nhiên: một nửa là bản gần giống (sửa vài vị trí), một nửa độc lập."""
+    rng = random.Random(seed)
+    alphabet = 'abcdefgh'[:rng.randint(1, 8)]
+    left = _tokens(rng, rng.randint(0, max_len), alphabet)
+    if rng.random() < 0.5:
+        right = list(left)
+        for _ in range(rng.randint(0, 6)):
+            op = rng.random()
+            pos = rng.randint(0, len(right))
+            if op < 0.4 or not right:
+                right.insert(pos, rng.choice(alphabet))
+            elif op < 0.7:
+                del right[min(pos, len(right) - 1)]
+            else:
+                right[min(pos, len(right) - 1)] = rng.choice(alphabet)
+    else:
+        right = _tokens(rng, rng.randint(0, max_len), alphabet)
+    return left, right
+
+
+def predicate_cost(seed, left, right):
+    """CostRows có bảng khớp (như so từ điển của align): quan hệ khớp ngẫu nhiên."""
+    rng = random.Random(seed)
+    pairs = {(a, b) for a in set(left) for b in set(right) if a == b or rng.random() < 0.2}
+    return CostRows.from_predicate(left, right, lambda a, b: (a, b) in pairs)
+
+
+def cost_cases(seeds=SEEDS):
+    """Tham số pytest: với mỗi seed một CostRows so bằng và một CostRows có bảng khớp."""
+    cases = []
+    for seed in seeds:
+        left, right = random_pair(seed)
+        cases.append(pytest.param(CostRows.equality(left, right), id=f'equality-{seed}'))
+        cases.append(pytest.param(predicate_cost(seed, left, right), id=f'table-{seed}'))
+    return cases
+
+
+def ops_cost(cost, ops):
+    """Chi phí Levenshtein của dãy mã ``ops`` trên ``cost`` (kiểm tra luôn ops đi hết bảng)."""
+    i = j = total = 0
+    for code in ops:
+        if code == MATCH:
+            total += int(cost.row(i)[j])
+            i += 1
+            j += 1
+        elif code == UP:
+            total += 1
+            i += 1
+        else:
+            total += 1
+            j += 1
+    assert (i, j) == cost.shape
+    return total
@@ -0,0 +1,63 @@
+"""
+Cache kết quả DP (``align.align_cache``): khoá ổn định và đổi theo từng thành phần,
+get/put trả lại đúng cặp dãy đã căn, ``prune`` giữ cache trong giới hạn theo LRU.
+"""
+import os
+
+from align.align_cache import AlignmentCache
+
+
+def _key(cache, nom=('安', '南'), qn=('an', 'nam'), k=1, kernel='auto'):
+    return cache.key(list(nom), list(qn), k, kernel)
+
+
+def test_key_is_stable_and_sensitive(tmp_path):
+    cache = AlignmentCache(str(tmp_path), 'v1')
+    key = _key(cache)
+    assert key == _key(AlignmentCache(str(tmp_path / 'other'), 'v1'))
+    variants = [
+        _key(AlignmentCache(str(tmp_path), 'v2')),
+        _key(cache, nom=('安', '喃')),
+        _key(cache, qn=('an', 'nam', 'x')),
+        _key(cache, k=2),
+        _key(cache, kernel='banded'),
+        # Ranh giới token nằm trong khoá: ('ab',) khác ('a', 'b')
+        _key(cache, nom=('安南',)),
+    ]
+    assert len({key, *variants}) == len(variants) + 1
+
+
+def test_get_put_round_trip(tmp_path):
+    cache = AlignmentCache(str(tmp_path), 'v1')
+    key = _key(cache)
+    assert cache.get(key) is None
+    cache.put(key, ['安', '*', '南'], ['an', 'x', 'nam'])
+    assert cache.get(key) == (['安', '*', '南'], ['an', 'x', 'nam'])
+    # Entry hỏng coi như không có
+    with open(cache._path(key), 'w', encoding='utf-8') as f:
+        f.write('{')
+    assert cache.get(key) is None
+
+
+def test_prune_keeps_recently_used(tmp_path):
+    cache = AlignmentCache(str(tmp_path), 'v1')
+    keys = [_key(cache, k=k) for k in range(4)]
+    for n, key in enumerate(keys):
+        cache.put(key, ['安'] * 10, ['an'] * 10)
+        os.utime(cache._path(key), (1000 + n, 1000 + n))
+    size = os.path.getsize(cache._path(keys[0]))
+    # Đọc trúng entry cũ nhất đánh dấu nó vừa dùng
+    assert cache.get(keys[0]) is not None
+    assert cache.prune(max_bytes=2 * size) == 2
+    assert [cache.get(key) is not None for key in keys] == [True, False, False, True]
+    assert cache.prune(max_bytes=2 * size) == 0
+
+
+def test_prune_reads_size_cap_from_env(tmp_path, monkeypatch):
+    cache = AlignmentCache(str(tmp_path), 'v1')
+    cache.put(_key(cache), ['安'], ['an'])
+    monkeypatch.setenv('ALIGN_CACHE_MAX_MB', '0')
+    assert cache.prune() == 0
+    monkeypatch.setenv('ALIGN_CACHE_MAX_MB', '0.00001')
+    assert cache.prune() == 1
+    assert cache.get(_key(cache)) is None
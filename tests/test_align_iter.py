@@ -0,0 +1,52 @@
+"""
+``align_iter`` phải trả về đúng các dòng mà ``align`` ghi ra result.txt, theo cùng thứ tự
+(k=1 ghép theo vị trí / theo nội dung, k=2 theo mapping), trên dữ liệu và từ điển nhỏ tự tạo.
+"""
+import pandas as pd
+import pytest
+
+from align.align import align, align_iter
+from book_cases import page_text, write_dictionaries, write_json, write_txt
+
+
+@pytest.fixture
+def book(tmp_path, monkeypatch):
+    nom_dir, vi_dir = tmp_path / 'json', tmp_path / 'txt'
+    nom_dir.mkdir()
+    vi_dir.mkdir()
+    for k in range(5):
+        texts, syllables = page_text(k)
+        write_json(nom_dir / f'book_{k:03d}.json', texts)
+        write_txt(vi_dir / f'book_{k:03d}.txt', syllables)
+    write_dictionaries(tmp_path, monkeypatch)
+    # k=2 bỏ qua 57 dòng đầu của file mapping
+    rows = [["['x']", "['y']"]] * 57 + [
+        ["['book_000.json', 'book_001.json']", "['book_001.txt', 'book_000.txt']"],
+        ["['book_002.json']", "['book_002.txt']"],
+        ["['book_003.json', 'book_004.json']", "['book_004.txt', 'book_003.txt']"],
+    ]
+    mapping_path = tmp_path / 'mapping.xlsx'
+    pd.DataFrame(rows, columns=['hannom', 'quocngu']).to_excel(mapping_path, index=False)
+    return tmp_path, str(nom_dir), str(vi_dir), str(mapping_path)
+
+
+@pytest.mark.parametrize('options', [
+    {'k': 1},
+    {'k': 1, 'reverse': True},
+    {'k': 1, 'pairing': 'auto'},
+    {'k': 1, 'use_cache': False},
+    {'k': 1, 'workers': 2},
+    {'k': 2},
+])
+def test_align_iter_yields_rows_align_writes(book, options):
+    tmp_path, nom_dir, vi_dir, mapping_path = book
+    if options['k'] == 2:
+        options = dict(options, mapping_path=mapping_path)
+    output_txt = tmp_path / 'result.txt'
+    align(nom_dir, vi_dir, str(output_txt), log=lambda msg: None, **options)
+    rows = list(align_iter(nom_dir, vi_dir, log=lambda msg: None, **options))
+    written = output_txt.read_text(encoding='utf-8')
+    assert rows
+    assert ''.join(row.to_line() for row in rows) == written
+    # Lần chạy thứ hai (đọc từ cache nếu bật) vẫn cho cùng kết quả
+    assert [row.to_line() for row in align_iter(nom_dir, vi_dir, log=lambda msg: None, **options)] == [row.to_line() for row in rows]
@@ -0,0 +1,104 @@
+"""
+Align service (``align_service``): /health, luồng sự kiện NDJSON của một job, lỗi job thành
+sự kiện 'error'; client ``submit`` chạy job trên service đang chạy và trả về False (bên gọi
+tự chạy) khi không có service.
+"""
+import json
+import socket
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+import align_service
+from align.align import align
+from book_cases import page_text, write_dictionaries, write_json, write_txt
+
+
+@pytest.fixture
+def book(tmp_path, monkeypatch):
+    nom_dir, vi_dir = tmp_path / 'json', tmp_path / 'txt'
+    nom_dir.mkdir()
+    vi_dir.mkdir()
+    for k in range(3):
+        texts, syllables = page_text(k)
+        write_json(nom_dir / f'book_{k:03d}.json', texts)
+        write_txt(vi_dir / f'book_{k:03d}.txt', syllables)
+    write_dictionaries(tmp_path, monkeypatch)
+    return tmp_path, str(nom_dir), str(vi_dir)
+
+
+def _events(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines() if line.strip()]
+
+
+def test_health_and_unknown_job():
+    client = align_service.create_app().test_client()
+    health = client.get('/health').get_json()
+    assert health['status'] == 'ok' and health['jobs'] == list(align_service.JOBS)
+    assert client.post('/nope', json={}).status_code == 404
+
+
+def test_align_job_streams_events(book):
+    tmp_path, nom_dir, vi_dir = book
+    expected_txt = str(tmp_path / 'expected.txt')
+    align(nom_dir, vi_dir, expected_txt, log=lambda msg: None)
+
+    output_txt = str(tmp_path / 'result.txt')
+    response = align_service.create_app().test_client().post(
+        '/align', json={'nom_dir': nom_dir, 'vi_dir': vi_dir, 'output_txt': output_txt})
+    assert response.mimetype == 'application/x-ndjson'
+    events = _events(response)
+    assert events[0] == {'event': 'start', 'total': 3}
+    assert events[-1] == {'event': 'done'}
+    assert [e['page_index'] for e in events if e['event'] == 'page'] == [0, 1, 2]
+    assert any(e['event'] == 'log' for e in events)
+    with open(output_txt, encoding='utf-8') as f, open(expected_txt, encoding='utf-8') as g:
+        assert f.read() == g.read()
+
+
+def test_job_error_becomes_error_event(book):
+    tmp_path, _, vi_dir = book
+    events = _events(align_service.create_app().test_client().post(
+        '/align', json={'nom_dir': str(tmp_path / 'missing'), 'vi_dir': vi_dir, 'output_txt': str(tmp_path / 'r.txt')}))
+    assert events[-1]['event'] == 'error' and 'FileNotFoundError' in events[-1]['message']
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def test_submit_falls_back_when_service_is_down(monkeypatch):
+    monkeypatch.setenv('ALIGN_SERVICE_URL', f'http://127.0.0.1:{_free_port()}')
+    assert not align_service.is_running()
+    assert align_service.submit('align', {}) is False
+
+
+@pytest.fixture
+def service(monkeypatch):
+    server = make_server('127.0.0.1', 0, align_service.create_app(), threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv('ALIGN_SERVICE_URL', f'http://127.0.0.1:{server.server_port}')
+    yield server
+    server.shutdown()
+    thread.join()
+
+
+def test_submit_runs_job_on_service(book, service, capsys):
+    tmp_path, nom_dir, vi_dir = book
+    assert align_service.is_running()
+    output_txt = str(tmp_path / 'result.txt')
+    events = []
+    assert align_service.submit('align', {'nom_dir': nom_dir, 'vi_dir': vi_dir, 'output_txt': output_txt}, events.append)
+    assert events[0]['event'] == 'start' and events[-1] == {'event': 'done'}
+    # Thông báo của job được in ra console của client
+    logs = [e['message'] for e in events if e['event'] == 'log']
+    assert logs and logs[-1] in capsys.readouterr().out
+    with open(output_txt, encoding='utf-8') as f:
+        assert f.read()
+
+    with pytest.raises(RuntimeError, match='FileNotFoundError'):
+        align_service.submit('align', {'nom_dir': str(tmp_path / 'missing'), 'vi_dir': vi_dir, 'output_txt': output_txt})
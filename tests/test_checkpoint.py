@@ -0,0 +1,112 @@
+"""
+Checkpoint của align (``align.checkpoint``): resume giữ các đơn vị đã ghi nhận, cắt dòng
+progress ghi dở và phần output của đơn vị đang ghi khi bị ngắt; cấu hình khác hoặc output
+không khớp thì làm lại từ đầu.
+"""
+import os
+
+import pytest
+
+from align.align import align
+from align.checkpoint import AlignmentCheckpoint, progress_path
+from book_cases import page_text, write_dictionaries, write_json, write_txt
+
+
+def _run_units(checkpoint, output, units):
+    for unit in units:
+        with open(output, 'a', encoding='utf-8') as f:
+            f.write(f'row {unit}\n')
+        checkpoint.record(unit, rejects=[])
+
+
+def test_resume_truncates_partial_unit(tmp_path):
+    output = str(tmp_path / 'result.txt')
+    checkpoint = AlignmentCheckpoint(progress_path(output), {'k': 1}, output_path=output)
+    assert checkpoint.start() == {}
+    _run_units(checkpoint, output, [0, 1])
+    checkpoint.close()
+    # Bị ngắt giữa đơn vị 2: output đã có một phần, progress có một dòng ghi dở
+    with open(output, 'a', encoding='utf-8') as f:
+        f.write('row 2 (partial)\n')
+    with open(progress_path(output), 'a', encoding='utf-8') as f:
+        f.write('{"unit": 2, "off')
+    resumed = AlignmentCheckpoint(progress_path(output), {'k': 1}, output_path=output)
+    done = resumed.start(resume=True)
+    assert sorted(done) == [0, 1]
+    with open(output, encoding='utf-8') as f:
+        assert f.read() == 'row 0\nrow 1\n'
+    _run_units(resumed, output, [2])
+    resumed.close()
+    with open(progress_path(output), encoding='utf-8') as f:
+        assert len(f.read().splitlines()) == 4
+    resumed.finish()
+    assert not os.path.exists(progress_path(output))
+
+
+def test_resume_restarts_on_config_change_or_short_output(tmp_path):
+    output = str(tmp_path / 'result.txt')
+    checkpoint = AlignmentCheckpoint(progress_path(output), {'k': 1}, output_path=output)
+    checkpoint.start()
+    _run_units(checkpoint, output, [0, 1])
+    checkpoint.close()
+    assert AlignmentCheckpoint(progress_path(output), {'k': 2}, output_path=output).start(resume=True) == {}
+    assert not os.path.exists(output)
+
+    checkpoint.start()
+    _run_units(checkpoint, output, [0, 1])
+    checkpoint.close()
+    os.truncate(output, 3)
+    messages = []
+    assert AlignmentCheckpoint(progress_path(output), {'k': 1}, output_path=output).start(resume=True, log=messages.append) == {}
+    assert messages and 'align lại từ đầu' in messages[0]
+
+
+def test_without_path_keeps_progress_in_memory(tmp_path):
+    checkpoint = AlignmentCheckpoint(None, {'k': 1})
+    assert checkpoint.start(resume=True) == {}
+    checkpoint.record(0, rejects=[])
+    assert checkpoint.done == {0: {'unit': 0, 'rejects': []}}
+    checkpoint.finish()
+    assert os.listdir(tmp_path) == []
+
+
+class _Interrupted(Exception):
+    pass
+
+
+@pytest.fixture
+def book(tmp_path, monkeypatch):
+    nom_dir, vi_dir = tmp_path / 'json', tmp_path / 'txt'
+    nom_dir.mkdir()
+    vi_dir.mkdir()
+    for k in range(4):
+        texts, syllables = page_text(k)
+        write_json(nom_dir / f'book_{k:03d}.json', texts)
+        write_txt(vi_dir / f'book_{k:03d}.txt', syllables)
+    write_dictionaries(tmp_path, monkeypatch)
+    return tmp_path, str(nom_dir), str(vi_dir)
+
+
+def test_align_resume_after_interruption(book):
+    tmp_path, nom_dir, vi_dir = book
+    expected_txt = str(tmp_path / 'expected.txt')
+    align(nom_dir, vi_dir, expected_txt, log=lambda msg: None)
+
+    output_txt = str(tmp_path / 'result.txt')
+    seen = []
+
+    def interrupt(row):
+        # Dòng của trang thứ ba đã được ghi và fsync nhưng trang chưa được ghi nhận
+        seen.append(row.file)
+        if len(set(seen)) == 3:
+            raise _Interrupted
+
+    with pytest.raises(_Interrupted):
+        align(nom_dir, vi_dir, output_txt, checkpoint=True, on_row=interrupt, log=lambda msg: None)
+    assert os.path.exists(progress_path(output_txt))
+    messages = []
+    align(nom_dir, vi_dir, output_txt, resume=True, log=messages.append)
+    assert any('Tiếp tục từ checkpoint: bỏ qua 2' in str(msg) for msg in messages)
+    with open(output_txt, encoding='utf-8') as f, open(expected_txt, encoding='utf-8') as g:
+        assert f.read() == g.read()
+    assert not os.path.exists(progress_path(output_txt))
@@ -0,0 +1,157 @@
+"""
+Các hàm của ``align.color`` phải cho đúng kết quả của các bản cũ:
+``normalize_vietnamese_text`` (bảng sửa biên dịch thành ``_ReplaceChain``, luật dấu gộp
+thành một regex) so với chuỗi str.replace/re.sub tuần tự, ``compare`` (tra cứu qua chỉ
+mục) so với bản lọc DataFrame ở mỗi lần gọi.
+"""
+import ast
+import random
+import re
+import unicodedata
+
+import pytest
+
+for _name in ('xlsxwriter', 'Levenshtein', 'torch'):
+    pytest.importorskip(_name)
+
+from align import color  # noqa: E402
+
+
+def _normalize_reference(text):
+    """Bản cũ: chuỗi str.replace theo thứ tự all_corrections rồi 12 lần re.sub."""
+    text = unicodedata.normalize('NFKC', text)
+    for src, tgt in color.all_corrections.items():
+        text = text.replace(src, tgt)
+    text = re.sub(r'(?<!g)i(à|á|ả|ã|ạ)', r'ì\1', text)
+    text = re.sub(r'(?<!g)ìá', r'ía', text)
+    text = re.sub(r'(?<!g)ìà', r'ìa', text)
+    text = re.sub(r'(?<!g)ìả', r'ỉa', text)
+    text = re.sub(r'(?<!g)ìã', r'ĩa', text)
+    text = re.sub(r'(?<!g)ìạ', r'ịa', text)
+    text = re.sub(r'\bu(à|á|ả|ã|ạ)\b', r'ì\1', text)
+    text = re.sub(r'(?<!q)ùá', r'úa', text)
+    text = re.sub(r'(?<!q)ùà', r'ùa', text)
+    text = re.sub(r'(?<!q)ùả', r'ủa', text)
+    text = re.sub(r'(?<!q)ùã', r'ũa', text)
+    text = re.sub(r'(?<!q)ùạ', r'ụa', text)
+    return text
+
+
+def _compare_reference(quoc_ngu, ocr):
+    """Bản cũ: lọc DataFrame từ điển ở mỗi lần gọi."""
+    quoc_ngu = quoc_ngu.strip().lower()
+    ocr = ocr.strip()
+    quocngu_dict, similar_dict = color.quocngu_dict, color.similar_dict
+    result_word = list(quocngu_dict[quocngu_dict['QuocNgu'].str.strip().str.lower() == quoc_ngu]['SinoNom'])
+    row = similar_dict[similar_dict['Input Character'] == ocr]
+    if row.empty:
+        return []
+    top_20_str = row['Top 20 Similar Characters'].iloc[0]
+    result_OCR = ast.literal_eval(top_20_str) if isinstance(top_20_str, str) else top_20_str
+    if len(result_OCR) == 1 and isinstance(result_OCR[0], list):
+        result_OCR = [ocr] + list(result_OCR[0])
+    else:
+        result_OCR = [ocr] + list(result_OCR)
+    if ocr in result_word:
+        return [ocr]
+    temp = list(set(result_word) & set(result_OCR))
+    return color.sort_by_similarity(result_OCR, temp) if len(temp) > 1 else temp
+
+
+def _adversarial_texts(count, seed=0):
+    """Chuỗi ghép từ src/tgt của các quy tắc (để các quy tắc chồng lên nhau) và dạng NFD."""
+    rng = random.Random(seed)
+    rules = list(color.all_corrections.items())
+    pieces = [src for src, _ in rules] + [tgt for _, tgt in rules]
+    pieces += list('giquàáảãạìùúaeoy ươôê.,-&;') + ['&amp;', '&lt;', 'gi', 'qu', ' u']
+    texts = [''.join(rng.choice(pieces) for _ in range(rng.randint(1, 12))) for _ in range(count)]
+    return texts + [unicodedata.normalize('NFD', text) for text in texts[:count // 10]]
+
+
+def test_normalize_matches_reference():
+    for text in _adversarial_texts(20000):
+        assert color.normalize_vietnamese_text(text) == _normalize_reference(text), text
+
+
+def test_normalize_plain_text():
+    for text in ['', 'hoà bình', 'Người Việt Nam', 'thủy thuỷ', 'quà gìa', 'u à', '&amp; &lt;']:
+        assert color.normalize_vietnamese_text(text) == _normalize_reference(text)
+
+
+def _compare_pairs(count, seed=0):
+    """Cặp (Quốc ngữ, chữ OCR): chữ đúng, chữ giống, chữ không liên quan và chữ không có trong từ điển."""
+    rng = random.Random(seed)
+    entries = list(zip(color.quocngu_dict['QuocNgu'], color.quocngu_dict['SinoNom']))
+    chars = list(color.similar_dict['Input Character'])
+    pairs = []
+    for _ in range(count):
+        quoc_ngu, sino = rng.choice(entries)
+        if not isinstance(quoc_ngu, str):
+            continue
+        kind = rng.random()
+        if kind < 0.3:
+            ocr = sino
+        elif kind < 0.6 and sino in color.similar_index:
+            ocr = rng.choice(color._similar_chars(sino))
+        elif kind < 0.9:
+            ocr = rng.choice(chars)
+        else:
+            ocr = 'x'
+        pairs.append((f' {quoc_ngu.upper()} ' if rng.random() < 0.2 else quoc_ngu, ocr))
+    return pairs
+
+
+def test_compare_matches_reference():
+    for quoc_ngu, ocr in _compare_pairs(300):
+        assert color.compare(quoc_ngu, ocr) == _compare_reference(quoc_ngu, ocr), (quoc_ngu, ocr)
+
+
+def test_compare_returns_fresh_list():
+    quoc_ngu, ocr = next((q, o) for q, o in _compare_pairs(300) if color.compare(q, o))
+    first = color.compare(quoc_ngu, ocr)
+    first.append('x')
+    assert color.compare(quoc_ngu, ocr) == _compare_reference(quoc_ngu, ocr)
+
+
+def _marking_rows(count, seed=0):
+    """Dòng (Quốc ngữ, chuỗi OCR) ghép từ các cặp ``_compare_pairs``; một phần lệch số chữ."""
+    rng = random.Random(seed)
+    pairs = [(q.strip(), o) for q, o in _compare_pairs(count * 4, seed) if len(o) == 1 and ' ' not in q.strip()]
+    rows = []
+    while pairs and len(rows) < count:
+        line = [pairs.pop() for _ in range(min(len(pairs), rng.randint(1, 6)))]
+        words = ' '.join(q for q, _ in line)
+        ocr = ''.join(o for _, o in line)
+        if rng.random() < 0.1:
+            ocr += '丁'
+        rows.append((words, ocr))
+    return rows
+
+
+@pytest.mark.parametrize('type_qn', [0, 1, 2])
+def test_parallel_marking_matches_sequential(type_qn):
+    rows = _marking_rows(60)
+    expected = [color._mark_row(word, ocr, type_qn) for word, ocr in rows]
+    assert any(marked is None for marked, _ in expected) and any(marked for marked, _ in expected)
+    # Khối nhỏ để nhiều khối được chia cho các worker
+    assert list(color._iter_marked_rows(rows, type_qn=type_qn, workers=1, chunk_size=7)) == expected
+    assert list(color._iter_marked_rows(rows, type_qn=type_qn, workers=3, chunk_size=7)) == expected
+
+
+def test_parallel_marking_writes_same_workbook(tmp_path):
+    pd = pytest.importorskip('pandas')
+    openpyxl = pytest.importorskip('openpyxl')
+    # Nhiều hơn MARKING_CHUNK_SIZE dòng để workers > 1 thật sự chia khối
+    rows = _marking_rows(color.MARKING_CHUNK_SIZE * 2 + 10, seed=1)
+    assert len(rows) > color.MARKING_CHUNK_SIZE * 2
+    df = pd.DataFrame({'Image_name': [f'p{k}' for k in range(len(rows))], 'ID': range(len(rows)),
+                       'Image Box': ['[]'] * len(rows), 'SinoNom OCR': [o for _, o in rows],
+                       'Chữ Quốc ngữ': [w for w, _ in rows]})
+    outputs = []
+    for workers in (1, 3):
+        path = str(tmp_path / f'marked_{workers}.xlsx')
+        messages = []
+        color.marking(df, path, type_qn=2, workers=workers, log=messages.append)
+        sheet = openpyxl.load_workbook(path).active
+        outputs.append(([list(r) for r in sheet.iter_rows(values_only=True)], messages))
+    assert outputs[0] == outputs[1]
@@ -0,0 +1,106 @@
+"""
+``CompatibilityIndex`` (``align.dictionary``) phải cho đúng ``is_compatible`` từng ô, cả khi
+dựng từ DataFrame lẫn khi nạp lại từ cache (mảng CSR và bảng tra được memory-map).
+``load_dictionary`` phải trả về đúng như ``pd.read_excel`` và dựng lại cache khi file đổi.
+"""
+import os
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from align.align import is_compatible
+from align.dictionary import CompatibilityIndex, build_dicts, compile_dictionary, load_dictionary
+
+
+def _frames(seed):
+    """Bảng chữ tương tự và bảng âm -> chữ ngẫu nhiên, có chữ/âm lặp và giá trị rỗng."""
+    rng = random.Random(seed)
+    chars = [chr(0x4E00 + k) for k in range(40)]
+    words = [f'w{k}' for k in range(30)]
+    similar = [(rng.choice(chars), rng.choice(chars)) for _ in range(60)] + [(rng.choice(chars), np.nan)]
+    trans = [(rng.choice(words), rng.choice(chars)) for _ in range(80)] + [(np.nan, rng.choice(chars))]
+    similar_df = pd.DataFrame(similar, columns=['Input Character', 'Top 20 Similar Characters'])
+    trans_df = pd.DataFrame(trans, columns=['QuocNgu', 'SinoNom'])
+    return similar_df, trans_df, chars + ['x', 'y'], words + ['zz']
+
+
+def _assert_matches_reference(index, similar_df, trans_df, chars, words, seed):
+    trans_dict, similar_dict = build_dicts(similar_df, trans_df)
+    rng = random.Random(seed)
+    nom = [rng.choice(chars) for _ in range(60)]
+    qn = [rng.choice(words) for _ in range(50)]
+    expected = np.array([[is_compatible(c, w, trans_dict, similar_dict) for w in qn] for c in nom])
+    assert expected.any() and not expected.all()
+    np.testing.assert_array_equal(index.compatibility(nom, qn), expected)
+    cost = index.cost_rows(nom, qn)
+    for i in range(len(nom)):
+        np.testing.assert_array_equal(cost.row(i), (~expected[i]).astype(np.int64))
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_compatibility_matches_is_compatible(seed):
+    similar_df, trans_df, chars, words = _frames(seed)
+    index = CompatibilityIndex.from_frames(similar_df, trans_df)
+    _assert_matches_reference(index, similar_df, trans_df, chars, words, seed)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_loaded_index_matches_is_compatible(tmp_path, seed):
+    similar_df, trans_df, chars, words = _frames(seed)
+    built = CompatibilityIndex.from_frames(similar_df, trans_df)
+    built.save(str(tmp_path))
+    index = CompatibilityIndex.load(str(tmp_path), built.version)
+    assert isinstance(index.cand_indices, np.memmap)
+    assert isinstance(index.syllable_ids.keys.data, np.memmap)
+    assert index.syllable_count == built.syllable_count and index.char_count == built.char_count
+    assert {w: k for w, k in built.syllable_ids.items() if isinstance(w, str)} == dict(index.syllable_ids.items())
+    _assert_matches_reference(index, similar_df, trans_df, chars, words, seed)
+    assert CompatibilityIndex.load(str(tmp_path), 'f' * 40) is None
+
+
+def test_compatibility_empty_inputs():
+    similar_df, trans_df, _, _ = _frames(0)
+    index = CompatibilityIndex.from_frames(similar_df, trans_df)
+    assert index.compatibility([], ['w1']).shape == (0, 1)
+    assert index.compatibility(['x'], []).shape == (1, 0)
+    assert not index.compatibility(['x'], ['zz']).any()
+
+
+def _excel(path, rows):
+    pd.DataFrame(rows).to_excel(path, index=False)
+
+
+def test_load_dictionary_round_trip(tmp_path):
+    path = str(tmp_path / 'dict.xlsx')
+    _excel(path, {
+        'QuocNgu': ['an', 'ăn', np.nan, 'Ư'],
+        'SinoNom': ['安', '𫗒', '咹', np.nan],
+        'Count': [1, 2, 3, 4],
+        'Score': [0.5, np.nan, 1.25, 2.0],
+        'Mixed': ['a', 7, 1.5, True],
+    })
+    expected = pd.read_excel(path)
+    df = load_dictionary(path, cache_dir=str(tmp_path / 'cache'))
+    pd.testing.assert_frame_equal(df, expected)
+    assert [type(v) for v in df['Mixed']] == [type(v) for v in expected['Mixed']]
+    # Lần thứ hai đọc từ cache, không parse lại Excel
+    again = load_dictionary(path, cache_dir=str(tmp_path / 'cache'))
+    pd.testing.assert_frame_equal(again, expected)
+    assert again.attrs['dictionary_sha1'] == df.attrs['dictionary_sha1']
+
+
+def test_load_dictionary_rebuilds_stale_cache(tmp_path):
+    path = str(tmp_path / 'dict.xlsx')
+    cache_dir = str(tmp_path / 'cache')
+    _excel(path, {'QuocNgu': ['an'], 'SinoNom': ['安']})
+    first = compile_dictionary(path, cache_dir)
+    old = load_dictionary(path, cache_dir=cache_dir)
+    _excel(path, {'QuocNgu': ['an', 'ăn'], 'SinoNom': ['安', '𫗒']})
+    second = compile_dictionary(path, cache_dir)
+    assert second != first
+    assert not os.path.exists(first)
+    df = load_dictionary(path, cache_dir=cache_dir)
+    assert df['QuocNgu'].tolist() == ['an', 'ăn']
+    assert df.attrs['dictionary_sha1'] != old.attrs['dictionary_sha1']
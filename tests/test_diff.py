@@ -0,0 +1,37 @@
+"""
+Kernel 'diff' (``align.diff``) phải cho đúng dãy mã của DP đầy đủ, hoặc None khi vượt
+quá số lỗi cho phép.
+"""
+import pytest
+
+from align.diff import diff_max_edits, diff_ops
+from align.dp import CostRows, kernel_ops, python_backtrace, trace
+from dp_cases import cost_cases
+
+CASES = cost_cases()
+
+
+@pytest.mark.parametrize('cost', CASES)
+def test_diff_matches_reference(cost):
+    m, n = cost.shape
+    assert diff_ops(cost, max(m, n)) == trace(python_backtrace(cost))
+
+
+@pytest.mark.parametrize('cost', CASES)
+def test_kernel_diff_and_auto_match_reference(cost):
+    expected = trace(python_backtrace(cost))
+    assert kernel_ops(cost, 'diff') == expected
+    # 'auto' thử 'diff' trước khi cost chỉ là so bằng, rồi quay về kernel DP
+    assert kernel_ops(cost, 'auto', linear_memory_cells=64, band_width=4) == expected
+
+
+def test_diff_gives_up_above_max_edits():
+    cost = CostRows.equality(list('aaaa'), list('bbbb'))
+    assert diff_ops(cost, 3) is None
+    assert diff_ops(cost, 4) == trace(python_backtrace(cost))
+
+
+def test_diff_max_edits_bounds():
+    assert diff_max_edits(10, 10) == 64
+    assert diff_max_edits(100_000, 100_000) == 2048
+    assert diff_max_edits(1000, 100_000) == 250
@@ -0,0 +1,63 @@
+"""
+``DirectoryIndex.find``: tên đúng được ưu tiên, tên khác hoa thường chỉ khớp khi không mơ
+hồ, sau đó mới so base name với extension linh hoạt như ``find_file_flexible`` cũ.
+"""
+import os
+
+from align.directory_index import DirectoryIndex, get_directory_index, invalidate_directory_indexes
+
+
+def _touch(directory, *names):
+    for name in names:
+        (directory / name).write_text('', encoding='utf-8')
+
+
+def test_exact_name_wins_over_case_variants(tmp_path):
+    _touch(tmp_path, 'page.json', 'Page.json', 'PAGE.txt')
+    index = DirectoryIndex(str(tmp_path))
+    assert index.find('page.json') == os.path.join(str(tmp_path), 'page.json')
+    assert index.find('Page.json') == os.path.join(str(tmp_path), 'Page.json')
+
+
+def test_unambiguous_casefold_match(tmp_path):
+    _touch(tmp_path, 'Notes.xlsx', 'page.json')
+    index = DirectoryIndex(str(tmp_path))
+    # .xlsx không nằm trong các extension linh hoạt: chỉ khớp nhờ casefold
+    assert index.find('NOTES.XLSX') == os.path.join(str(tmp_path), 'Notes.xlsx')
+    assert index.find('PAGE.JSON') == os.path.join(str(tmp_path), 'page.json')
+
+
+def test_ambiguous_casefold_falls_back_to_base_name(tmp_path):
+    _touch(tmp_path, 'Notes.xlsx', 'NOTES.xlsx', 'Page.json', 'PAGE.json')
+    index = DirectoryIndex(str(tmp_path))
+    assert index.find('notes.xlsx') is None
+    # So base name như trước: file đầu tiên theo thứ tự liệt kê
+    first = next(name for name in os.listdir(str(tmp_path)) if name.lower() == 'page.json')
+    assert index.find('page.json') == os.path.join(str(tmp_path), first)
+
+
+def test_base_name_and_extension_rules(tmp_path):
+    _touch(tmp_path, 'book_001.txt', 'scan.tif')
+    (tmp_path / 'sub').mkdir()
+    _touch(tmp_path / 'sub', 'inner.json')
+    index = DirectoryIndex(str(tmp_path))
+    assert index.find('BOOK_001.json') == os.path.join(str(tmp_path), 'book_001.txt')
+    assert index.find('scan.json') is None
+    assert index.find('scan') is None
+    assert index.find('scan', any_extension=True) == os.path.join(str(tmp_path), 'scan.tif')
+    assert index.find(os.path.join('sub', 'inner.json')) == os.path.join(str(tmp_path), 'sub', 'inner.json')
+    assert index.find('missing.json') is None
+    assert index.similar('Book_001.png') == ['book_001.txt']
+
+
+def test_missing_directory_and_invalidate(tmp_path):
+    assert DirectoryIndex(str(tmp_path / 'missing')).find('a.json') is None
+    index = get_directory_index(str(tmp_path))
+    assert index.find('late.json') is None
+    _touch(tmp_path, 'late.json')
+    # Chỉ mục được dùng lại cho tới khi bị invalidate
+    assert get_directory_index(str(tmp_path)).find('late.json') is None
+    invalidate_directory_indexes(str(tmp_path))
+    assert get_directory_index(str(tmp_path)).find('late.json') == os.path.join(str(tmp_path), 'late.json')
+    invalidate_directory_indexes()
+
@@ -0,0 +1,66 @@
+"""
+Các kernel căn chỉnh của ``align.dp`` phải cho đúng dãy mã của bản tham chiếu
+``python_backtrace`` (kể cả thứ tự ưu tiên khi hoà điểm: D trước L, L trước U).
+"""
+import numpy as np
+import pytest
+
+from align.dp import (LEFT, MATCH, UP, CostRows, banded_ops, hirschberg_ops, kernel_ops, numpy_backtrace, python_backtrace,
+                      render, resolve_kernel, trace)
+from dp_cases import cost_cases
+
+CASES = cost_cases()
+
+
+@pytest.mark.parametrize('cost', CASES)
+def test_numpy_backtrace_matches_reference(cost):
+    np.testing.assert_array_equal(numpy_backtrace(cost), python_backtrace(cost))
+
+
+@pytest.mark.parametrize('cost', CASES)
+@pytest.mark.parametrize('block_cells', [1, 16, 1 << 20])
+def test_hirschberg_matches_reference(cost, block_cells):
+    # block_cells nhỏ buộc chia đôi tới tận các khối một dòng
+    assert hirschberg_ops(cost, block_cells) == trace(python_backtrace(cost))
+
+
+@pytest.mark.parametrize('cost', CASES)
+@pytest.mark.parametrize('band_width', [1, 2, 64])
+def test_banded_matches_reference(cost, band_width):
+    # Dải hẹp buộc nới rộng dải (đường đi chạm biên hoặc cận dưới ngoài dải không đủ tốt)
+    assert banded_ops(cost, band_width) == trace(python_backtrace(cost))
+
+
+def test_auto_switches_to_hirschberg():
+    assert resolve_kernel('auto', 100, 100, linear_memory_cells=10_000) == 'banded'
+    assert resolve_kernel('auto', 101, 100, linear_memory_cells=10_000) == 'hirschberg'
+
+
+@pytest.mark.parametrize('cost', CASES)
+@pytest.mark.parametrize('kernel', ['numpy', 'python', 'hirschberg', 'banded'])
+def test_kernel_ops_matches_reference(cost, kernel):
+    assert kernel_ops(cost, kernel, band_width=4) == trace(python_backtrace(cost))
+
+
+def test_from_predicate_matches_equality():
+    left, right = list('abcab'), list('bcaxb')
+    np.testing.assert_array_equal(
+        numpy_backtrace(CostRows.from_predicate(left, right, lambda a, b: a == b)),
+        numpy_backtrace(CostRows.equality(left, right)))
+
+
+def test_tie_order():
+    # Hoà điểm giữa thay thế và xoá/chèn: D trước L, L trước U
+    cost = CostRows.equality(['a'], ['b'])
+    assert trace(python_backtrace(cost)) == [MATCH]
+    cost = CostRows.equality(['a', 'b'], ['b', 'a'])
+    assert trace(python_backtrace(cost)) == [MATCH, MATCH]
+    assert trace(numpy_backtrace(cost)) == [MATCH, MATCH]
+    assert banded_ops(cost, 1) == [MATCH, MATCH]
+    cost = CostRows.equality(['a'], ['b', 'a', 'c'])
+    assert trace(numpy_backtrace(cost)) == [LEFT, MATCH, LEFT]
+
+
+def test_render():
+    ops = [MATCH, LEFT, UP]
+    assert render(ops, ['x', 'y'], ['p', 'q']) == (['x', '*', 'y'], ['p', 'q', '*'])
@@ -0,0 +1,49 @@
+"""
+``get_lexicon`` (``align.lexicon``): lần gọi sau dùng lại bản trong bộ nhớ mà không đọc hay
+hash lại file; file âm tiết đổi nội dung thì được nạp lại (qua cache nhị phân mới).
+"""
+import os
+
+import align.lexicon as lexicon_module
+from align.lexicon import compile_lexicon, get_lexicon
+
+
+def _write_syllables(path, words):
+    with open(path, 'w', encoding='utf-16') as f:
+        f.write('\n'.join(words))
+
+
+def test_get_lexicon_hit_and_invalidation(tmp_path, monkeypatch):
+    monkeypatch.setenv('DICT_CACHE_DIR', str(tmp_path / 'cache'))
+    path = str(tmp_path / 'syllable.txt')
+    _write_syllables(path, ['an', 'nam', 'quốc'])
+    digests = []
+    real_digest = lexicon_module.file_digest
+    monkeypatch.setattr(lexicon_module, 'file_digest', lambda p: digests.append(p) or real_digest(p))
+
+    first = get_lexicon(path)
+    assert first.words == ['an', 'nam', 'quốc'] and 'nam' in first
+    # Trúng bộ nhớ: không hash lại file
+    assert get_lexicon(path) is first
+    assert len(digests) == 1
+    assert os.listdir(str(tmp_path / 'cache')) == [os.path.basename(compile_lexicon(path, digest=first.digest))]
+
+    # Chỉ đổi mtime, nội dung giữ nguyên: hash lại nhưng dùng lại lexicon cũ
+    os.utime(path, ns=(1, 1))
+    assert get_lexicon(path) is first
+    assert len(digests) == 2
+
+    _write_syllables(path, ['an', 'nam', 'quốc', 'gia'])
+    second = get_lexicon(path)
+    assert second is not first
+    assert second.words == ['an', 'nam', 'quốc', 'gia'] and second.digest != first.digest
+    assert get_lexicon(path) is second
+
+
+def test_get_lexicon_uses_syllable_env(tmp_path, monkeypatch):
+    monkeypatch.setenv('DICT_CACHE_DIR', str(tmp_path / 'cache'))
+    path = str(tmp_path / 'other.txt')
+    _write_syllables(path, ['thiên', 'hạ'])
+    monkeypatch.setenv('SYLLABLE', path)
+    assert get_lexicon().words == ['thiên', 'hạ']
+    assert get_lexicon() is get_lexicon(path)
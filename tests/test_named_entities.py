@@ -0,0 +1,97 @@
+"""
+``NameRewriter`` (``align.named_entities``) phải cho đúng kết quả của chuỗi ``str.replace``
+tuần tự tương đương: văn bản NFC viết thường, khoá dài thay trước, chỉ thay trọn từ. Kiểm tra
+trên ``dict_saint`` thật (có tên là tiền tố của tên khác, tên nhiều từ chứa tên ngắn) và trên
+từ điển nhỏ có khoá lồng nhau.
+"""
+import random
+import re
+import unicodedata
+
+import pytest
+
+from align.named_entities import NameRewriter
+from align.saint_name import dict_saint
+
+
+def _nfc(text):
+    return unicodedata.normalize('NFC', text)
+
+
+def _sequential_replace(text, mapping):
+    """Chuỗi ``str.replace`` theo từng khoá, khoá dài trước. Các từ cách nhau hai dấu cách để
+    mỗi lần xuất hiện có ranh giới riêng (chỉ khớp trọn từ); chỗ đã thay được giữ bằng mã
+    tạm để khoá sau không khớp vào chuỗi thay thế (có tên thay bằng chính nó)."""
+    values = {}
+    for key, value in mapping.items():
+        values[_nfc(key).lower()] = _nfc(value)
+    keys = sorted(values, key=len, reverse=True)
+    text = f" {'  '.join(_nfc(text).lower().split(' '))} "
+    for n, key in enumerate(keys):
+        text = text.replace(f" {key.replace(' ', '  ')} ", f' \x00{n}\x00 ')
+    text = re.sub('\x00(\\d+)\x00', lambda match: values[keys[int(match.group(1))]], text)
+    return ' '.join(text.split('  ')).strip()
+
+
+def _variants(word, rng):
+    """Cách viết khác của một từ như trong OCR: hoa/thường, dạng NFD."""
+    if rng.random() < 0.3:
+        word = word.upper() if rng.random() < 0.5 else word.capitalize()
+    if rng.random() < 0.3:
+        word = unicodedata.normalize('NFD', word)
+    return word
+
+
+def _sample(mapping, seed, length=60):
+    """Văn bản ngẫu nhiên: tên trong từ điển, tiền tố/phần kéo dài của tên, từ thường."""
+    rng = random.Random(seed)
+    keys = list(mapping)
+    plain = ['và', 'thánh', 'ông', 'đức', 'cha', 'an', 'chi', 'đô']
+    words = []
+    for _ in range(length):
+        op = rng.random()
+        key = rng.choice(keys)
+        if op < 0.4:
+            words.append(key)
+        elif op < 0.5:
+            words.append(key[:max(1, len(key) - 2)].strip())
+        elif op < 0.6:
+            words.append(key + rng.choice(['u', 'ô', 'a']))
+        else:
+            words.append(rng.choice(plain))
+    return ' '.join(_variants(word, rng) for word in ' '.join(words).split(' '))
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_matches_sequential_replace_on_dict_saint(seed):
+    rewriter = NameRewriter(dict_saint)
+    text = _sample(dict_saint, seed)
+    assert rewriter.rewrite(text).lower() == _sequential_replace(text, dict_saint).lower()
+
+
+# Khoá là tiền tố của khoá khác, khoá nhiều từ chứa khoá ngắn, khoá trùng sau khi viết thường
+_NESTED = {
+    'an': 'AN',
+    'anna': 'AN NA',
+    'an na': 'AN-NA',
+    'an na bê': 'AN NA BÊ',
+    'bê': 'BÊ',
+    'Giuse': 'GIU SE',
+    'giuse': 'GIU-SE',
+    'giuseu': 'GIU SEU',
+}
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_matches_sequential_replace_on_nested_keys(seed):
+    rewriter = NameRewriter(_NESTED)
+    text = _sample(_NESTED, seed)
+    assert rewriter.rewrite(text).lower() == _sequential_replace(text, _NESTED).lower()
+
+
+def test_rewrite_examples():
+    rewriter = NameRewriter(_NESTED)
+    assert rewriter.rewrite('an na bê và An Na, anna; giuseu Giuse') == 'AN NA BÊ và AN-NA, AN NA; GIU SEU GIU-SE'
+    # Không thay giữa từ, giữ nguyên phần còn lại của văn bản
+    assert rewriter.rewrite('Bàn nam bêu') == 'Bàn nam bêu'
+    assert NameRewriter({}).rewrite('an na') == 'an na'
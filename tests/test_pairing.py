@@ -0,0 +1,82 @@
+"""
+Ghép trang theo nội dung (``align.pairing``): chỉ mục ngược bigram phải cho đúng số bigram
+chung như giao tập trực tiếp; ``pair_pages`` bỏ đúng trang thừa/thiếu và giữ thứ tự;
+align với pairing="auto" báo các trang không được ghép ở cả hai bên.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from align.align import align_iter
+from align.dictionary import CompatibilityIndex
+from align.pairing import _BigramIndex, pair_pages
+from book_cases import WORDS, page_text, write_dictionaries, write_json, write_txt
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_bigram_index_overlaps_match_intersection(seed):
+    rng = np.random.default_rng(seed)
+    signatures = [np.unique(rng.integers(0, 60, rng.integers(0, 25))) for _ in range(rng.integers(1, 8))]
+    index = _BigramIndex(signatures)
+    for _ in range(10):
+        query = np.unique(rng.integers(0, 80, rng.integers(0, 40)))
+        expected = [np.intersect1d(query, signature).size for signature in signatures]
+        assert index.overlaps(query).tolist() == expected
+
+
+def _index():
+    similar_df = pd.DataFrame({'Input Character': ['安'], 'Top 20 Similar Characters': ['案']})
+    trans_df = pd.DataFrame({'QuocNgu': list(WORDS), 'SinoNom': list(WORDS.values())})
+    return CompatibilityIndex.from_frames(similar_df, trans_df)
+
+
+def _book(tmp_path, json_pages, txt_pages):
+    """Trang JSON/TXT sinh từ các seed; trả về đường dẫn theo thứ tự."""
+    json_paths, txt_paths = [], []
+    for n, seed in enumerate(json_pages):
+        path = str(tmp_path / f'page_{n:03d}.json')
+        write_json(path, page_text(seed, columns=(3, 5), words=(4, 8))[0])
+        json_paths.append(path)
+    for n, seed in enumerate(txt_pages):
+        path = str(tmp_path / f'page_{n:03d}.txt')
+        write_txt(path, page_text(seed, columns=(3, 5), words=(4, 8))[1])
+        txt_paths.append(path)
+    return json_paths, txt_paths
+
+
+def test_pair_pages_skips_missing_and_extra_pages(tmp_path):
+    # Thiếu trang JSON 3, thừa một trang TXT lạ (seed 100) sau trang 5
+    json_paths, txt_paths = _book(tmp_path, [0, 1, 2, 4, 5, 6, 7], [0, 1, 2, 3, 4, 5, 100, 6, 7])
+    pairs = pair_pages(json_paths, txt_paths, _index())
+    assert [(i, j) for i, j, _ in pairs] == [(0, 0), (1, 1), (2, 2), (3, 4), (4, 5), (5, 7), (6, 8)]
+    assert all(score > 0.2 for _, _, score in pairs)
+
+
+def test_pair_pages_positional_when_aligned(tmp_path):
+    json_paths, txt_paths = _book(tmp_path, range(6), range(6))
+    assert [(i, j) for i, j, _ in pair_pages(json_paths, txt_paths, _index())] == [(k, k) for k in range(6)]
+    assert pair_pages(json_paths, [], _index()) == []
+
+
+def test_pair_pages_respects_window(tmp_path):
+    # Trang tương ứng nằm ngoài cửa sổ quanh đường chéo thì không được chấm điểm
+    json_paths, txt_paths = _book(tmp_path, [0], [10, 11, 12, 13, 0])
+    assert [(i, j) for i, j, _ in pair_pages(json_paths, txt_paths, _index(), window=4, min_score=0.2)] == [(0, 4)]
+    assert pair_pages(json_paths, txt_paths, _index(), window=1, min_score=0.2) == []
+
+
+def test_align_reports_unpaired_pages(tmp_path, monkeypatch):
+    nom_dir, vi_dir = tmp_path / 'json', tmp_path / 'txt'
+    nom_dir.mkdir()
+    vi_dir.mkdir()
+    for n, seed in enumerate([0, 1, 2, 200]):
+        write_json(nom_dir / f'book_{n:03d}.json', page_text(seed, columns=(3, 5), words=(4, 8))[0])
+    for n, seed in enumerate([0, 1, 100, 2]):
+        write_txt(vi_dir / f'book_{n:03d}.txt', page_text(seed, columns=(3, 5), words=(4, 8))[1])
+    write_dictionaries(tmp_path, monkeypatch)
+    messages = []
+    rows = list(align_iter(str(nom_dir), str(vi_dir), k=1, reverse=True, pairing='auto', log=messages.append))
+    assert {row.file for row in rows} == {'book_000.json', 'book_001.json', 'book_002.json'}
+    skipped = [msg for msg in messages if isinstance(msg, str) and msg.startswith('⚠️ Bỏ qua')]
+    assert skipped == ['⚠️ Bỏ qua book_003.json: không tìm được trang Quốc Ngữ tương ứng',
+                       '⚠️ Bỏ qua book_002.txt: không tìm được trang Hán Nôm tương ứng']
@@ -0,0 +1,77 @@
+"""
+Sàng lọc trước DP (``align.screening``): mỗi loại cặp hỏng bị loại với đúng lý do, theo thứ
+tự kiểm tra từ rẻ tới đắt; cặp bình thường (bản gần giống, có sửa vài vị trí) được giữ.
+"""
+import random
+
+import pytest
+
+from align.dp import CostRows
+from align.screening import ScreeningReject, hit_rate, screen_pair, write_review_list
+
+
+def _near_copy(seed, length=80, edits=8):
+    rng = random.Random(seed)
+    left = [f't{rng.randrange(5000)}' for _ in range(length)]
+    right = list(left)
+    for _ in range(edits):
+        pos = rng.randrange(len(right))
+        op = rng.random()
+        if op < 0.4:
+            right.insert(pos, f'x{rng.randrange(5000)}')
+        elif op < 0.7:
+            del right[pos]
+        else:
+            right[pos] = f'x{rng.randrange(5000)}'
+    return left, right
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_normal_pairs_are_accepted(seed):
+    left, right = _near_copy(seed)
+    assert screen_pair(CostRows.equality(left, right)) is None
+
+
+def test_empty_side():
+    assert screen_pair(CostRows.equality([], ['a'])) == 'empty side (0 vs 1 tokens)'
+    assert screen_pair(CostRows.equality(['a'], [])) == 'empty side (1 vs 0 tokens)'
+
+
+def test_length_ratio():
+    left, right = _near_copy(0)
+    reason = screen_pair(CostRows.equality(left[:10], right))
+    assert reason.startswith('length ratio 0.') and reason.endswith(f'(10 vs {len(right)} tokens)')
+    # Ngưỡng thấp hơn thì cặp đi tiếp tới các bước sau
+    assert screen_pair(CostRows.equality(left[:10], left), min_length_ratio=0.1) is None
+
+
+def test_dictionary_hit_rate():
+    # Hai trang không liên quan (như ghép lệch thứ tự): không chữ nào khớp gần vị trí tương ứng
+    left, _ = _near_copy(1)
+    right = [f'u{token}' for token in _near_copy(2)[0]]
+    cost = CostRows.equality(left, right)
+    assert hit_rate(cost) == 0.0
+    assert screen_pair(cost) == 'dictionary hit rate 0.00 < 0.3'
+
+
+def test_anchor_count():
+    # Khớp ở khắp nơi nhưng không có cặp khớp duy nhất cục bộ (trang lặp một mẫu ngắn)
+    cost = CostRows.equality(list('ab' * 40), list('ab' * 40))
+    assert hit_rate(cost) == 1.0
+    assert screen_pair(cost) == 'anchor count 0 < 0.15 x 80'
+    assert screen_pair(cost, min_anchor_rate=0) is None
+
+
+def test_write_review_list(tmp_path):
+    path = str(tmp_path / 'review' / 'screening_review.tsv')
+    rejects = [ScreeningReject('a.json', 'a.txt', 'empty side (0 vs 3 tokens)', 'skip a'),
+               ScreeningReject('b.json', 'b.txt', 'dictionary hit rate 0.10 < 0.3', 'skip b')]
+    assert str(rejects[0]) == 'skip a'
+    write_review_list(rejects, path)
+    with open(path, encoding='utf-8') as f:
+        assert f.read() == ('left\tright\treason\n'
+                            'a.json\ta.txt\tempty side (0 vs 3 tokens)\n'
+                            'b.json\tb.txt\tdictionary hit rate 0.10 < 0.3\n')
+    # Lần chạy sau không còn cặp bị loại: xoá danh sách cũ
+    write_review_list([], path)
+    assert not (tmp_path / 'review' / 'screening_review.tsv').exists()
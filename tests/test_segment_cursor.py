@@ -0,0 +1,113 @@
+"""
+Chia dãy đã căn thành segment theo bbox bằng ``SegmentCursor`` phải cho đúng như vòng lặp
+cắt lại phần còn lại sau mỗi bbox trước đây (kể cả bbox rỗng, bbox thiếu token và phần dư).
+"""
+import importlib
+import random
+
+import pytest
+
+from align.align import _distribute_segments
+from align.dp import SegmentCursor
+
+align_han = importlib.import_module('align_han.align_han')
+
+
+def _reference_align(aligned_hn, aligned_qn, num_word_hn):
+    """Vòng lặp cũ của ``align._distribute_segments``."""
+    segments = []
+    hn_remain, qn_remain = aligned_hn.copy(), aligned_qn.copy()
+    for num in num_word_hn:
+        if num == 0:
+            segments.append(("", ""))
+            continue
+        count, i = 0, 0
+        while i < len(hn_remain):
+            if hn_remain[i] != "*":
+                count += 1
+            i += 1
+            if count == num:
+                break
+        segments.append((hn_remain[:i], qn_remain[:i]))
+        hn_remain = hn_remain[i:]
+        qn_remain = qn_remain[i:]
+    return segments, hn_remain, qn_remain
+
+
+def _reference_align_han(left_remain, right_remain, number_units):
+    """Vòng lặp cũ của ``align_han._distribute``."""
+    segments = []
+    shortfalls = []
+    for num in number_units:
+        if num == 0:
+            segments.append(([], []))
+            continue
+        if not left_remain:
+            segments.append(([], []))
+            continue
+        count = 0
+        i = 0
+        while i < len(left_remain):
+            if left_remain[i] != '*':
+                count += 1
+            i += 1
+            if count == num:
+                break
+        if count < num and i >= len(left_remain):
+            shortfalls.append((num, count))
+        segments.append((left_remain[:i], right_remain[:i]))
+        left_remain = left_remain[i:]
+        right_remain = right_remain[i:]
+    return segments, left_remain, right_remain, shortfalls
+
+
+def _case(seed):
+    """Dãy đã căn ngẫu nhiên (có gap ở cả hai bên) và số token mỗi bbox, có bbox rỗng,
+    tổng số token có thể thiếu hoặc dư so với dãy."""
+    rng = random.Random(seed)
+    left, right = [], []
+    for k in range(rng.randint(0, 40)):
+        op = rng.random()
+        left.append('*' if op < 0.25 else f'h{k}')
+        right.append('*' if 0.25 <= op < 0.45 else f'q{k}')
+    units = [rng.choice([0, 0, 1, 2, 3, 5]) for _ in range(rng.randint(0, 15))]
+    return left, right, units
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_distribute_segments_matches_reference(seed):
+    left, right, units = _case(seed)
+    assert _distribute_segments(left, right, units) == _reference_align(left, right, units)
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_align_han_distribute_matches_reference(seed):
+    left, right, units = _case(seed)
+    cursor = SegmentCursor(left)
+    segments, shortfalls = align_han._distribute(cursor, left, right, units)
+    assert (segments, left[cursor.pos:], right[cursor.pos:], shortfalls) == _reference_align_han(left, right, units)
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_cursor_carries_over_pages(seed):
+    # k=2: con trỏ đi tiếp qua các trang như phần còn lại được truyền sang trang sau
+    left, right, units = _case(seed)
+    pages = [units[:len(units) // 3], units[len(units) // 3:]]
+    cursor = SegmentCursor(left)
+    left_remain, right_remain = left, right
+    for page in pages:
+        segments, shortfalls = align_han._distribute(cursor, left, right, page)
+        expected, left_remain, right_remain, expected_shortfalls = _reference_align_han(left_remain, right_remain, page)
+        assert (segments, shortfalls) == (expected, expected_shortfalls)
+    assert (left[cursor.pos:], right[cursor.pos:]) == (left_remain, right_remain)
+
+
+def test_cursor_edges():
+    cursor = SegmentCursor(['*', 'a', '*', 'b', '*'])
+    assert cursor.take(1) == (0, 2, 1)
+    assert cursor.take(0) == (2, 2, 0)
+    assert cursor.take(3) == (2, 5, 1)
+    assert cursor.exhausted
+    assert cursor.take(1) == (5, 5, 0)
+    empty = SegmentCursor([])
+    assert empty.exhausted and empty.take(2) == (0, 0, 0)
@@ -0,0 +1,108 @@
+"""
+Các chế độ dựa trên cặp khớp của ``align.sparse``: 'sparse' phải cho đúng chi phí tối ưu
+của DP đầy đủ (vị trí khoảng trống khi hoà điểm có thể khác), ``match_count`` đúng số ô khớp;
+'anchored' cho đúng chi phí tối ưu khi hai văn bản gần giống nhau.
+"""
+import random
+
+import pytest
+
+from align.dp import MATCH, CostRows, kernel_ops, python_backtrace, trace
+from align.sparse import anchored_ops, find_anchors, match_count, sparse_ops
+from dp_cases import cost_cases, ops_cost
+
+CASES = cost_cases()
+
+
+def _reference_cost(cost):
+    return ops_cost(cost, trace(python_backtrace(cost)))
+
+
+@pytest.mark.parametrize('cost', CASES)
+def test_sparse_cost_matches_reference(cost):
+    assert ops_cost(cost, sparse_ops(cost)) == _reference_cost(cost)
+
+
+def test_sparse_cost_on_long_sequences():
+    # Dãy dài, bảng chữ lớn: nhiều đoạn của đường bao sinh ra rồi biến mất
+    for seed in range(20):
+        rng = random.Random(seed)
+        vocab = rng.randint(2, 30)
+        left = [str(rng.randrange(vocab)) for _ in range(rng.randint(50, 200))]
+        right = [tok if rng.random() < 0.7 else str(rng.randrange(vocab)) for tok in left if rng.random() < 0.85]
+        cost = CostRows.equality(left, right[rng.randint(0, 20):])
+        assert ops_cost(cost, sparse_ops(cost)) == _reference_cost(cost), seed
+
+
+def test_sparse_without_matches():
+    cost = CostRows.equality(list('abc'), list('xyzw'))
+    assert sparse_ops(cost) == kernel_ops(cost, 'numpy')
+    assert sparse_ops(CostRows.equality([], list('ab'))) == kernel_ops(CostRows.equality([], list('ab')), 'numpy')
+
+
+@pytest.mark.parametrize('cost', CASES)
+def test_match_count(cost):
+    m, n = cost.shape
+    cells = sum(int((cost.row(i) == 0).sum()) for i in range(m)) if n else 0
+    assert match_count(cost) == cells
+
+
+def test_auto_picks_sparse_below_density(monkeypatch):
+    import align.sparse
+    calls = []
+    monkeypatch.setattr(align.sparse, 'sparse_ops', lambda cost: calls.append(cost) or sparse_ops(cost))
+    cost = CASES[7].values[0]  # table-3: có bảng khớp nên 'auto' không thử 'diff'
+    m, n = cost.shape
+    density = match_count(cost) / (m + n)
+    assert kernel_ops(cost, 'auto', sparse_density=density * 0.99) == kernel_ops(cost, 'banded')
+    assert calls == []
+    assert kernel_ops(cost, 'auto', sparse_density=density) == sparse_ops(cost)
+    assert calls == [cost]
+
+
+def _near_copy(seed, vocab=1000):
+    """Dãy token từ bảng chữ lớn (phần lớn token là duy nhất) và bản sửa vài vị trí."""
+    rng = random.Random(seed)
+    left = [str(rng.randrange(vocab)) for _ in range(rng.randint(0, 120))]
+    right = list(left)
+    for _ in range(rng.randint(0, 10)):
+        pos = rng.randint(0, len(right))
+        op = rng.random()
+        if op < 0.4 or not right:
+            right.insert(pos, str(rng.randrange(vocab)))
+        elif op < 0.7:
+            del right[min(pos, len(right) - 1)]
+        else:
+            right[min(pos, len(right) - 1)] = str(rng.randrange(vocab))
+    return CostRows.equality(left, right)
+
+
+@pytest.mark.parametrize('seed', range(100))
+def test_anchored_cost_matches_reference(seed):
+    cost = _near_copy(seed)
+    for window in (4, 32):
+        assert ops_cost(cost, anchored_ops(cost, window)) == _reference_cost(cost)
+
+
+def test_find_anchors_are_increasing_matches():
+    for seed in range(20):
+        cost = _near_copy(seed)
+        anchors = find_anchors(cost)
+        assert all(cost.row(i)[j] == 0 for i, j in anchors)
+        assert all(i0 < i1 and j0 < j1 for (i0, j0), (i1, j1) in zip(anchors, anchors[1:]))
+
+
+def test_anchored_without_anchors():
+    # Token lặp lại: không cặp nào duy nhất trong cửa sổ, cả bài toán là một khối 'auto'
+    cost = CostRows.equality(list('abababab'), list('babababa'))
+    assert find_anchors(cost) == []
+    assert anchored_ops(cost) == trace(python_backtrace(cost))
+    assert find_anchors(CostRows.equality([], list('ab'))) == []
+    assert anchored_ops(CostRows.equality([], list('ab'))) == trace(python_backtrace(CostRows.equality([], list('ab'))))
+
+
+def test_anchored_all_anchors():
+    tokens = [str(k) for k in range(50)]
+    cost = CostRows.equality(tokens, tokens)
+    assert find_anchors(cost) == [(k, k) for k in range(50)]
+    assert anchored_ops(cost) == [MATCH] * 50
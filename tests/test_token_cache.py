@@ -0,0 +1,56 @@
+"""
+Sidecar token (``align.token_cache``): chỉ token hoá lại khi nội dung, loại hoặc phiên bản
+đổi; ``prune`` giữ thư mục trong giới hạn, xoá sidecar lâu không dùng nhất trước.
+"""
+import os
+
+from align.token_cache import cached_tokens, prune
+
+
+def _counting_tokenize(calls):
+    def tokenize(text):
+        calls.append(text)
+        return text.split()
+    return tokenize
+
+
+def test_cached_tokens_hit_and_invalidation(tmp_path):
+    path = tmp_path / 'page.txt'
+    path.write_text('a b c', encoding='utf-8')
+    cache_dir = str(tmp_path / 'cache')
+    calls = []
+    tokenize = _counting_tokenize(calls)
+    assert cached_tokens(str(path), 'han', tokenize, cache_dir=cache_dir) == ['a', 'b', 'c']
+    assert cached_tokens(str(path), 'han', tokenize, cache_dir=cache_dir) == ['a', 'b', 'c']
+    assert len(calls) == 1
+    # Đổi phiên bản bộ tách, loại token hoá hoặc nội dung đều tính lại
+    cached_tokens(str(path), 'han', tokenize, version='2', cache_dir=cache_dir)
+    cached_tokens(str(path), 'quoc_ngu', tokenize, cache_dir=cache_dir)
+    path.write_text('a b', encoding='utf-8')
+    assert cached_tokens(str(path), 'han', tokenize, cache_dir=cache_dir) == ['a', 'b']
+    assert len(calls) == 4
+
+
+def _entries(cache_dir):
+    return sorted(os.path.join(root, f) for root, _, files in os.walk(cache_dir) for f in files)
+
+
+def test_prune_removes_least_recently_used(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    paths = []
+    for k in range(4):
+        path = tmp_path / f'page{k}.txt'
+        path.write_text(f'token{k} ' * 50, encoding='utf-8')
+        before = set(_entries(cache_dir))
+        cached_tokens(str(path), 'han', str.split, cache_dir=cache_dir)
+        entry, = set(_entries(cache_dir)) - before
+        os.utime(entry, (1000 + k, 1000 + k))
+        paths.append((path, entry))
+    size = os.path.getsize(paths[0][1])
+    # Đọc trúng sidecar cũ nhất đánh dấu nó vừa dùng
+    calls = []
+    cached_tokens(str(paths[0][0]), 'han', _counting_tokenize(calls), cache_dir=cache_dir)
+    assert calls == []
+    assert prune(cache_dir, max_bytes=2 * size) == 2
+    assert _entries(cache_dir) == sorted([paths[0][1], paths[3][1]])
+    assert prune(cache_dir, max_bytes=0) == 0
@@ -0,0 +1,68 @@
+"""
+``LoadModel.correct_named_entities`` / ``find_syllabel`` (automaton Aho–Corasick) phải
+cho đúng kết quả của bản quét ``str.find`` cũ.
+"""
+import random
+
+import pytest
+
+pytest.importorskip('torch')
+
+from align.lexicon import get_lexicon  # noqa: E402
+from align.saint_name import dict_saint  # noqa: E402
+from align.tokenizer import LoadModel  # noqa: E402
+
+
+def _find_syllabel_reference(words, word):
+    return [word_ for word_ in words if word.find(word_) != -1]
+
+
+def _correct_named_entities_reference(words, word):
+    """Bản ban đầu: tại mỗi vị trí lấy âm tiết dài nhất có lần xuất hiện đầu tiên ở đó."""
+    if word in words:
+        return word
+    lst_word = _find_syllabel_reference(words, word)
+    i = 0
+    token = ''
+    while i < len(word):
+        lst_need = [word_ for word_ in lst_word if word_.find(word[i]) == 0]
+        lst_need = [word_ for word_ in lst_need if word.find(word_) == i]
+        lst_need = sorted(lst_need, key=lambda x: len(x))
+        lst_need.reverse()
+        if not lst_need:
+            token += word[i] + ' '
+            i += 1
+        else:
+            token += lst_need[0] + ' '
+            i += len(lst_need[0])
+    return token.strip()
+
+
+@pytest.fixture(scope='module')
+def model():
+    return LoadModel(get_lexicon())
+
+
+def _samples(words, count=500, seed=0):
+    """Tên riêng trong saint_name (viết thường) và các token dính liền ngẫu nhiên."""
+    rng = random.Random(seed)
+    samples = [key.lower() for key in dict_saint]
+    for _ in range(count):
+        token = ''.join(rng.choice(words) for _ in range(rng.randint(1, 4)))
+        if rng.random() < 0.5:
+            pos = rng.randrange(len(token) + 1)
+            token = token[:pos] + rng.choice('xzfwjq') + token[pos:]
+        samples.append(token)
+    return samples
+
+
+def test_correct_named_entities_matches_reference(model):
+    words = model.words
+    for sample in _samples(words):
+        assert model.correct_named_entities(sample) == _correct_named_entities_reference(words, sample), sample
+
+
+def test_find_syllabel_matches_reference(model):
+    words = model.words
+    for sample in _samples(words, count=100, seed=1):
+        assert model.find_syllabel(sample) == _find_syllabel_reference(words, sample), sample
@@ -0,0 +1,17 @@
+import re
+
+from align.trie import build_trie, trie_pattern
+
+
+def test_build_trie_skips_empty():
+    assert build_trie(['ab', 'a', '']) == {'a': {'': True, 'b': {'': True}}}
+
+
+def test_trie_pattern_prefers_longest_key():
+    words = ['a', 'ab', 'abc', 'b', 'a.b']
+    regex = re.compile(trie_pattern(build_trie(words)))
+    assert regex.match('abcd').group(0) == 'abc'
+    assert regex.match('abx').group(0) == 'ab'
+    assert regex.match('a.b').group(0) == 'a.b'
+    assert regex.match('axb').group(0) == 'a'
+    assert regex.match('c') is None
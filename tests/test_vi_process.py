@@ -0,0 +1,58 @@
+"""
+``split_words`` (DP trên trie âm tiết) phải cho đúng kết quả của bản đệ quy cũ.
+"""
+import random
+
+import pytest
+
+from align.lexicon import get_lexicon
+from align.vi_process import split_words
+
+
+def _split_words_reference(word, syllables):
+    """Bản đệ quy ban đầu: thử tiền tố ngắn nhất trước, quay lui khi phần còn lại không tách được."""
+    if word == '':
+        return ''
+    for i in range(len(word)):
+        if word[:i + 1] in syllables:
+            words = word[:i + 1] + ' ' + _split_words_reference(word[i + 1:], syllables)
+            if len(word) == len(''.join(words.split())):
+                return words
+    return ''
+
+
+def _glued_tokens(words, count, seed=0):
+    """Token dính liền từ 1-4 âm tiết, một phần bị thêm/bớt/đổi một ký tự như lỗi OCR."""
+    rng = random.Random(seed)
+    letters = sorted(set(''.join(words)))
+    tokens = []
+    for _ in range(count):
+        token = ''.join(rng.choice(words) for _ in range(rng.randint(1, 4)))
+        if token and rng.random() < 0.4:
+            pos = rng.randrange(len(token))
+            op = rng.random()
+            if op < 0.33:
+                token = token[:pos] + rng.choice(letters) + token[pos:]
+            elif op < 0.66:
+                token = token[:pos] + token[pos + 1:]
+            else:
+                token = token[:pos] + rng.choice(letters) + token[pos + 1:]
+        tokens.append(token)
+    return tokens
+
+
+@pytest.fixture(scope='module')
+def lexicon():
+    return get_lexicon()
+
+
+def test_split_words_matches_reference(lexicon):
+    for token in _glued_tokens(lexicon.words, 2000):
+        assert split_words(token) == _split_words_reference(token, lexicon.syllables), token
+
+
+def test_split_words_edge_cases(lexicon):
+    assert split_words('') == ''
+    assert split_words('a') == 'a '
+    assert split_words('anhem') == _split_words_reference('anhem', lexicon.syllables)
+    assert split_words('qqqq') == ''
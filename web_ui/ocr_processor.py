@@ -45,6 +45,11 @@ except (ImportError, Exception) as e:
     convert_txt_to_ecel = None
     marking = None
 
+try:
+    import align_service
+except (ImportError, Exception) as e:
+    align_service = None
+
 try:
     from align_han.align_han import align_han
 except (ImportError, Exception) as e:
@@ -302,8 +307,22 @@ class OCRProcessor:
             if progress_callback:
                 progress_callback("Đang align text...", 0, 100)
             
-            # Chạy align
-            align(ocr_json_nom, ocr_txt_qn, output_txt, align_param, name_book=name_book, reverse=reverse, mapping_path=mapping_path)
+            # Chạy align: qua align service nếu đang chạy, nếu không thì chạy trực tiếp
+            def on_event(event):
+                if progress_callback and event['event'] == 'page' and event['total']:
+                    percent = min(99, int((event['page_index'] + 1) * 100 / event['total']))
+                    progress_callback(f"Đang align {event['file']}...", percent, 100)
+            
+            payload = {
+                'nom_dir': os.path.abspath(ocr_json_nom),
+                'vi_dir': os.path.abspath(ocr_txt_qn),
+                'output_txt': os.path.abspath(output_txt),
+                'k': align_param,
+                'reverse': reverse,
+                'mapping_path': os.path.abspath(mapping_path) if mapping_path else None
+            }
+            if align_service is None or not align_service.submit('align', payload, on_event):
+                align(ocr_json_nom, ocr_txt_qn, output_txt, align_param, name_book=name_book, reverse=reverse, mapping_path=mapping_path)
             
             # Lưu lại thông tin sau khi align xong
             self.write_file_info(info)
@@ -370,7 +389,18 @@ class OCRProcessor:
             if progress_callback:
                 progress_callback("Đang align (cùng ngôn ngữ)...", 0, 100)
 
-            align_han(left_json_dir, right_txt_dir, output_txt, k=align_param, name_book=name_book, reverse=reverse, mapping_path=mapping_path)
+            # Chạy align_han: qua align service nếu đang chạy, nếu không thì chạy trực tiếp
+            payload = {
+                'left_dir': os.path.abspath(left_json_dir),
+                'right_dir': os.path.abspath(right_txt_dir),
+                'output_excel': os.path.abspath(output_txt),
+                'k': align_param,
+                'name_book': name_book,
+                'reverse': reverse,
+                'mapping_path': os.path.abspath(mapping_path) if mapping_path else None
+            }
+            if align_service is None or not align_service.submit('align_han', payload):
+                align_han(left_json_dir, right_txt_dir, output_txt, k=align_param, name_book=name_book, reverse=reverse, mapping_path=mapping_path)
 
             self.write_file_info(info)
 
@@ -406,15 +436,29 @@ class OCRProcessor:
             info['result_xlsx'] = f"{self.output_folder}/result.xlsx"
             os.makedirs(os.path.dirname(info['result_xlsx']), exist_ok=True)
             
-            # Chạy correction
-            convert_txt_to_ecel(info['output_txt'], info['result_xlsx'], debug=debug, namebook=file_name)
-            
-            if progress_callback:
-                progress_callback("Đang đánh dấu...", 50, 100)
-            
-            df = pd.read_excel(info['result_xlsx'])
             type_qn = int(os.getenv('TYPE_QN', '1'))
-            marking(df, info['result_xlsx'], debug=debug, type_qn=type_qn)
+            
+            # Chạy correction + marking: qua align service nếu đang chạy (từ điển/mô hình đã nạp sẵn),
+            # nếu không thì chạy trực tiếp
+            def on_event(event):
+                if progress_callback and event['event'] == 'step' and event['step'] == 'convert':
+                    progress_callback("Đang đánh dấu...", 50, 100)
+            
+            payload = {
+                'output_txt': os.path.abspath(info['output_txt']),
+                'result': os.path.abspath(info['result_xlsx']),
+                'debug': debug,
+                'namebook': file_name,
+                'type_qn': type_qn
+            }
+            if align_service is None or not align_service.submit('mark', payload, on_event):
+                convert_txt_to_ecel(info['output_txt'], info['result_xlsx'], debug=debug, namebook=file_name)
+                
+                if progress_callback:
+                    progress_callback("Đang đánh dấu...", 50, 100)
+                
+                df = pd.read_excel(info['result_xlsx'])
+                marking(df, info['result_xlsx'], debug=debug, type_qn=type_qn)
             
             # Lưu lại thông tin sau khi correct xong
             self.write_file_info(info)